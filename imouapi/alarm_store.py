@@ -0,0 +1,198 @@
+"""Local history of the alarms of the Imou devices, stored in SQLite and queried without calling the API."""
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .alarms import ImouAlarmStream
+from .const import ALARM_STORE_PURGE_INTERVAL, ALARM_STORE_RETENTION_DAYS
+
+_LOGGER: logging.Logger = logging.getLogger(__package__)
+
+_COLUMNS = ["device_id", "channel_id", "alarm_id", "time", "msgType", "code", "source", "count"]
+
+_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS alarms (
+        device_id TEXT NOT NULL,
+        channel_id TEXT NOT NULL,
+        alarm_id TEXT,
+        time REAL NOT NULL,
+        msgType TEXT NOT NULL,
+        code TEXT,
+        source TEXT,
+        count INTEGER NOT NULL DEFAULT 1
+    )""",
+    # polled alarms are identified by their id, pushed alarms by their time and type
+    "CREATE UNIQUE INDEX IF NOT EXISTS alarms_device_alarm ON alarms (device_id, alarm_id) WHERE alarm_id IS NOT NULL",
+    """CREATE UNIQUE INDEX IF NOT EXISTS alarms_device_event ON alarms (device_id, channel_id, time, msgType)
+        WHERE alarm_id IS NULL""",
+    "CREATE INDEX IF NOT EXISTS alarms_device_time ON alarms (device_id, time)",
+    "CREATE INDEX IF NOT EXISTS alarms_type_time ON alarms (msgType, time)",
+    "CREATE INDEX IF NOT EXISTS alarms_time ON alarms (time)",
+]
+
+
+class ImouAlarmStore:
+    """History of the alarms stored in a SQLite database, indexed by device, time and alarm type.
+
+    The store is fed with the alarms of a stream returned by `alarms()` of `ImouDevice` or `ImouFleet`, either polled
+    or pushed, through `async_consume()`, which writes to the database in a worker thread. Alarms older than the
+    retention period are purged.
+    """
+
+    def __init__(
+        self,
+        path: str = ":memory:",
+        retention_days: Optional[float] = ALARM_STORE_RETENTION_DAYS,
+        max_alarms: Optional[int] = None,
+    ) -> None:
+        """
+        Initialize the instance.
+
+        Parameters:
+            path: path of the SQLite database, in memory by default
+            retention_days: alarms older than this are purged, None to keep them
+            max_alarms: max number of alarms kept, the oldest are purged first, None for no limit
+        """
+        self._path = path
+        self._retention_days = retention_days
+        self._max_alarms = max_alarms
+        self._purged_at = 0.0
+        # the database is written by async_consume() in a worker thread
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            for statement in _SCHEMA:
+                self._connection.execute(statement)
+        # alarms of a database opened again may have expired in the mean time
+        self.purge()
+
+    def get_path(self) -> str:
+        """Get the path of the SQLite database."""
+        return self._path
+
+    def get_retention_days(self) -> Optional[float]:
+        """Get the number of days alarms are kept for."""
+        return self._retention_days
+
+    def set_retention_days(self, value: Optional[float]) -> None:
+        """Set the number of days alarms are kept for, None to keep them."""
+        self._retention_days = value
+
+    def get_max_alarms(self) -> Optional[int]:
+        """Get the max number of alarms kept."""
+        return self._max_alarms
+
+    def set_max_alarms(self, value: Optional[int]) -> None:
+        """Set the max number of alarms kept, None for no limit."""
+        self._max_alarms = value
+
+    def close(self) -> None:
+        """Close the database."""
+        with self._lock:
+            self._connection.close()
+
+    def add_alarms(self, alarms: Iterable[Dict[str, Any]]) -> int:
+        """Store stream alarms with a single transaction, ignoring those already stored. Return how many were added."""
+        rows = [tuple(alarm.get(column) for column in _COLUMNS) for alarm in alarms]
+        with self._lock, self._connection:
+            before = self._connection.total_changes
+            self._connection.executemany(
+                f"INSERT OR IGNORE INTO alarms ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                rows,
+            )
+            added = self._connection.total_changes - before
+        if time.monotonic() - self._purged_at >= ALARM_STORE_PURGE_INTERVAL:
+            self.purge()
+        return added
+
+    async def async_consume(self, stream: ImouAlarmStream) -> None:
+        """Store the alarms of the stream until it is closed, adding those already buffered together."""
+        async for alarm in stream:
+            alarms = [alarm]
+            while stream.get_size() > 0:
+                alarms.append(await stream.async_get())
+            added = await asyncio.to_thread(self.add_alarms, alarms)
+            _LOGGER.debug("Stored %d alarms", added)
+
+    def purge(self) -> int:
+        """Remove the alarms older than the retention period and over the max number. Return how many were removed."""
+        self._purged_at = time.monotonic()
+        with self._lock, self._connection:
+            before = self._connection.total_changes
+            if self._retention_days is not None:
+                threshold = time.time() - self._retention_days * 86400
+                self._connection.execute("DELETE FROM alarms WHERE time < ?", (threshold,))
+            if self._max_alarms is not None:
+                self._connection.execute(
+                    "DELETE FROM alarms WHERE rowid NOT IN (SELECT rowid FROM alarms ORDER BY time DESC LIMIT ?)",
+                    (self._max_alarms,),
+                )
+            removed = self._connection.total_changes - before
+        if removed > 0:
+            _LOGGER.debug("Purged %d alarms", removed)
+        return removed
+
+    def query(
+        self,
+        device_id: Optional[str] = None,
+        begin_time: Optional[float] = None,
+        end_time: Optional[float] = None,
+        msg_type: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Return the stored alarms matching the filters, newest first. Times are timestamps in seconds."""
+        where, params = self._get_filters(device_id, begin_time, end_time, msg_type)
+        statement = f"SELECT {', '.join(_COLUMNS)} FROM alarms{where} ORDER BY time DESC"
+        if limit is not None:
+            statement = statement + " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            return [dict(zip(_COLUMNS, row)) for row in self._connection.execute(statement, params)]
+
+    def count(
+        self,
+        device_id: Optional[str] = None,
+        begin_time: Optional[float] = None,
+        end_time: Optional[float] = None,
+        msg_type: Optional[str] = None,
+    ) -> int:
+        """Return the number of stored alarms matching the filters."""
+        where, params = self._get_filters(device_id, begin_time, end_time, msg_type)
+        with self._lock:
+            return self._connection.execute(f"SELECT COUNT(*) FROM alarms{where}", params).fetchone()[0]
+
+    def count_by_type(
+        self,
+        device_id: Optional[str] = None,
+        begin_time: Optional[float] = None,
+        end_time: Optional[float] = None,
+    ) -> Dict[str, int]:
+        """Return the number of stored alarms matching the filters by alarm type."""
+        where, params = self._get_filters(device_id, begin_time, end_time, None)
+        with self._lock:
+            rows = self._connection.execute(f"SELECT msgType, COUNT(*) FROM alarms{where} GROUP BY msgType", params)
+            return dict(rows.fetchall())
+
+    def _get_filters(
+        self,
+        device_id: Optional[str],
+        begin_time: Optional[float],
+        end_time: Optional[float],
+        msg_type: Optional[str],
+    ) -> Tuple[str, List[Any]]:
+        """Return the where clause and its parameters for the given filters."""
+        conditions = []
+        params: List[Any] = []
+        for condition, value in [
+            ("device_id = ?", device_id),
+            ("time >= ?", begin_time),
+            ("time <= ?", end_time),
+            ("msgType = ?", msg_type),
+        ]:
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+        return (" WHERE " + " AND ".join(conditions) if conditions else ""), params
@@ -0,0 +1,197 @@
+"""Streams of the alarms of the Imou devices, fed by polling and by pushed messages."""
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+from .const import (
+    ALARM_OVERFLOW_BLOCK,
+    ALARM_OVERFLOW_COALESCE,
+    ALARM_OVERFLOW_DROP_OLDEST,
+    ALARM_OVERFLOW_POLICIES,
+    ALARM_STREAM_SIZE,
+)
+
+_LOGGER: logging.Logger = logging.getLogger(__package__)
+
+
+def alarm_from_api(alarm: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert an alarm returned by getAlarmMessage into a stream alarm."""
+    return {
+        "device_id": str(alarm["deviceId"]),
+        "channel_id": str(alarm.get("channelId", "0")),
+        "alarm_id": str(alarm["alarmId"]) if "alarmId" in alarm else None,
+        "time": alarm["time"],
+        "msgType": alarm["msgType"],
+        "code": alarm["type"],
+        "source": "poll",
+        "count": 1,
+    }
+
+
+def alarm_from_event(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a pushed alarm event into a stream alarm."""
+    return {
+        "device_id": event["device_id"],
+        "channel_id": event["channel_id"],
+        "alarm_id": None,
+        "time": event["time"],
+        "msgType": event["msgType"],
+        "code": event["code"],
+        "source": "push",
+        "count": 1,
+    }
+
+
+class ImouAlarmStream:
+    """Bounded buffer of alarms to be consumed with `async for alarm in stream`.
+
+    When the buffer is full the overflow policy applies: `drop_oldest` discards the oldest alarm, `block` makes the
+    producer wait for the consumer (pushed alarms, which cannot wait, are discarded instead) and `coalesce` merges the
+    alarm into the most recent buffered alarm of the same device, channel and type, increasing its `count`.
+    """
+
+    def __init__(
+        self,
+        max_size: int = ALARM_STREAM_SIZE,
+        overflow: str = ALARM_OVERFLOW_DROP_OLDEST,
+        on_close: Optional[Callable[["ImouAlarmStream"], None]] = None,
+    ) -> None:
+        """
+        Initialize the instance.
+
+        Parameters:
+            max_size: max number of alarms buffered
+            overflow: policy when the buffer is full, one of drop_oldest, block and coalesce
+            on_close: called when the stream is closed
+        """
+        if overflow not in ALARM_OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {ALARM_OVERFLOW_POLICIES}")
+        self._max_size = max(1, max_size)
+        self._overflow = overflow
+        self._on_close = on_close
+        self._buffer: Deque[Dict[str, Any]] = deque()
+        self._getters: Deque[asyncio.Future] = deque()
+        self._putters: Deque[asyncio.Future] = deque()
+        self._closed = False
+        self._statistics: Dict[str, int] = {
+            "received": 0,
+            "delivered": 0,
+            "dropped": 0,
+            "coalesced": 0,
+        }
+
+    def get_max_size(self) -> int:
+        """Get the max number of alarms buffered."""
+        return self._max_size
+
+    def get_overflow(self) -> str:
+        """Get the policy applied when the buffer is full."""
+        return self._overflow
+
+    def get_size(self) -> int:
+        """Get the number of alarms buffered."""
+        return len(self._buffer)
+
+    def get_statistics(self) -> Dict[str, int]:
+        """Return the number of alarms received, delivered to the consumer, dropped and coalesced."""
+        return dict(self._statistics)
+
+    def is_closed(self) -> bool:
+        """Return True if the stream is closed."""
+        return self._closed
+
+    def close(self) -> None:
+        """Close the stream, the consumer gets the alarms already buffered and then the iteration ends."""
+        if self._closed:
+            return
+        self._closed = True
+        for waiter in list(self._getters) + list(self._putters):
+            if not waiter.done():
+                waiter.set_result(None)
+        if self._on_close is not None:
+            self._on_close(self)
+
+    def put_nowait(self, alarm: Dict[str, Any]) -> bool:
+        """Add an alarm without waiting, return False if discarded."""
+        if self._closed:
+            return False
+        self._statistics["received"] = self._statistics["received"] + 1
+        if len(self._buffer) >= self._max_size:
+            if self._overflow == ALARM_OVERFLOW_COALESCE and self._coalesce(alarm):
+                return True
+            self._statistics["dropped"] = self._statistics["dropped"] + 1
+            if self._overflow == ALARM_OVERFLOW_BLOCK:
+                _LOGGER.debug("Alarm stream full, discarding alarm of %s", alarm["device_id"])
+                return False
+            self._buffer.popleft()
+        self._buffer.append(alarm)
+        self._wakeup_next(self._getters)
+        return True
+
+    async def async_put(self, alarm: Dict[str, Any]) -> bool:
+        """Add an alarm, waiting for the consumer if the buffer is full and the policy is block. Return False if \
+            discarded."""
+        while self._overflow == ALARM_OVERFLOW_BLOCK and len(self._buffer) >= self._max_size and not self._closed:
+            waiter = asyncio.get_running_loop().create_future()
+            self._putters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                self._discard_waiter(self._putters, waiter)
+                raise
+        return self.put_nowait(alarm)
+
+    async def async_get(self) -> Dict[str, Any]:
+        """Return the next alarm, waiting for it. Raise StopAsyncIteration if the stream is closed and empty."""
+        while not self._buffer:
+            if self._closed:
+                raise StopAsyncIteration
+            waiter = asyncio.get_running_loop().create_future()
+            self._getters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                self._discard_waiter(self._getters, waiter)
+                raise
+        alarm = self._buffer.popleft()
+        self._statistics["delivered"] = self._statistics["delivered"] + 1
+        self._wakeup_next(self._putters)
+        return alarm
+
+    def __aiter__(self) -> "ImouAlarmStream":
+        """Iterate over the alarms."""
+        return self
+
+    async def __anext__(self) -> Dict[str, Any]:
+        """Return the next alarm."""
+        return await self.async_get()
+
+    def _coalesce(self, alarm: Dict[str, Any]) -> bool:
+        """Merge the alarm into the most recent buffered alarm of the same kind, return False if there is none."""
+        for index in range(len(self._buffer) - 1, -1, -1):
+            buffered = self._buffer[index]
+            if (
+                buffered["device_id"] == alarm["device_id"]
+                and buffered["channel_id"] == alarm["channel_id"]
+                and buffered["msgType"] == alarm["msgType"]
+            ):
+                self._buffer[index] = dict(alarm, count=buffered["count"] + alarm["count"])
+                self._statistics["coalesced"] = self._statistics["coalesced"] + 1
+                return True
+        return False
+
+    def _wakeup_next(self, waiters: Deque[asyncio.Future]) -> None:
+        """Wake up the first waiter still waiting."""
+        while waiters:
+            waiter = waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    def _discard_waiter(self, waiters: Deque[asyncio.Future], waiter: asyncio.Future) -> None:
+        """Forget a cancelled waiter, passing the wake up on to the next one if it was already woken up."""
+        if waiter in waiters:
+            waiters.remove(waiter)
+        elif waiter.done() and not waiter.cancelled():
+            self._wakeup_next(waiters)
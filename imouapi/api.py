@@ -1,19 +1,50 @@
 """Low-level API for interacting with Imou devices."""
+import asyncio
 import hashlib
 import json
 import logging
 import random
 import re
 import secrets
+import ssl
 import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import List
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple, Type, Union
 
-from aiohttp import ClientSession
+from aiohttp import ClientConnectorError, ClientSession, TCPConnector
 
-from .const import API_URL, DEFAULT_TIMEOUT, MAX_RETRIES, PTZ_OPERATIONS
+from .const import (
+    ALARM_FIRST_FETCH_DAYS,
+    ALARM_MAX_PAGES,
+    ALARM_PAGE_SIZE,
+    API_URL,
+    BATCH_MAX_SIZE,
+    BATCH_WINDOW,
+    CACHE_INVALIDATIONS,
+    CACHE_MAX_SIZE,
+    CACHE_TTL,
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RECOVERY_TIMEOUT,
+    CONNECTION_LIMIT_PER_HOST,
+    DEFAULT_TIMEOUT,
+    DEVICE_LIST_PAGE_SIZE,
+    DNS_CACHE_TTL,
+    KEEPALIVE_TIMEOUT,
+    MAX_RETRIES,
+    MESSAGE_CALLBACK_REFRESH_INTERVAL,
+    PTZ_OPERATIONS,
+    READ_ONLY_APIS,
+    RETRY_BASE_DELAY,
+    RETRY_CODES,
+    RETRY_DEADLINE,
+    RETRY_MAX_ATTEMPTS,
+    RETRY_MAX_DELAY,
+    TOKEN_REFRESH_MARGIN,
+)
 from .exceptions import (
     APIError,
+    CircuitOpen,
     ConnectionFailed,
     ImouException,
     InvalidConfiguration,
@@ -22,24 +53,394 @@ from .exceptions import (
     NotConnected,
 )
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
+
 _LOGGER = logging.getLogger(__package__)
 
+# values of sensitive keys in logged requests and responses, either with single or double quotes
+_REDACT_PATTERN = re.compile(
+    r"""(["'])(appId|sign|token|accessToken|playToken|thumbUrl|picUrl)\1:\s*(["'])(?:(?!\3).)+\3""", re.DOTALL
+)
+_REDACT_REPLACEMENT = r"\1\2\1: \3XXXXXXXXX\3"
+
+
+class _HTTPLogMessage:
+    """HTTP request or response to log, converted to string and redacted only if the log record is emitted."""
+
+    def __init__(self, data: Any, redact: bool) -> None:
+        """Initialize with the data to log and if it has to be redacted."""
+        self._data = data
+        self._redact = redact
+
+    def __str__(self) -> str:
+        """Return the data as a redacted string."""
+        data = self._data.decode("utf-8", "replace") if isinstance(self._data, bytes) else str(self._data)
+        return _REDACT_PATTERN.sub(_REDACT_REPLACEMENT, data) if self._redact else data
+
+
+class ImouRateLimiter:
+    """Token bucket rate limiter. Requests over the limit wait for their turn in a first-in first-out queue."""
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        """
+        Initialize the instance.
+
+        Parameters:
+            rate: number of requests per second allowed on average
+            burst: max number of requests allowed at once
+        """
+        self._rate = rate
+        self._burst = burst
+        self._tokens = float(burst)
+        self._updated_at: Optional[float] = None
+        # asyncio locks are fair, waiters acquire the lock in the same order they requested it
+        self._lock = asyncio.Lock()
+        self._queue_depth = 0
+        self._statistics: Dict[str, float] = {
+            "requests": 0,
+            "queued_requests": 0,
+            "max_queue_depth": 0,
+            "total_wait_time": 0.0,
+            "max_wait_time": 0.0,
+        }
+
+    def get_rate(self) -> float:
+        """Get the number of requests per second allowed."""
+        return self._rate
+
+    def get_burst(self) -> int:
+        """Get the max number of requests allowed at once."""
+        return self._burst
+
+    def get_queue_depth(self) -> int:
+        """Get the number of requests currently waiting."""
+        return self._queue_depth
+
+    def get_statistics(self) -> Dict[str, float]:
+        """Return the number of requests, how many had to wait, the queue depth and the time spent waiting."""
+        statistics = dict(self._statistics)
+        statistics["queue_depth"] = self._queue_depth
+        statistics["average_wait_time"] = (
+            self._statistics["total_wait_time"] / self._statistics["queued_requests"]
+            if self._statistics["queued_requests"] > 0
+            else 0.0
+        )
+        return statistics
+
+    def _refill(self, now: float) -> None:
+        """Add the tokens accumulated since the last refill."""
+        if self._updated_at is not None:
+            self._tokens = min(float(self._burst), self._tokens + (now - self._updated_at) * self._rate)
+        self._updated_at = now
+
+    async def async_acquire(self) -> float:
+        """Wait until the request is allowed and return for how many seconds it waited."""
+        loop = asyncio.get_running_loop()
+        started_at = loop.time()
+        self._queue_depth = self._queue_depth + 1
+        self._statistics["max_queue_depth"] = max(self._statistics["max_queue_depth"], self._queue_depth)
+        queued = self._lock.locked()
+        try:
+            async with self._lock:
+                while True:
+                    self._refill(loop.time())
+                    if self._tokens >= 1:
+                        self._tokens = self._tokens - 1
+                        break
+                    queued = True
+                    await asyncio.sleep((1 - self._tokens) / self._rate)
+        finally:
+            self._queue_depth = self._queue_depth - 1
+        wait_time = loop.time() - started_at if queued else 0.0
+        self._statistics["requests"] = self._statistics["requests"] + 1
+        if queued:
+            self._statistics["queued_requests"] = self._statistics["queued_requests"] + 1
+            self._statistics["total_wait_time"] = self._statistics["total_wait_time"] + wait_time
+            self._statistics["max_wait_time"] = max(self._statistics["max_wait_time"], wait_time)
+        return wait_time
+
+
+class ImouRetryPolicy:
+    """Retry policy for transient failures, with exponential backoff and full jitter between the attempts."""
+
+    def __init__(
+        self,
+        max_attempts: int = RETRY_MAX_ATTEMPTS,
+        base_delay: float = RETRY_BASE_DELAY,
+        max_delay: float = RETRY_MAX_DELAY,
+        deadline: float = RETRY_DEADLINE,
+        retryable_exceptions: Tuple[Type[ImouException], ...] = (ConnectionFailed,),
+        retryable_codes: Optional[List[str]] = None,
+    ) -> None:
+        """
+        Initialize the instance.
+
+        Parameters:
+            max_attempts: max number of attempts per call, 1 to never retry
+            base_delay: delay in seconds before the first retry, doubled at every attempt
+            max_delay: max delay in seconds between two attempts
+            deadline: max duration in seconds of a call, including all the attempts
+            retryable_exceptions: exceptions for which the call is retried
+            retryable_codes: API result codes or HTTP status codes for which the call is retried
+        """
+        self._max_attempts = max_attempts
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._deadline = deadline
+        self._retryable_exceptions = retryable_exceptions
+        self._retryable_codes = retryable_codes if retryable_codes is not None else list(RETRY_CODES)
+
+    def get_max_attempts(self) -> int:
+        """Get the max number of attempts per call."""
+        return self._max_attempts
+
+    def get_deadline(self) -> float:
+        """Get the max duration in seconds of a call."""
+        return self._deadline
+
+    def is_retryable(self, exception: Exception, read_only: bool = True) -> bool:
+        """Return true if the call failed with the given exception can be retried. Calls which are not read-only \
+            are retried only if the request has not been sent or the access token was expired, not to repeat a \
+            command already executed."""
+        if isinstance(exception, APIError) and exception.code is not None:
+            if not read_only and exception.code != "TK1002":
+                return False
+            return exception.code in self._retryable_codes
+        if not read_only and isinstance(exception, ConnectionFailed) and exception.request_sent:
+            return False
+        return isinstance(exception, self._retryable_exceptions)
+
+    def get_delay(self, attempt: int) -> float:
+        """Return a random delay before the next attempt, up to an exponentially growing cap (full jitter)."""
+        return random.uniform(0, min(self._max_delay, self._base_delay * 2 ** (attempt - 1)))
+
+
+class ImouCircuitBreaker:
+    """Circuit breaker for each API endpoint and device, failing fast calls to an endpoint or device not responding."""
+
+    def __init__(
+        self,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        recovery_timeout: float = CIRCUIT_RECOVERY_TIMEOUT,
+        failure_exceptions: Tuple[Type[ImouException], ...] = (ConnectionFailed, APIError),
+    ) -> None:
+        """
+        Initialize the instance.
+
+        Parameters:
+            failure_threshold: consecutive failures after which the circuit opens and calls fail fast
+            recovery_timeout: seconds after which an open circuit lets a trial call through (half-open)
+            failure_exceptions: exceptions counted as failures, any other outcome closes the circuit
+        """
+        self._failure_threshold = failure_threshold
+        self._recovery_timeout = recovery_timeout
+        self._failure_exceptions = failure_exceptions
+        # state of each circuit by (api, device id)
+        self._circuits: Dict[Tuple[str, Optional[str]], Dict[str, Any]] = {}
+
+    def get_state(self, api: str, device_id: Optional[str] = None) -> str:
+        """Return the state of the circuit (closed, open or half_open)."""
+        circuit = self._circuits.get((api, device_id))
+        if circuit is None:
+            return "closed"
+        if circuit["state"] == "open" and time.monotonic() - circuit["opened_at"] >= self._recovery_timeout:
+            return "half_open"
+        return circuit["state"]
+
+    def get_circuits(self) -> Dict[str, Dict[str, Any]]:
+        """Return state and consecutive failures of the circuits which are not closed."""
+        circuits = {}
+        for (api, device_id), circuit in self._circuits.items():
+            state = self.get_state(api, device_id)
+            if state != "closed":
+                circuits[f"{api}:{device_id}" if device_id is not None else api] = {
+                    "state": state,
+                    "failures": circuit["failures"],
+                }
+        return circuits
+
+    def before_call(self, api: str, device_id: Optional[str] = None) -> None:
+        """Raise CircuitOpen if the call is not allowed."""
+        state = self.get_state(api, device_id)
+        if state == "closed":
+            return
+        circuit = self._circuits[(api, device_id)]
+        # when half-open, let a single trial call through
+        if state == "half_open" and not circuit["trial_in_flight"]:
+            circuit["trial_in_flight"] = True
+            return
+        device = f" for device {device_id}" if device_id is not None else ""
+        raise CircuitOpen(f"{api}{device} failed {circuit['failures']} times, not retrying until recovered")
+
+    def after_call(self, api: str, device_id: Optional[str] = None, exception: Optional[BaseException] = None) -> None:
+        """Record the outcome of a call."""
+        key = (api, device_id)
+        circuit = self._circuits.get(key)
+        # the call has not completed (e.g. cancelled) or never reached the API, so the endpoint did not fail: release
+        # the trial call without changing the state
+        if (exception is not None and not isinstance(exception, Exception)) or (
+            isinstance(exception, ConnectionFailed) and not exception.request_sent
+        ):
+            if circuit is not None:
+                circuit["trial_in_flight"] = False
+            return
+        # the endpoint responded, close the circuit
+        if exception is None or not isinstance(exception, self._failure_exceptions):
+            if circuit is not None:
+                del self._circuits[key]
+                _LOGGER.debug("Circuit of %s closed", f"{api}:{device_id}")
+            return
+        if circuit is None:
+            circuit = {"state": "closed", "failures": 0, "opened_at": 0.0, "trial_in_flight": False}
+            self._circuits[key] = circuit
+        circuit["failures"] = circuit["failures"] + 1
+        circuit["trial_in_flight"] = False
+        if circuit["state"] == "open" or circuit["failures"] >= self._failure_threshold:
+            if circuit["state"] != "open":
+                _LOGGER.warning("Circuit of %s open after %d failures", f"{api}:{device_id}", circuit["failures"])
+            circuit["state"] = "open"
+            circuit["opened_at"] = time.monotonic()
+
+
+class ImouRequestBatcher:
+    """Collect the requests for single devices arriving within a short window and send them as one batched call."""
+
+    def __init__(
+        self,
+        api_method: Callable[[List[str]], Awaitable[dict]],
+        window: float = BATCH_WINDOW,
+        max_batch_size: int = BATCH_MAX_SIZE,
+    ) -> None:
+        """
+        Initialize the instance.
+
+        Parameters:
+            api_method: coroutine function taking a list of device ids and returning a response with a deviceList
+            window: seconds to wait for other requests before sending the batch
+            max_batch_size: max number of devices in a batch, the batch is sent as soon as it is full
+        """
+        self._api_method = api_method
+        self._window = window
+        self._max_batch_size = max_batch_size
+        # futures of the callers waiting for the next batch, by device id
+        self._pending: Dict[str, List[asyncio.Future]] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        # batches being sent, referenced until completed
+        self._tasks: Set[asyncio.Future] = set()
+        self._statistics: Dict[str, int] = {
+            "requests": 0,
+            "batches": 0,
+        }
+
+    def get_window(self) -> float:
+        """Get the seconds to wait for other requests before sending the batch."""
+        return self._window
+
+    def get_max_batch_size(self) -> int:
+        """Get the max number of devices in a batch."""
+        return self._max_batch_size
+
+    def get_statistics(self) -> Dict[str, int]:
+        """Return the number of requests received and of batched calls sent."""
+        return dict(self._statistics)
+
+    async def async_load(self, device_id: str) -> dict:
+        """Return the response for the given device only, once the batch it has been added to is sent."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(device_id, []).append(future)
+        self._statistics["requests"] = self._statistics["requests"] + 1
+        if len(self._pending) >= self._max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self._window, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        """Send the pending requests as a single batch."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, {}
+        if pending:
+            self._statistics["batches"] = self._statistics["batches"] + 1
+            task = asyncio.ensure_future(self._async_send_batch(pending))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _async_send_batch(self, pending: Dict[str, List[asyncio.Future]]) -> None:
+        """Call the API for all the devices of the batch and hand each caller its own slice of the response. If the \
+            batch fails, e.g. because of a single wrong device id, each device is requested on its own instead."""
+        try:
+            data = await self._api_method(list(pending.keys()))
+        except Exception as exception:  # pylint: disable=broad-except
+            if len(pending) == 1:
+                self._set_exception(next(iter(pending.values())), exception)
+                return
+            _LOGGER.debug("Batch of %d devices failed, requesting them one by one: %s", len(pending), exception)
+            results = await asyncio.gather(
+                *[self._api_method([device_id]) for device_id in pending], return_exceptions=True
+            )
+            for futures, result in zip(pending.values(), results):
+                if isinstance(result, BaseException):
+                    self._set_exception(futures, result)
+                else:
+                    for future in futures:
+                        if not future.done():
+                            future.set_result(result)
+            return
+        if len(pending) == 1:
+            # nothing to split
+            for future in next(iter(pending.values())):
+                if not future.done():
+                    future.set_result(data)
+            return
+        items = {}
+        for item in data.get("deviceList", []) if isinstance(data, dict) else []:
+            if isinstance(item, dict) and "deviceId" in item:
+                items[item["deviceId"]] = item
+        for device_id, futures in pending.items():
+            result = dict(data) if isinstance(data, dict) else {}
+            result["deviceList"] = [items[device_id]] if device_id in items else []
+            if "count" in result:
+                result["count"] = len(result["deviceList"])
+            for future in futures:
+                if not future.done():
+                    future.set_result(result)
+
+    def _set_exception(self, futures: List[asyncio.Future], exception: BaseException) -> None:
+        """Raise the exception to the callers still waiting."""
+        for future in futures:
+            if not future.done():
+                future.set_exception(exception)
+
 
 class ImouAPIClient:
     """Interact with IMOU API."""
 
-    def __init__(self, app_id: str, app_secret: str, session: ClientSession) -> None:
+    def __init__(self, app_id: str, app_secret: str, session: Optional[ClientSession] = None) -> None:
         """
         Initialize the instance.
 
         Parameters:
             app_id: appID from https://open.imoulife.com/consoleNew/myApp/appInfo
             app_secret: appID from https://open.imoulife.com/consoleNew/myApp/appInfo
-            session: aiohttp client session
+            session: aiohttp client session. If not provided, the client creates and owns a session with a \
+                pooled connector which is closed with async_close()
         """
         self._app_id = app_id
         self._app_secret = app_secret
         self._session = session
+        self._session_owned = False
+        # sessions owned by the client and replaced by set_session(), closed by async_close()
+        self._replaced_sessions: List[ClientSession] = []
+        self._connection_limit_per_host = CONNECTION_LIMIT_PER_HOST
+        self._keepalive_timeout = KEEPALIVE_TIMEOUT
+        self._dns_cache_ttl = DNS_CACHE_TTL
+        self._ssl_context: Optional[ssl.SSLContext] = None
 
         self._base_url = API_URL
         self._timeout = DEFAULT_TIMEOUT
@@ -48,30 +449,53 @@ class ImouAPIClient:
 
         self._access_token = None
         self._access_token_expire_time = None
+        self._access_token_expire_at: Optional[float] = None
+        self._token_refresh_margin: float = TOKEN_REFRESH_MARGIN
+        self._token_refresh_handle: Optional[asyncio.TimerHandle] = None
         self._connected = False
-        self._retries = 1
+        # shared access token request all the concurrent callers are waiting for
+        self._connect_task: Optional[asyncio.Future] = None
+        # read-only requests in flight with the generation of the cached responses when sent and the number of callers
+        # waiting for them, by api and payload
+        self._pending_requests: Dict[str, Dict[str, Any]] = {}
+        # use a faster JSON library if installed
+        self._json_loads: Callable[[Union[str, bytes]], Any] = orjson.loads if orjson is not None else json.loads
+        self._json_dumps: Callable[[Any], Union[str, bytes]] = orjson.dumps if orjson is not None else json.dumps
+        self._retry_policy = ImouRetryPolicy()
+        self._circuit_breaker: Optional[ImouCircuitBreaker] = ImouCircuitBreaker()
+        # rate limiters for the whole account and for each device
+        self._rate_limiter: Optional[ImouRateLimiter] = None
+        self._device_rate_limit: Optional[Tuple[float, int]] = None
+        self._device_rate_limiters: Dict[str, ImouRateLimiter] = {}
+        # batchers collecting requests for single devices, by api
+        self._batch_window = BATCH_WINDOW
+        self._batch_max_size = BATCH_MAX_SIZE
+        self._batchers: Dict[str, ImouRequestBatcher] = {}
+        # cached responses by api and payload (expiration time, device id, data)
+        self._cache_enabled = False
+        self._cache_ttl: Dict[str, float] = dict(CACHE_TTL)
+        self._cache_max_size = CACHE_MAX_SIZE
+        self._cache: "OrderedDict[str, Tuple[float, Optional[str], Any]]" = OrderedDict()
+        # number of invalidations of the cached responses by (api, device id), None for any device
+        self._cache_generations: Dict[Tuple[str, Optional[str]], int] = {}
+        self._alarm_page_size = ALARM_PAGE_SIZE
+        self._alarm_max_pages = ALARM_MAX_PAGES
+        # message callback configuration shared by all the devices of the account and when it was retrieved
+        self._message_callback: Optional[Dict[str, Any]] = None
+        self._message_callback_updated_at = 0.0
+        self._message_callback_refresh_interval = MESSAGE_CALLBACK_REFRESH_INTERVAL
+        self._statistics: Dict[str, int] = {
+            "coalesced_calls": 0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+        }
         _LOGGER.debug("Initialized. Endpoint URL: %s", self._base_url)
 
     def _redact_log_message(self, data: str) -> str:
         """Redact log messages to remove sensitive information."""
         if not self._redact_log_message_enabled:
             return data
-        for keyword in (
-            "appId",
-            "sign",
-            "token",
-            "accessToken",
-            "playToken",
-            "thumbUrl",
-            "picUrl",
-        ):
-            for tick in ('"', "'"):
-                data = re.sub(
-                    f"{tick}{keyword}{tick}:\\s*{tick}[^{tick}]+{tick}",
-                    f"{tick}{keyword}{tick}: {tick}XXXXXXXXX{tick}",
-                    data,
-                )
-        return data
+        return _REDACT_PATTERN.sub(_REDACT_REPLACEMENT, data)
 
     def get_base_url(self) -> str:
         """Get base url for the API."""
@@ -91,14 +515,255 @@ class ImouAPIClient:
         self._timeout = value
         _LOGGER.debug("Set timeout to %s", self._base_url)
 
+    def get_token_refresh_margin(self) -> float:
+        """Get how many seconds before its expiration the access token is renewed."""
+        return self._token_refresh_margin
+
+    def set_token_refresh_margin(self, value: float) -> None:
+        """Set how many seconds before its expiration the access token is renewed."""
+        self._token_refresh_margin = value
+
     def set_session(self, value: ClientSession) -> None:
         """Set an aiohttp client session."""
+        if self._session_owned and self._session is not None and self._session is not value:
+            # there may be no event loop running to close the session previously owned by the client now
+            self._replaced_sessions.append(self._session)
         self._session = value
+        self._session_owned = False
 
     def get_session(self) -> ClientSession:
-        """Return the aiohttp client session."""
+        """Return the aiohttp client session, creating a session owned by the client if not provided."""
+        if self._session is None or (self._session_owned and self._session.closed):
+            # reuse the same TLS context for all the connections
+            if self._ssl_context is None:
+                self._ssl_context = ssl.create_default_context()
+            connector = TCPConnector(
+                limit_per_host=self._connection_limit_per_host,
+                keepalive_timeout=self._keepalive_timeout,
+                ttl_dns_cache=self._dns_cache_ttl,
+                ssl=self._ssl_context,
+            )
+            self._session = ClientSession(connector=connector)
+            self._session_owned = True
+            _LOGGER.debug("Created a session with up to %d connections per host", self._connection_limit_per_host)
         return self._session
 
+    def set_connection_pool(
+        self,
+        limit_per_host: int = CONNECTION_LIMIT_PER_HOST,
+        keepalive_timeout: float = KEEPALIVE_TIMEOUT,
+        dns_cache_ttl: int = DNS_CACHE_TTL,
+    ) -> None:
+        """Configure the connection pool of the session owned by the client, before the session is created."""
+        self._connection_limit_per_host = limit_per_host
+        self._keepalive_timeout = keepalive_timeout
+        self._dns_cache_ttl = dns_cache_ttl
+
+    async def async_close(self) -> None:
+        """Stop renewing the access token and close the session if owned by the client."""
+        self._cancel_access_token_refresh()
+        sessions, self._replaced_sessions = self._replaced_sessions, []
+        if self._session_owned and self._session is not None:
+            sessions.append(self._session)
+        for session in sessions:
+            if not session.closed:
+                await session.close()
+                _LOGGER.debug("Closed the session")
+
+    async def __aenter__(self) -> "ImouAPIClient":
+        """Use the client as an async context manager, closing it on exit."""
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        """Close the client."""
+        await self.async_close()
+
+    def get_statistics(self) -> Dict[str, int]:
+        """Return statistics about the API calls, e.g. how many calls have been saved by sharing identical requests."""
+        return dict(self._statistics)
+
+    def set_json_codec(
+        self, loads: Callable[[Union[str, bytes]], Any], dumps: Callable[[Any], Union[str, bytes]]
+    ) -> None:
+        """Set the functions used to decode the responses and encode the requests (e.g. orjson.loads/dumps)."""
+        self._json_loads = loads
+        self._json_dumps = dumps
+
+    def get_retry_policy(self) -> ImouRetryPolicy:
+        """Get the retry policy for transient failures."""
+        return self._retry_policy
+
+    def set_retry_policy(self, value: ImouRetryPolicy) -> None:
+        """Set the retry policy for transient failures."""
+        self._retry_policy = value
+
+    def get_circuit_breaker(self) -> Optional[ImouCircuitBreaker]:
+        """Get the circuit breaker."""
+        return self._circuit_breaker
+
+    def set_circuit_breaker(self, value: Optional[ImouCircuitBreaker]) -> None:
+        """Set the circuit breaker, None to disable it."""
+        self._circuit_breaker = value
+
+    def set_rate_limit(self, rate: Optional[float], burst: int = 1) -> None:
+        """Limit the requests per second sent by the account (None to disable), requests over the limit wait."""
+        self._rate_limiter = ImouRateLimiter(rate, burst) if rate is not None else None
+
+    def set_device_rate_limit(self, rate: Optional[float], burst: int = 1) -> None:
+        """Limit the requests per second sent to each device (None to disable), requests over the limit wait."""
+        self._device_rate_limit = (rate, burst) if rate is not None else None
+        self._device_rate_limiters = {}
+
+    def get_rate_limit_statistics(self) -> Dict[str, Any]:
+        """Return queue depth and wait time of the account rate limiter and of the rate limiter of each device."""
+        return {
+            "account": self._rate_limiter.get_statistics() if self._rate_limiter is not None else None,
+            "devices": {
+                device_id: rate_limiter.get_statistics()
+                for device_id, rate_limiter in self._device_rate_limiters.items()
+            },
+        }
+
+    def get_message_callback_refresh_interval(self) -> float:
+        """Get for how many seconds the message callback configuration is shared before being requested again."""
+        return self._message_callback_refresh_interval
+
+    def set_message_callback_refresh_interval(self, value: float) -> None:
+        """Set for how many seconds the message callback configuration is shared before being requested again."""
+        self._message_callback_refresh_interval = value
+
+    async def async_get_message_callback(self, force_refresh: bool = False) -> Dict[str, Any]:
+        """Return the message callback configuration of the account, requested at most once per refresh interval."""
+        if (
+            force_refresh
+            or self._message_callback is None
+            or time.monotonic() - self._message_callback_updated_at >= self._message_callback_refresh_interval
+        ):
+            data = await self.async_api_getMessageCallback()
+            self._set_message_callback(data)
+        return dict(self._message_callback) if self._message_callback is not None else {}
+
+    def _set_message_callback(self, data: Dict[str, Any]) -> None:
+        """Update the message callback configuration shared by all the devices."""
+        if self._message_callback is None:
+            self._message_callback = {}
+        self._message_callback.update(data)
+        self._message_callback_updated_at = time.monotonic()
+
+    def get_batch_window(self) -> float:
+        """Get the seconds requests for single devices are collected for before being sent as a batch."""
+        return self._batch_window
+
+    def set_batch_window(self, value: float) -> None:
+        """Set the seconds requests for single devices are collected for before being sent as a batch."""
+        self._batch_window = value
+        self._batchers = {}
+
+    def get_batch_max_size(self) -> int:
+        """Get the max number of devices batched in a single call."""
+        return self._batch_max_size
+
+    def set_batch_max_size(self, value: int) -> None:
+        """Set the max number of devices batched in a single call."""
+        self._batch_max_size = max(1, value)
+        self._batchers = {}
+
+    def get_batch_statistics(self) -> Dict[str, Dict[str, int]]:
+        """Return the number of requests received and of batched calls sent, by api."""
+        return {api: batcher.get_statistics() for api, batcher in self._batchers.items()}
+
+    def _get_batcher(self, api: str, api_method: Callable[[List[str]], Awaitable[dict]]) -> ImouRequestBatcher:
+        """Return the batcher for the given api."""
+        if api not in self._batchers:
+            self._batchers[api] = ImouRequestBatcher(api_method, self._batch_window, self._batch_max_size)
+        return self._batchers[api]
+
+    async def _async_wait_rate_limit(self, device_id: Optional[str]) -> None:
+        """Wait until the request to the device is allowed by the rate limiters."""
+        if device_id is not None and self._device_rate_limit is not None:
+            if device_id not in self._device_rate_limiters:
+                self._device_rate_limiters[device_id] = ImouRateLimiter(*self._device_rate_limit)
+            wait_time = await self._device_rate_limiters[device_id].async_acquire()
+            if wait_time > 0:
+                _LOGGER.debug("[%s] request delayed %.3f seconds by the device rate limit", device_id, wait_time)
+        if self._rate_limiter is not None:
+            wait_time = await self._rate_limiter.async_acquire()
+            if wait_time > 0:
+                _LOGGER.debug("Request delayed %.3f seconds by the rate limit", wait_time)
+
+    def is_cache_enabled(self) -> bool:
+        """Return true if the response cache is enabled."""
+        return self._cache_enabled
+
+    def set_cache_enabled(self, value: bool) -> None:
+        """Set to true to cache the responses of the API endpoints with a time to live."""
+        self._cache_enabled = value
+        if not value:
+            self.clear_cache()
+
+    def get_cache_ttl(self, api: str) -> float:
+        """Get for how long in seconds the response of an API endpoint is cached (0 if not cached)."""
+        return self._cache_ttl.get(api, 0)
+
+    def set_cache_ttl(self, api: str, value: float) -> None:
+        """Set for how long in seconds the response of an API endpoint is cached, 0 to never cache it."""
+        if value > 0:
+            self._cache_ttl[api] = value
+        elif api in self._cache_ttl:
+            del self._cache_ttl[api]
+
+    def get_cache_max_size(self) -> int:
+        """Get the max number of responses kept in the cache."""
+        return self._cache_max_size
+
+    def set_cache_max_size(self, value: int) -> None:
+        """Set the max number of responses kept in the cache."""
+        self._cache_max_size = value
+        while len(self._cache) > self._cache_max_size:
+            self._cache.popitem(last=False)
+
+    def clear_cache(self) -> None:
+        """Remove all the cached responses."""
+        self._cache.clear()
+
+    def _get_cached_response(self, request_key: str) -> Optional[Any]:
+        """Return the cached response for the request if still valid."""
+        cached_response = self._cache.get(request_key)
+        if cached_response is not None:
+            if cached_response[0] > time.monotonic():
+                self._cache.move_to_end(request_key)
+                self._statistics["cache_hits"] = self._statistics["cache_hits"] + 1
+                return cached_response[2]
+            del self._cache[request_key]
+        self._statistics["cache_misses"] = self._statistics["cache_misses"] + 1
+        return None
+
+    def _set_cached_response(self, request_key: str, ttl: float, device_id: Optional[str], data: Any) -> None:
+        """Cache the response of a request, evicting the least recently used responses if full."""
+        self._cache[request_key] = (time.monotonic() + ttl, device_id, data)
+        self._cache.move_to_end(request_key)
+        while len(self._cache) > self._cache_max_size:
+            self._cache.popitem(last=False)
+
+    def _get_cache_generation(self, api: str, device_id: Optional[str]) -> Tuple[int, int]:
+        """Return how many times the cached responses of the API endpoint, for any device and for the given device, \
+            have been invalidated."""
+        return (self._cache_generations.get((api, None), 0), self._cache_generations.get((api, device_id), 0))
+
+    def _invalidate_cached_responses(self, api: str, device_id: Optional[str]) -> None:
+        """Remove the cached responses made outdated by a call to the given API endpoint."""
+        if api not in CACHE_INVALIDATIONS:
+            return
+        # responses of requests in flight must not be cached either
+        for outdated_api in CACHE_INVALIDATIONS[api]:
+            generation_key = (outdated_api, device_id)
+            self._cache_generations[generation_key] = self._cache_generations.get(generation_key, 0) + 1
+        for request_key, cached_response in list(self._cache.items()):
+            if request_key.split(":", 1)[0] not in CACHE_INVALIDATIONS[api]:
+                continue
+            if device_id is None or cached_response[1] is None or cached_response[1] == device_id:
+                del self._cache[request_key]
+
     def set_log_http_requests(self, value: bool) -> None:
         """Set to true if you want in debug logs also HTTP requests and responses."""
         self._log_http_requests_enabled = value
@@ -109,25 +774,76 @@ class ImouAPIClient:
 
     async def async_connect(self) -> bool:
         """Authenticate against the API and retrieve an access token."""
-        # check if we already have an access token and if so assume already authenticated
-        if self.is_connected():
+        # if another caller is already requesting an access token, wait for the same request to complete
+        if self._connect_task is None:
+            # check if we already have an access token and if so assume already authenticated
+            if self.is_connected():
+                return True
+            self._connect_task = asyncio.ensure_future(self._async_request_access_token())
+        return await asyncio.shield(self._connect_task)
+
+    async def _async_request_access_token(self) -> bool:
+        """Call the access token endpoint and store the token. Never run more than once at the same time."""
+        try:
+            _LOGGER.debug("Connecting")
+            data = await self._async_call_api("accessToken", {}, True)
+            if "accessToken" not in data or "expireTime" not in data:
+                raise InvalidResponse(f"accessToken not found in {data}")
+            # store the access token
+            self._access_token = data["accessToken"]
+            self._access_token_expire_time = data["expireTime"]
+            _LOGGER.debug("Retrieved access token")
+            self._connected = True
+            self._schedule_access_token_refresh()
             return True
-        # call the access token endpoint
-        _LOGGER.debug("Connecting")
-        data = await self._async_call_api("accessToken", {}, True)
-        if "accessToken" not in data or "expireTime" not in data:
-            raise InvalidResponse(f"accessToken not found in {data}")
-        # store the access token
-        self._access_token = data["accessToken"]
-        self._access_token_expire_time = data["expireTime"]
-        _LOGGER.debug("Retrieved access token")
-        self._connected = True
-        return True
+        finally:
+            self._connect_task = None
+
+    def _schedule_access_token_refresh(self) -> None:
+        """Schedule the renewal of the access token before it expires."""
+        self._cancel_access_token_refresh()
+        try:
+            # expireTime is the remaining validity of the token in seconds
+            expire_in = float(self._access_token_expire_time)  # type: ignore
+        except (TypeError, ValueError):
+            _LOGGER.debug("Invalid expireTime %s, token not renewed in advance", self._access_token_expire_time)
+            return
+        loop = asyncio.get_running_loop()
+        self._access_token_expire_at = loop.time() + expire_in
+        delay = expire_in - self._token_refresh_margin
+        # never refresh more often than half of the validity of the token
+        if delay < expire_in / 2:
+            delay = expire_in / 2
+        self._token_refresh_handle = loop.call_later(delay, self._start_access_token_refresh)
+        _LOGGER.debug("Access token will be renewed in %d seconds", delay)
+
+    def _cancel_access_token_refresh(self) -> None:
+        """Cancel a scheduled renewal of the access token."""
+        if self._token_refresh_handle is not None:
+            self._token_refresh_handle.cancel()
+            self._token_refresh_handle = None
+
+    def _start_access_token_refresh(self) -> None:
+        """Renew the access token in the background, the current one is used until the new one is available."""
+        self._token_refresh_handle = None
+        if self._connect_task is not None:
+            return
+        _LOGGER.debug("Renewing the access token")
+        self._connect_task = asyncio.ensure_future(self._async_request_access_token())
+        self._connect_task.add_done_callback(self._access_token_refresh_done)
+
+    def _access_token_refresh_done(self, task: asyncio.Future) -> None:
+        """Log a failed renewal of the access token, the token will be renewed when expired instead."""
+        if task.cancelled() or task.exception() is None:
+            return
+        _LOGGER.warning("Unable to renew the access token: %s", task.exception())
 
     async def async_disconnect(self) -> bool:
         """Disconnect from the API."""
+        self._cancel_access_token_refresh()
         self._access_token = None
         self._access_token_expire_time = None
+        self._access_token_expire_at = None
         self._connected = False
         _LOGGER.debug("Disconnected")
         return True
@@ -137,27 +853,169 @@ class ImouAPIClient:
         await self.async_disconnect()
         return await self.async_connect()
 
+    async def _async_renew_access_token(self, expired_token: Optional[str]) -> None:
+        """Request a new access token unless the expired one has already been replaced by another caller."""
+        if self._connect_task is None and self._access_token == expired_token:
+            await self.async_disconnect()
+        await self.async_connect()
+
     def is_connected(self) -> bool:
         """Return true if already connected."""
         return self._connected
 
-    async def _async_call_api(self, api: str, payload: dict, is_connect_request: bool = False) -> dict:  # noqa: C901
-        """Submit request to the HTTP API endpoint."""
+    async def _async_call_api(self, api: str, payload: dict, is_connect_request: bool = False) -> dict:
+        """Submit request to the HTTP API endpoint, sharing the response of identical read-only requests."""
+        if is_connect_request:
+            return await self._async_send_request(api, payload, is_connect_request)
+        device_id = payload.get("deviceId")
+        request_key = f"{api}:{json.dumps(payload, sort_keys=True)}"
+        # return the cached response if any
+        cache_ttl = self._cache_ttl.get(api, 0) if self._cache_enabled else 0
+        if cache_ttl > 0:
+            cached_response = self._get_cached_response(request_key)
+            if cached_response is not None:
+                _LOGGER.debug("Using the cached response of the %s request", api)
+                return cached_response
+        if api not in READ_ONLY_APIS:
+            response_data = await self._async_send_guarded_request(api, payload)
+            self._invalidate_cached_responses(api, device_id)
+            return response_data
+        # if the same request is already in flight, wait for its response instead of sending it again, unless sent
+        # before a call which made its response outdated
+        generation = self._get_cache_generation(api, device_id)
+        pending = self._pending_requests.get(request_key)
+        if pending is not None and pending["generation"] == generation:
+            self._statistics["coalesced_calls"] = self._statistics["coalesced_calls"] + 1
+            _LOGGER.debug("Sharing the response of the %s request already in flight", api)
+        else:
+            request = asyncio.ensure_future(
+                self._async_send_read_request(api, payload, request_key, cache_ttl, generation)
+            )
+            pending = {"request": request, "generation": generation, "waiters": 0}
+            self._pending_requests[request_key] = pending
+            request.add_done_callback(lambda request: self._pending_request_done(request_key, request))
+        pending["waiters"] = pending["waiters"] + 1
+        try:
+            return await asyncio.shield(pending["request"])
+        finally:
+            pending["waiters"] = pending["waiters"] - 1
+            if pending["waiters"] == 0 and not pending["request"].done():
+                # every caller has been cancelled, nobody is waiting for the response anymore
+                _LOGGER.debug("Cancelling the %s request no longer awaited", api)
+                pending["request"].cancel()
+
+    async def _async_send_read_request(
+        self, api: str, payload: dict, request_key: str, cache_ttl: float, generation: Tuple[int, int]
+    ) -> dict:
+        """Send a read-only request and cache its response, unless invalidated while the request was in flight."""
+        device_id = payload.get("deviceId")
+        response_data = await self._async_send_guarded_request(api, payload)
+        if cache_ttl > 0 and self._get_cache_generation(api, device_id) == generation:
+            self._set_cached_response(request_key, cache_ttl, device_id, response_data)
+        return response_data
+
+    def _pending_request_done(self, request_key: str, request: asyncio.Future) -> None:
+        """Forget a completed read-only request."""
+        pending = self._pending_requests.get(request_key)
+        if pending is not None and pending["request"] is request:
+            del self._pending_requests[request_key]
+        # the exception is raised to the callers, mark it as retrieved in case all of them have been cancelled
+        if not request.cancelled():
+            request.exception()
+
+    async def _async_send_guarded_request(self, api: str, payload: dict) -> dict:
+        """Send the request to the HTTP API endpoint unless the circuit of the endpoint and the device is open."""
+        # fail fast if the endpoint kept failing recently for this device
+        circuit_breaker = self._circuit_breaker
+        device_id = payload.get("deviceId")
+        device_list = payload.get("deviceList")
+        if device_id is None and isinstance(device_list, list) and len(device_list) == 1:
+            device_id = device_list[0].get("deviceId")
+        elif device_id is None and isinstance(device_list, list):
+            # a failed batch says nothing about each of its devices, which are then requested one by one
+            circuit_breaker = None
+        if circuit_breaker is None:
+            return await self._async_send_request_with_retries(api, payload)
+        circuit_breaker.before_call(api, device_id)
+        try:
+            response_data = await self._async_send_request_with_retries(api, payload)
+        except BaseException as exception:
+            circuit_breaker.after_call(api, device_id, exception)
+            raise
+        circuit_breaker.after_call(api, device_id)
+        return response_data
+
+    async def _async_send_request_with_retries(self, api: str, payload: dict) -> dict:
+        """Send the request to the HTTP API endpoint, retrying on transient failures as per the retry policy. The \
+            deadline covers the attempts and the delays between them, not the time waiting for the rate limits."""
+        retry_policy = self._retry_policy
+        loop = asyncio.get_running_loop()
+        remaining_time = retry_policy.get_deadline()
+        attempt = 1
+        while True:
+            # requests waiting in the rate limit queue must not time out
+            await self._async_wait_rate_limit(payload.get("deviceId"))
+            started_at = loop.time()
+            try:
+                async with asyncio.timeout(remaining_time):
+                    return await self._async_send_request(api, payload, wait_rate_limit=False)
+            except TimeoutError as exception:
+                raise ConnectionFailed(
+                    f"{api} not completed within {retry_policy.get_deadline()} seconds after {attempt} attempts"
+                ) from exception
+            except ImouException as exception:
+                remaining_time = remaining_time - (loop.time() - started_at)
+                if attempt >= retry_policy.get_max_attempts() or not retry_policy.is_retryable(
+                    exception, api in READ_ONLY_APIS
+                ):
+                    raise
+                # the access token has just been renewed, retry immediately
+                if isinstance(exception, APIError) and exception.code == "TK1002":
+                    delay = 0.0
+                else:
+                    delay = retry_policy.get_delay(attempt)
+                if delay >= remaining_time:
+                    raise ConnectionFailed(
+                        f"{api} not completed within {retry_policy.get_deadline()} seconds after {attempt} attempts"
+                    ) from exception
+                _LOGGER.debug(
+                    "%s attempt %d/%d failed (%s), retrying in %.3f seconds",
+                    api,
+                    attempt,
+                    retry_policy.get_max_attempts(),
+                    exception.message,
+                    delay,
+                )
+                await asyncio.sleep(delay)
+                remaining_time = remaining_time - delay
+                attempt = attempt + 1
+
+    async def _async_send_request(  # noqa: C901
+        self, api: str, payload: dict, is_connect_request: bool = False, wait_rate_limit: bool = True
+    ) -> dict:
+        """Send the request to the HTTP API endpoint and return the data of the response."""
         # connect if not connected
         if not is_connect_request:
+            retries = 1
             while not self.is_connected():
-                _LOGGER.debug("Connection attempt %d/%d", self._retries, MAX_RETRIES)
-                # if noo many attempts, give up
-                if self._retries >= MAX_RETRIES:
+                _LOGGER.debug("Connection attempt %d/%d", retries, MAX_RETRIES)
+                # if too many attempts, give up
+                if retries >= MAX_RETRIES:
                     _LOGGER.error("Too many unsuccesful connection attempts")
                     break
                 try:
                     await self.async_connect()
                 except ImouException as exception:
                     _LOGGER.error(exception.to_string())
-                self._retries = self._retries + 1
+                retries = retries + 1
             if not self.is_connected():
                 raise NotConnected()
+            # if the access token is already expired, wait for a new one
+            if (
+                self._access_token_expire_at is not None
+                and asyncio.get_running_loop().time() >= self._access_token_expire_at
+            ):
+                await self._async_renew_access_token(self._access_token)
 
         # calculate timestamp, nonce, sign and id as per https://open.imoulife.com/book/http/develop.html
         timestamp = round(time.time())
@@ -166,8 +1024,9 @@ class ImouAPIClient:
         request_id = str(random.randint(1, 10000))
 
         # add the access token to the payload if already available
-        if self._access_token is not None:
-            payload["token"] = self._access_token
+        access_token = self._access_token
+        if access_token is not None and not is_connect_request:
+            payload["token"] = access_token
 
         # prepare the API request
         url = f"{self._base_url}/{api}"
@@ -183,28 +1042,42 @@ class ImouAPIClient:
             "id": request_id,
         }
         if self._log_http_requests_enabled:
-            _LOGGER.debug("[HTTP_REQUEST] %s: %s", url, self._redact_log_message(str(body)))
+            _LOGGER.debug("[HTTP_REQUEST] %s: %s", url, _HTTPLogMessage(body, self._redact_log_message_enabled))
 
-        # send the request to the API endpoint
+        # wait for the request to be allowed by the rate limits, unless already done by the caller
+        if wait_rate_limit:
+            await self._async_wait_rate_limit(payload.get("deviceId"))
+
+        # send the request to the API endpoint and read the response
         try:
-            response = await self._session.request("POST", url, json=body, timeout=self._timeout)
+            response = await self.get_session().request(
+                "POST",
+                url,
+                data=self._json_dumps(body),
+                headers={"Content-Type": "application/json"},
+                timeout=self._timeout,
+            )
+            response_status = response.status
+            response_text = await response.read()
+        except ClientConnectorError as exception:
+            # the connection could not be established, the request has not been sent
+            raise ConnectionFailed(f"{exception}", request_sent=False) from exception
         except Exception as exception:
             raise ConnectionFailed(f"{exception}") from exception
 
         # parse the response and look for errors
-        response_status = response.status
         if self._log_http_requests_enabled:
             _LOGGER.debug(
                 "[HTTP_RESPONSE] %s: %s",
                 response_status,
-                self._redact_log_message(str(await response.text())),
+                _HTTPLogMessage(response_text, self._redact_log_message_enabled),
             )
         if response_status != 200:
-            raise APIError(f"status code {response.status}")
+            raise APIError(f"status code {response_status}", str(response_status))
         try:
-            response_body = json.loads(await response.text())
+            response_body = self._json_loads(response_text)
         except Exception as exception:
-            raise InvalidResponse(f"unable to parse response text {await response.text()}") from exception
+            raise InvalidResponse(f"unable to parse response text {response_text!r}") from exception
         if (
             "result" not in response_body
             or "code" not in response_body["result"]
@@ -219,47 +1092,103 @@ class ImouAPIClient:
                 raise InvalidConfiguration(f"Invalid appId or appSecret ({error_message})")
             if result_code == "OP1009":
                 raise NotAuthorized(f"{error_message}")
-            # if the access token is invalid or expired, reconnect
+            # if the access token is invalid or expired, get a new one before the call is retried
             if result_code == "TK1002":
-                await self.async_reconnect()
-                response_data = await self._async_call_api(api, payload, is_connect_request)
-                return response_data
-            raise APIError(error_message)
+                await self._async_renew_access_token(access_token)
+            raise APIError(error_message, result_code)
 
         # return the payload of the reponse
         response_data = response_body["result"]["data"] if "data" in response_body["result"] else {}
         return response_data
 
-    async def async_api_deviceBaseList(self) -> dict:  # pylint: disable=invalid-name
-        """Return the list of registered devices \
+    async def async_api_deviceBaseList(  # pylint: disable=invalid-name
+        self, bind_id: int = -1, limit: int = DEVICE_LIST_PAGE_SIZE
+    ) -> dict:
+        """Return a page of the list of registered devices, starting after bind_id \
             (https://open.imoulife.com/book/http/device/manage/query/deviceBaseList.html)."""
         # define the api endpoint
         api = "deviceBaseList"
         # prepare the payload
         payload = {
-            "bindId": -1,
-            "limit": 50,
+            "bindId": bind_id,
+            "limit": limit,
             "type": "bindAndShare",
             "needApInfo": True,
         }
         # call the api
         return await self._async_call_api(api, payload)
 
-    async def async_api_deviceOpenList(self) -> dict:  # pylint: disable=invalid-name
-        """Return the list of registered devices (Open) \
+    async def async_api_deviceOpenList(  # pylint: disable=invalid-name
+        self, bind_id: int = -1, limit: int = DEVICE_LIST_PAGE_SIZE
+    ) -> dict:
+        """Return a page of the list of registered devices (Open), starting after bind_id \
             (https://open.imoulife.com/book/http/device/manage/query/deviceOpenList.html)."""
         # define the api endpoint
         api = "deviceOpenList"
         # prepare the payload
         payload = {
-            "bindId": -1,
-            "limit": 50,
+            "bindId": bind_id,
+            "limit": limit,
             "type": "bindAndShare",
             "needApInfo": True,
         }
         # call the api
         return await self._async_call_api(api, payload)
 
+    async def async_iter_deviceBaseList(  # pylint: disable=invalid-name
+        self, page_size: int = DEVICE_LIST_PAGE_SIZE
+    ) -> AsyncIterator[dict]:
+        """Yield all the registered devices, walking through every page of deviceBaseList."""
+        async for device in self._async_iter_device_pages(self.async_api_deviceBaseList, page_size):
+            yield device
+
+    async def async_iter_deviceOpenList(  # pylint: disable=invalid-name
+        self, page_size: int = DEVICE_LIST_PAGE_SIZE
+    ) -> AsyncIterator[dict]:
+        """Yield all the registered devices (Open), walking through every page of deviceOpenList."""
+        async for device in self._async_iter_device_pages(self.async_api_deviceOpenList, page_size):
+            yield device
+
+    async def _async_iter_device_pages(self, api_method: Callable, page_size: int) -> AsyncIterator[dict]:
+        """Yield the devices of each page as it arrives, fetching the next page while the current one is consumed."""
+        cursor: Any = -1
+        next_page: Optional[asyncio.Future] = asyncio.ensure_future(api_method(cursor, page_size))
+        previous_devices: Optional[List[Any]] = None
+        try:
+            while next_page is not None:
+                page = await next_page
+                next_page = None
+                if "deviceList" not in page or "count" not in page:
+                    raise InvalidResponse(f"deviceList or count not found in {page}")
+                devices = page["deviceList"]
+                # the same page returned again, the cursor is being ignored
+                device_ids = [device.get("deviceId") for device in devices]
+                if device_ids == previous_devices:
+                    _LOGGER.warning("The same page of devices has been returned twice, stop listing the devices")
+                    break
+                previous_devices = device_ids
+                # a full page means more devices may follow, the last bindId is the cursor of the next page
+                if len(devices) >= page_size and "bindId" in devices[-1]:
+                    if self._is_cursor_after(devices[-1]["bindId"], cursor):
+                        cursor = devices[-1]["bindId"]
+                        next_page = asyncio.ensure_future(api_method(cursor, page_size))
+                    else:
+                        _LOGGER.warning(
+                            "bindId %s is not after %s, stop listing the devices", devices[-1]["bindId"], cursor
+                        )
+                for device in devices:
+                    yield device
+        finally:
+            if next_page is not None and not next_page.done():
+                next_page.cancel()
+
+    def _is_cursor_after(self, cursor: Any, previous_cursor: Any) -> bool:
+        """Return True if the bindId of the next page is after the one of the previous page."""
+        try:
+            return int(cursor) > int(previous_cursor)
+        except (TypeError, ValueError):
+            return str(cursor) != str(previous_cursor)
+
     async def async_api_deviceBaseDetailList(self, devices: List[str]) -> dict:  # pylint: disable=invalid-name
         """Return the details of the requested devices \
             (https://open.imoulife.com/book/http/device/manage/query/deviceBaseDetailList.html)."""
@@ -314,6 +1243,22 @@ class ImouAPIClient:
         # call the api
         return await self._async_call_api(api, payload)
 
+    async def async_load_deviceBaseDetailList(self, device_id: str) -> dict:  # pylint: disable=invalid-name
+        """Return the details of the requested device, batched with the other devices requested at the same time."""
+        batcher = self._get_batcher("deviceBaseDetailList", self.async_api_deviceBaseDetailList)
+        return await batcher.async_load(device_id)
+
+    async def async_load_deviceOpenDetailList(self, device_id: str) -> dict:  # pylint: disable=invalid-name
+        """Return the details of the requested device (Open), batched with the other devices requested at the \
+            same time."""
+        batcher = self._get_batcher("deviceOpenDetailList", self.async_api_deviceOpenDetailList)
+        return await batcher.async_load(device_id)
+
+    async def async_load_listDeviceAbility(self, device_id: str) -> dict:  # pylint: disable=invalid-name
+        """Return the abilities of the requested device, batched with the other devices requested at the same time."""
+        batcher = self._get_batcher("listDeviceAbility", self.async_api_listDeviceAbility)
+        return await batcher.async_load(device_id)
+
     async def async_api_deviceOnline(self, device_id: str) -> dict:  # pylint: disable=invalid-name
         """Device online or offline \
             (https://open.imoulife.com/book/http/device/manage/query/deviceOnline.html)."""
@@ -371,25 +1316,130 @@ class ImouAPIClient:
         # call the api
         return await self._async_call_api(api, payload)
 
-    async def async_api_getAlarmMessage(self, device_id: str) -> dict:  # pylint: disable=invalid-name
-        """Get the device message list of the device channel in the specified time period \
+    async def async_api_getAlarmMessage(  # pylint: disable=invalid-name
+        self,
+        device_id: str,
+        begin_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        count: int = ALARM_PAGE_SIZE,
+        next_alarm_id: Optional[str] = None,
+    ) -> dict:
+        """Get the device message list of the device channel in the specified time period, by default the last \
+            30 days. Provide next_alarm_id to get the next page \
             (https://open.imoulife.com/book/http/device/alarm/getAlarmMessage.html)."""
         # define the api endpoint
         api = "getAlarmMessage"
         # prepare the payload
         now_time = datetime.now()
-        begin_time = now_time - timedelta(days=30)
-        end_time = now_time + timedelta(days=1)
+        if begin_time is None:
+            begin_time = now_time - timedelta(days=ALARM_FIRST_FETCH_DAYS)
+        if end_time is None:
+            end_time = now_time + timedelta(days=1)
         payload = {
             "deviceId": device_id,
-            "count": "10",
+            "count": str(count),
             "channelId": "0",
             "beginTime": begin_time.strftime("%Y-%m-%d %H:%M:%S"),
             "endTime": end_time.strftime("%Y-%m-%d %H:%M:%S"),
         }
+        if next_alarm_id is not None:
+            payload["nextAlarmId"] = str(next_alarm_id)
         # call the api
         return await self._async_call_api(api, payload)
 
+    async def async_get_new_alarms(
+        self, device_id: str, cursor: Optional[Dict[str, Any]] = None
+    ) -> Tuple[List[dict], Dict[str, Any]]:
+        """Return the alarms of the device occurred after the cursor, oldest first, and the cursor to pass to the \
+            next call. Without a cursor the most recent alarms are returned. If there are more new alarms than the \
+            max number of pages, the newest are returned first and the older ones by the following calls."""
+        # alarms already returned are those up to "after" and, while catching up, those from "before" on. "newest"
+        # is where "after" moves to once caught up
+        after = cursor["after"] if cursor is not None else None
+        before = cursor["before"] if cursor is not None else None
+        newest = cursor["newest"] if cursor is not None else None
+        begin_time = datetime.fromtimestamp(after[0]) if after is not None else None
+        end_time = datetime.fromtimestamp(before[0]) if before is not None else None
+        new_alarms: List[dict] = []
+        next_alarm_id = None
+        completed = False
+        for page in range(self._alarm_max_pages):  # pylint: disable=unused-variable
+            data = await self.async_api_getAlarmMessage(
+                device_id,
+                begin_time=begin_time,
+                end_time=end_time,
+                count=self._alarm_page_size,
+                next_alarm_id=next_alarm_id,
+            )
+            if "alarms" not in data:
+                raise InvalidResponse(f"alarms not found in {data}")
+            for alarm in data["alarms"]:
+                if "time" not in alarm or "alarmId" not in alarm:
+                    raise InvalidResponse(f"time or alarmId not found in {alarm}")
+                if self._is_alarm_after(alarm, after) and self._is_alarm_before(alarm, before):
+                    new_alarms.append(alarm)
+            # a full page means more alarms may follow, unless this is the first time
+            if after is None or len(data["alarms"]) < self._alarm_page_size or not data.get("nextAlarmId"):
+                completed = True
+                break
+            next_alarm_id = data["nextAlarmId"]
+        # alarms are returned newest first
+        new_alarms.sort(key=lambda alarm: alarm["time"])
+        if not completed and new_alarms:
+            # the older alarms not fetched yet are requested by the next call, before those fetched now
+            _LOGGER.debug("More than %d pages of new alarms for %s", self._alarm_max_pages, device_id)
+            return new_alarms, {
+                "after": after,
+                "before": self._get_alarm_bound(new_alarms[0]["time"], new_alarms, before),
+                "newest": newest or self._get_alarm_bound(new_alarms[-1]["time"], new_alarms, None),
+            }
+        if newest is not None:
+            after = newest
+        elif new_alarms:
+            after = self._get_alarm_bound(new_alarms[-1]["time"], new_alarms, after)
+        elif after is None:
+            # no alarms yet, only newer alarms are of interest from now on
+            after = (time.time(), set())
+        return new_alarms, {"after": after, "before": None, "newest": None}
+
+    def _is_alarm_after(self, alarm: dict, bound: Optional[Tuple[float, Set[str]]]) -> bool:
+        """Return True if the alarm occurred after the bound, made of a time and the ids of the alarms at that \
+            time already returned."""
+        if bound is None:
+            return True
+        return alarm["time"] > bound[0] or (alarm["time"] == bound[0] and str(alarm["alarmId"]) not in bound[1])
+
+    def _is_alarm_before(self, alarm: dict, bound: Optional[Tuple[float, Set[str]]]) -> bool:
+        """Return True if the alarm occurred before the bound, made of a time and the ids of the alarms at that \
+            time already returned."""
+        if bound is None:
+            return True
+        return alarm["time"] < bound[0] or (alarm["time"] == bound[0] and str(alarm["alarmId"]) not in bound[1])
+
+    def _get_alarm_bound(
+        self, alarm_time: float, alarms: List[dict], bound: Optional[Tuple[float, Set[str]]]
+    ) -> Tuple[float, Set[str]]:
+        """Return the bound at the given time, with the ids of the alarms at that time, including those of the \
+            previous bound if at the same time."""
+        ids = set(bound[1]) if bound is not None and bound[0] == alarm_time else set()
+        return alarm_time, ids | {str(alarm["alarmId"]) for alarm in alarms if alarm["time"] == alarm_time}
+
+    def get_alarm_page_size(self) -> int:
+        """Get the number of alarms requested with each call."""
+        return self._alarm_page_size
+
+    def set_alarm_page_size(self, value: int) -> None:
+        """Set the number of alarms requested with each call."""
+        self._alarm_page_size = max(1, value)
+
+    def get_alarm_max_pages(self) -> int:
+        """Get the max number of pages of alarms requested by async_get_new_alarms()."""
+        return self._alarm_max_pages
+
+    def set_alarm_max_pages(self, value: int) -> None:
+        """Set the max number of pages of alarms requested by async_get_new_alarms()."""
+        self._alarm_max_pages = max(1, value)
+
     async def async_api_getNightVisionMode(self, device_id: str) -> dict:  # pylint: disable=invalid-name
         """Query the night vision mode configuration of the device \
             (https://open.imoulife.com/book/http/device/config/video/getNightVisionMode.html)."""
@@ -440,7 +1490,12 @@ class ImouAPIClient:
             "status": "on",
         }
         # call the api
-        return await self._async_call_api(api, payload)
+        data = await self._async_call_api(api, payload)
+        # keep the shared configuration in sync
+        self._set_message_callback(
+            {"callbackFlag": payload["callbackFlag"], "callbackUrl": callback_url, "status": payload["status"]}
+        )
+        return data
 
     async def async_api_setMessageCallbackOff(self) -> dict:  # pylint: disable=invalid-name
         """Unset the message callback address. \
@@ -452,7 +1507,11 @@ class ImouAPIClient:
             "status": "off",
         }
         # call the api
-        return await self._async_call_api(api, payload)
+        data = await self._async_call_api(api, payload)
+        # keep the shared configuration in sync
+        if self._message_callback is not None:
+            self._set_message_callback({"status": payload["status"]})
+        return data
 
     async def async_api_restartDevice(self, device_id: str) -> dict:  # pylint: disable=invalid-name
         """Restart the device. \
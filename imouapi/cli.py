@@ -5,8 +5,6 @@ import logging
 import re
 import sys
 
-import aiohttp
-
 from .api import ImouAPIClient
 from .const import IMOU_CAPABILITIES, IMOU_SWITCHES
 from .device import ImouDevice, ImouDiscoverService
@@ -16,8 +14,6 @@ from .exceptions import ImouException
 
 async def async_run_command(command: str, api_client: ImouAPIClient, args: list[str]):  # noqa: C901
     """Run a command."""
-    session = aiohttp.ClientSession()
-    api_client.set_session(session)
     try:
         if command == "discover":
             discover_service = ImouDiscoverService(api_client)
@@ -315,7 +311,12 @@ async def async_run_command(command: str, api_client: ImouAPIClient, args: list[
 
     except ImouException as exception:
         print(exception.to_string())
-    await session.close()
+
+
+async def async_run(command: str, api_client: ImouAPIClient, args: list[str]):
+    """Run a command, closing the client's session when done."""
+    async with api_client:
+        await async_run_command(command, api_client, args)
 
 
 class ImouCli:
@@ -398,224 +399,224 @@ class ImouCli:
             api_client.set_log_http_requests(self.log_http_requests)
 
         if self.command == "discover":
-            asyncio.run(async_run_command(self.command, api_client, self.args))
+            asyncio.run(async_run(self.command, api_client, self.args))
 
         elif self.command == "get_device":
             if len(self.args) == 1:
-                asyncio.run(async_run_command(self.command, api_client, self.args))
+                asyncio.run(async_run(self.command, api_client, self.args))
             else:
                 print("ERROR: provide device id")
 
         elif self.command == "get_device_raw":
             if len(self.args) == 1:
-                asyncio.run(async_run_command(self.command, api_client, self.args))
+                asyncio.run(async_run(self.command, api_client, self.args))
             else:
                 print("ERROR: provide device_id")
 
         elif self.command == "get_sensor":
             if len(self.args) == 2:
-                asyncio.run(async_run_command(self.command, api_client, self.args))
+                asyncio.run(async_run(self.command, api_client, self.args))
             else:
                 print("ERROR: provide device_id and sensor_name")
 
         elif self.command == "get_binary_sensor":
             if len(self.args) == 2:
-                asyncio.run(async_run_command(self.command, api_client, self.args))
+                asyncio.run(async_run(self.command, api_client, self.args))
             else:
                 print("ERROR: provide device_id and sensor_name")
 
         elif self.command == "get_switch":
             if len(self.args) == 2:
-                asyncio.run(async_run_command(self.command, api_client, self.args))
+                asyncio.run(async_run(self.command, api_client, self.args))
             else:
                 print("ERROR: provide device_id and sensor_name")
 
         elif self.command == "set_switch":
             if len(self.args) == 3:
-                asyncio.run(async_run_command(self.command, api_client, self.args))
+                asyncio.run(async_run(self.command, api_client, self.args))
             else:
                 print("ERROR: provide device_id, sensor_name and value")
 
         elif self.command == "get_select":
             if len(self.args) == 2:
-                asyncio.run(async_run_command(self.command, api_client, self.args))
+                asyncio.run(async_run(self.command, api_client, self.args))
             else:
                 print("ERROR: provide device_id and sensor_name")
 
         elif self.command == "set_select":
             if len(self.args) == 3:
-                asyncio.run(async_run_command(self.command, api_client, self.args))
+                asyncio.run(async_run(self.command, api_client, self.args))
             else:
                 print("ERROR: provide device_id, sensor_name and value")
 
         elif self.command == "press_button":
             if len(self.args) == 2:
-                asyncio.run(async_run_command(self.command, api_client, self.args))
+                asyncio.run(async_run(self.command, api_client, self.args))
             else:
                 print("ERROR: provide device_id and sensor_name")
 
         elif self.command == "get_siren":
             if len(self.args) == 2:
-                asyncio.run(async_run_command(self.command, api_client, self.args))
+                asyncio.run(async_run(self.command, api_client, self.args))
             else:
                 print("ERROR: provide device_id and sensor_name")
 
         elif self.command == "set_siren":
             if len(self.args) == 3:
-                asyncio.run(async_run_command(self.command, api_client, self.args))
+                asyncio.run(async_run(self.command, api_client, self.args))
             else:
                 print("ERROR: provide device_id, sensor_name and value")
 
         elif self.command == "get_diagnostics":
             if len(self.args) == 1:
-                asyncio.run(async_run_command(self.command, api_client, self.args))
+                asyncio.run(async_run(self.command, api_client, self.args))
             else:
                 print("ERROR: provide device id")
 
         elif self.command == "get_camera_image":
             if len(self.args) == 2:
-                asyncio.run(async_run_command(self.command, api_client, self.args))
+                asyncio.run(async_run(self.command, api_client, self.args))
             else:
                 print("ERROR: provide device id, sensor_name")
 
         elif self.command == "get_camera_stream":
             if len(self.args) == 2:
-                asyncio.run(async_run_command(self.command, api_client, self.args))
+                asyncio.run(async_run(self.command, api_client, self.args))
             else:
                 print("ERROR: provide device id, sensor_name")
 
         elif self.command == "api_deviceBaseList":
-            asyncio.run(async_run_command(self.command, api_client, self.args))
+            asyncio.run(async_run(self.command, api_client, self.args))
 
         elif self.command == "api_deviceOpenList":
-            asyncio.run(async_run_command(self.command, api_client, self.args))
+            asyncio.run(async_run(self.command, api_client, self.args))
 
         elif self.command == "api_deviceBaseDetailList":
             if len(self.args) == 1:
-                asyncio.run(async_run_command(self.command, api_client, self.args))
+                asyncio.run(async_run(self.command, api_client, self.args))
             else:
                 print("ERROR: provide device_id")
 
         elif self.command == "api_deviceOpenDetailList":
             if len(self.args) == 1:
-                asyncio.run(async_run_command(self.command, api_client, self.args))
+                asyncio.run(async_run(self.command, api_client, self.args))
             else:
                 print("ERROR: provide device_id")
 
         elif self.command == "api_listDeviceAbility":
             if len(self.args) == 1:
-                asyncio.run(async_run_command(self.command, api_client, self.args))
+                asyncio.run(async_run(self.command, api_client, self.args))
             else:
                 print("ERROR: provide device_id")
 
         elif self.command == "api_getAlarmMessage":
             if len(self.args) == 1:
-                asyncio.run(async_run_command(self.command, api_client, self.args))
+                asyncio.run(async_run(self.command, api_client, self.args))
             else:
                 print("ERROR: provide device_id")
 
         elif self.command == "api_deviceStorage":
             if len(self.args) == 1:
-                asyncio.run(async_run_command(self.command, api_client, self.args))
+                asyncio.run(async_run(self.command, api_client, self.args))
             else:
                 print("ERROR: provide device_id")
 
         elif self.command == "api_getDeviceCameraStatus":
             if len(self.args) == 2:
-                asyncio.run(async_run_command(self.command, api_client, self.args))
+                asyncio.run(async_run(self.command, api_client, self.args))
             else:
                 print("ERROR: provide device_id and sensor_name")
 
         elif self.command == "api_setDeviceCameraStatus":
             if len(self.args) == 3:
-                asyncio.run(async_run_command(self.command, api_client, self.args))
+                asyncio.run(async_run(self.command, api_client, self.args))
             else:
                 print("ERROR: provide device_id, sensor_name and value")
 
         elif self.command == "api_getNightVisionMode":
             if len(self.args) == 1:
-                asyncio.run(async_run_command(self.command, api_client, self.args))
+                asyncio.run(async_run(self.command, api_client, self.args))
             else:
                 print("ERROR: provide device_id")
 
         elif self.command == "api_setNightVisionMode":
             if len(self.args) == 2:
-                asyncio.run(async_run_command(self.command, api_client, self.args))
+                asyncio.run(async_run(self.command, api_client, self.args))
             else:
                 print("ERROR: provide device_id and mode")
 
         elif self.command == "api_getMessageCallback":
-            asyncio.run(async_run_command(self.command, api_client, self.args))
+            asyncio.run(async_run(self.command, api_client, self.args))
 
         elif self.command == "api_setMessageCallbackOn":
             if len(self.args) == 1:
-                asyncio.run(async_run_command(self.command, api_client, self.args))
+                asyncio.run(async_run(self.command, api_client, self.args))
             else:
                 print("ERROR: provide url")
 
         elif self.command == "api_setMessageCallbackOff":
-            asyncio.run(async_run_command(self.command, api_client, self.args))
+            asyncio.run(async_run(self.command, api_client, self.args))
 
         elif self.command == "api_restartDevice":
             if len(self.args) == 1:
-                asyncio.run(async_run_command(self.command, api_client, self.args))
+                asyncio.run(async_run(self.command, api_client, self.args))
             else:
                 print("ERROR: provide device_id")
 
         elif self.command == "api_deviceSdcardStatus":
             if len(self.args) == 1:
-                asyncio.run(async_run_command(self.command, api_client, self.args))
+                asyncio.run(async_run(self.command, api_client, self.args))
             else:
                 print("ERROR: provide device_id")
 
         elif self.command == "api_devicePTZInfo":
             if len(self.args) == 1:
-                asyncio.run(async_run_command(self.command, api_client, self.args))
+                asyncio.run(async_run(self.command, api_client, self.args))
             else:
                 print("ERROR: provide device_id")
 
         elif self.command == "api_controlLocationPTZ":
             if len(self.args) == 4:
-                asyncio.run(async_run_command(self.command, api_client, self.args))
+                asyncio.run(async_run(self.command, api_client, self.args))
             else:
                 print("ERROR: provide device_id, h, v ,z")
 
         elif self.command == "api_controlMovePTZ":
             if len(self.args) == 3:
-                asyncio.run(async_run_command(self.command, api_client, self.args))
+                asyncio.run(async_run(self.command, api_client, self.args))
             else:
                 print("ERROR: provide device_id, operation, duration")
 
         elif self.command == "api_setDeviceSnapEnhanced":
             if len(self.args) == 1:
-                asyncio.run(async_run_command(self.command, api_client, self.args))
+                asyncio.run(async_run(self.command, api_client, self.args))
             else:
                 print("ERROR: provide device_id")
 
         elif self.command == "api_bindDeviceLive":
             if len(self.args) == 2:
-                asyncio.run(async_run_command(self.command, api_client, self.args))
+                asyncio.run(async_run(self.command, api_client, self.args))
             else:
                 print("ERROR: provide device_id, profile")
 
         elif self.command == "api_getLiveStreamInfo":
             if len(self.args) == 1:
-                asyncio.run(async_run_command(self.command, api_client, self.args))
+                asyncio.run(async_run(self.command, api_client, self.args))
             else:
                 print("ERROR: provide device_id")
 
         elif self.command == "api_liveList":
-            asyncio.run(async_run_command(self.command, api_client, self.args))
+            asyncio.run(async_run(self.command, api_client, self.args))
 
         elif self.command == "api_unbindLive":
             if len(self.args) == 1:
-                asyncio.run(async_run_command(self.command, api_client, self.args))
+                asyncio.run(async_run(self.command, api_client, self.args))
             else:
                 print("ERROR: provide live_token")
 
         elif self.command == "api_getDevicePowerInfo":
             if len(self.args) == 1:
-                asyncio.run(async_run_command(self.command, api_client, self.args))
+                asyncio.run(async_run(self.command, api_client, self.args))
             else:
                 print("ERROR: provide device_id")
 
@@ -6,15 +6,156 @@ API_URL = "https://openapi.easy4ip.com/openapi"
 # default connection timeout
 DEFAULT_TIMEOUT = 10
 
+# connection pool of the session owned by the client: max connections per host, seconds an idle connection is kept
+# alive and seconds DNS resolutions are cached
+CONNECTION_LIMIT_PER_HOST = 10
+KEEPALIVE_TIMEOUT = 60.0
+DNS_CACHE_TTL = 300
+
+# max number of devices returned by each page of deviceBaseList and deviceOpenList
+DEVICE_LIST_PAGE_SIZE = 50
+
+# requests for a single device to batchable endpoints are collected for up to BATCH_WINDOW seconds and sent together,
+# up to BATCH_MAX_SIZE devices per call
+BATCH_WINDOW = 0.005
+BATCH_MAX_SIZE = 20
+
 # max api retries
 MAX_RETRIES = 3
 
+# default retry policy: max attempts per call, base and max delay in seconds between attempts, max duration of a call
+RETRY_MAX_ATTEMPTS = 3
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 10.0
+RETRY_DEADLINE = 30.0
+
+# result codes and HTTP status codes returned by the API for which the call is retried
+RETRY_CODES = ["TK1002", "500", "502", "503", "504"]
+
+# circuit breaker: consecutive failures of an API endpoint for a device after which calls fail fast and for how many
+# seconds before a new call is attempted
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RECOVERY_TIMEOUT = 60.0
+
+# for how many seconds the account-wide message callback configuration is shared before being requested again
+MESSAGE_CALLBACK_REFRESH_INTERVAL = 60.0
+
+# how many seconds before its expiration the access token is renewed in the background
+TOKEN_REFRESH_MARGIN = 300
+
+# read-only API endpoints, identical requests in flight at the same time are sent only once
+READ_ONLY_APIS = [
+    "deviceBaseList",
+    "deviceOpenList",
+    "deviceBaseDetailList",
+    "deviceOpenDetailList",
+    "listDeviceAbility",
+    "deviceOnline",
+    "deviceStorage",
+    "getDeviceCameraStatus",
+    "getAlarmMessage",
+    "getNightVisionMode",
+    "getMessageCallback",
+    "deviceSdcardStatus",
+    "devicePTZInfo",
+    "getLiveStreamInfo",
+    "liveList",
+    "getDevicePowerInfo",
+]
+
+# when the response cache is enabled, for how long in seconds the response of an API endpoint is cached
+CACHE_TTL = {
+    "getMessageCallback": 300,
+    "deviceSdcardStatus": 600,
+    "getNightVisionMode": 300,
+    "listDeviceAbility": 3600,
+    "deviceBaseDetailList": 3600,
+}
+
+# max number of responses kept in the cache, the least recently used are evicted first
+CACHE_MAX_SIZE = 1000
+
+# cached responses invalidated when calling an API endpoint changing the configuration of the device
+CACHE_INVALIDATIONS = {
+    "setNightVisionMode": ["getNightVisionMode"],
+    "setMessageCallback": ["getMessageCallback"],
+    "setDeviceCameraStatus": ["getDeviceCameraStatus"],
+}
+
 # how long to wait in seconds for the image to be available before downloading it
 CAMERA_WAIT_BEFORE_DOWNLOAD = 1.5
 
 # for dormant devices for how long to wait in seconds after waking the device up
 WAIT_AFTER_WAKE_UP = 4.0
 
+# default path, host and port the webhook receiver listens on for the messages pushed by the Imou cloud
+WEBHOOK_PATH = "/imou"
+WEBHOOK_HOST = "127.0.0.1"
+WEBHOOK_PORT = 8080
+
+# query parameter of the callback url carrying the shared secret of the webhook receiver
+WEBHOOK_TOKEN_PARAM = "token"
+
+# types of the pushed messages handled as alarms, any other is ignored
+WEBHOOK_ALARM_TYPES = [
+    "videoMotion",
+    "human",
+    "humanoid",
+    "smartHuman",
+    "crossLine",
+    "crossRegion",
+    "faceDetect",
+    "alarmPIR",
+    "videoBlind",
+    "babyCry",
+    "abAlarmSound",
+    "carDetect",
+]
+
+# online status reported by the status messages pushed by the Imou cloud
+WEBHOOK_STATUS = {
+    "online": "1",
+    "offline": "0",
+    "sleep": "4",
+    "dormant": "4",
+}
+
+# alarms requested with each getAlarmMessage call, max number of pages walked through when fetching new alarms and
+# how many days back alarms are requested the first time
+ALARM_PAGE_SIZE = 10
+ALARM_MAX_PAGES = 10
+ALARM_FIRST_FETCH_DAYS = 30
+
+# max number of alarms buffered by an alarm stream and policies when the buffer is full
+ALARM_STREAM_SIZE = 100
+ALARM_OVERFLOW_DROP_OLDEST = "drop_oldest"
+ALARM_OVERFLOW_BLOCK = "block"
+ALARM_OVERFLOW_COALESCE = "coalesce"
+ALARM_OVERFLOW_POLICIES = [ALARM_OVERFLOW_DROP_OLDEST, ALARM_OVERFLOW_BLOCK, ALARM_OVERFLOW_COALESCE]
+
+# number of alarms recently published by a device remembered to publish only once those both pushed and polled
+ALARM_PUBLISHED_SIZE = 200
+
+# days alarms are kept in the alarm store and seconds between purges of the old alarms
+ALARM_STORE_RETENTION_DAYS = 30
+ALARM_STORE_PURGE_INTERVAL = 3600.0
+
+# max number of devices of a fleet refreshed concurrently
+FLEET_MAX_CONCURRENCY = 10
+
+# max number of devices whose capabilities are requested with a single listDeviceAbility call
+FLEET_ABILITY_BATCH_SIZE = 50
+
+# max number of entities of the same device updated concurrently
+DEVICE_UPDATE_MAX_CONCURRENCY = 4
+
+# during discovery, max number of devices whose details are requested with a single deviceBaseDetailList call
+DISCOVERY_BATCH_SIZE = 10
+
+# during discovery, max number of concurrent requests and how long to wait in seconds for a device to initialize
+DISCOVERY_MAX_CONCURRENCY = 5
+DISCOVERY_DEVICE_TIMEOUT = 30.0
+
 # PTZ operation mapping
 PTZ_OPERATIONS = {
     "UP": 0,
@@ -2,14 +2,24 @@
 import asyncio
 import logging
 import re
-from typing import Any, Dict, List, Union
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, Union
 
+from .alarms import ImouAlarmStream, alarm_from_api, alarm_from_event
 from .api import ImouAPIClient
 from .const import (
+    ALARM_OVERFLOW_DROP_OLDEST,
+    ALARM_PUBLISHED_SIZE,
+    ALARM_STREAM_SIZE,
     BINARY_SENSORS,
     BUTTONS,
     CAMERA_WAIT_BEFORE_DOWNLOAD,
     CAMERAS,
+    DEVICE_UPDATE_MAX_CONCURRENCY,
+    DISCOVERY_BATCH_SIZE,
+    DISCOVERY_DEVICE_TIMEOUT,
+    DISCOVERY_MAX_CONCURRENCY,
     IMOU_CAPABILITIES,
     IMOU_SWITCHES,
     ONLINE_STATUS,
@@ -23,12 +33,13 @@ from .device_entity import (
     ImouButton,
     ImouCamera,
     ImouEntity,
+    ImouListeners,
     ImouSelect,
     ImouSensor,
     ImouSiren,
     ImouSwitch,
 )
-from .exceptions import InvalidResponse
+from .exceptions import ImouException, InvalidResponse
 
 _LOGGER: logging.Logger = logging.getLogger(__package__)
 
@@ -74,6 +85,18 @@ class ImouDevice:
         self._sleepable = False
         self._wait_after_wakeup = WAIT_AFTER_WAKE_UP
         self._camera_wait_before_download = CAMERA_WAIT_BEFORE_DOWNLOAD
+        self._update_max_concurrency = DEVICE_UPDATE_MAX_CONCURRENCY
+        # errors raised by the entities during the last update, by entity name
+        self._update_errors: Dict[str, ImouException] = {}
+        # wake up sessions in progress and the shared result of waking up the device within the session
+        self._wakeup_sessions = 0
+        self._wakeup_result: Optional[asyncio.Future] = None
+        # streams the alarms of the device are published to
+        self._alarm_streams: List[ImouAlarmStream] = []
+        # channel, time and type of the alarms recently published, either pushed or polled
+        self._published_alarms: "OrderedDict[Tuple[str, int, str], str]" = OrderedDict()
+        # callbacks notified when the device or its entities change
+        self._listeners = ImouListeners()
 
     def get_device_id(self) -> str:
         """Get device id."""
@@ -155,6 +178,10 @@ class ImouDevice:
         """Is enabled."""
         return self._enabled
 
+    def is_initialized(self) -> bool:
+        """If the details of the device have been retrieved."""
+        return self._initialized
+
     def set_wait_after_wakeup(self, value: float) -> None:
         """Set wait after wakeup."""
         self._wait_after_wakeup = value
@@ -171,27 +198,52 @@ class ImouDevice:
         """Get camera wait before download."""
         return self._camera_wait_before_download
 
+    def set_update_max_concurrency(self, value: int) -> None:
+        """Set the max number of entities updated concurrently."""
+        self._update_max_concurrency = max(1, value)
+
+    def get_update_max_concurrency(self) -> int:
+        """Get the max number of entities updated concurrently."""
+        return self._update_max_concurrency
+
+    def get_update_errors(self) -> Dict[str, ImouException]:
+        """Get the errors raised by the entities during the last update, by entity name."""
+        return dict(self._update_errors)
+
     def _add_sensor_instance(self, platform, instance):
         """Add a sensor instance."""
         instance.set_device(self)
         self._sensor_instances[platform].append(instance)
 
-    async def async_initialize(self) -> None:
-        """Initialize the instance by retrieving the device details and associated sensors."""
-        # get the details for this device from the API
-        device_array = await self._api_client.async_api_deviceBaseDetailList([self._device_id])
-        if "deviceList" not in device_array or len(device_array["deviceList"]) != 1:
-            raise InvalidResponse(f"deviceList not found in {str(device_array)}")
-        # reponse is an array, our data is in the first element
-        device_data = device_array["deviceList"][0]
+    async def async_initialize(
+        self, device_data: Optional[dict] = None, capabilities: Optional[List[str]] = None
+    ) -> None:
+        """
+        Initialize the instance by retrieving the device details and associated sensors.
+
+        Parameters:
+            device_data: the details of this device as returned by deviceBaseDetailList, if already available
+            capabilities: other capabilities of this device and its channels (e.g. from listDeviceAbility), merged \
+                with those of the details
+        """
+        if device_data is None:
+            # get the details for this device from the API
+            device_array = await self._api_client.async_load_deviceBaseDetailList(self._device_id)
+            if "deviceList" not in device_array or len(device_array["deviceList"]) != 1:
+                raise InvalidResponse(f"deviceList not found in {str(device_array)}")
+            # reponse is an array, our data is in the first element
+            device_data = device_array["deviceList"][0]
         try:
             # get device details
             self._catalog = device_data["catalog"]
             self._firmware = device_data["version"]
             self._name = device_data["name"]
             self._device_model = device_data["deviceModel"]
-            # get device capabilities
+            # get device capabilities, adding those already known which the details may not list
             self._capabilities = device_data["ability"].split(",")
+            for capability in capabilities or []:
+                if capability not in self._capabilities:
+                    self._capabilities.append(capability)
             # Add undocumented capabilities or capabilities inherited from other capabilities
             self._capabilities.append("MotionDetect")
             if "WLM" in self._capabilities:
@@ -369,12 +421,120 @@ class ImouDevice:
         if "onLine" not in data or data["onLine"] not in ONLINE_STATUS:
             raise InvalidResponse(f"onLine not valid in {data}")
         self._status = data["onLine"]
+        if self._wakeup_sessions > 0:
+            # within an update cycle, share the status with the entities depending on it
+            self._set_entities_device_status(self._status)
+
+    def process_event(self, event: Dict[str, Any]) -> List[str]:
+        """Update the device and its entities from a pushed event without calling the API. Return the names \
+            of the entities updated."""
+        status = self._status
+        if event["type"] == "status":
+            self._status = event["status"]
+        elif event["type"] == "alarm":
+            alarm = alarm_from_event(event)
+            if not self._is_alarm_published(alarm):
+                # pushed alarms cannot wait for the consumers
+                for stream in list(self._alarm_streams):
+                    stream.put_nowait(alarm)
+        updated = []
+        changed = []
+        for sensor_instance in self.get_all_sensors():
+            if sensor_instance.process_event(event):
+                updated.append(sensor_instance.get_name())
+                if sensor_instance.notify_listeners():
+                    changed.append(sensor_instance.get_name())
+        if changed or status != self._status:
+            self._listeners.notify(self, changed)
+        return updated
+
+    def add_listener(self, callback: Callable[["ImouDevice", List[str]], Any]) -> Callable[[], None]:
+        """Register a callback, either a function or a coroutine function, called with the device and the names of \
+            the entities changed when an update or a pushed event changes the status of the device or its entities. \
+            Return a function unregistering it."""
+        return self._listeners.add(callback)
+
+    def remove_listener(self, callback: Callable[["ImouDevice", List[str]], Any]) -> None:
+        """Unregister a callback."""
+        self._listeners.remove(callback)
+
+    async def async_notify_listeners(self, changed: List[str]) -> None:
+        """Notify the listeners of the device that the given entities changed, waiting for the async ones."""
+        await self._listeners.async_notify(self, changed)
+
+    def alarms(self, max_size: int = ALARM_STREAM_SIZE, overflow: str = ALARM_OVERFLOW_DROP_OLDEST) -> ImouAlarmStream:
+        """Return a new stream of the alarms of the device, either polled by the motionAlarm sensor or pushed, \
+            to be consumed with `async for`. The stream stops receiving alarms once closed."""
+        stream = ImouAlarmStream(max_size, overflow, on_close=self.remove_alarm_stream)
+        self.add_alarm_stream(stream)
+        return stream
+
+    def add_alarm_stream(self, stream: ImouAlarmStream) -> None:
+        """Publish the alarms of the device to the given stream."""
+        if stream not in self._alarm_streams:
+            self._alarm_streams.append(stream)
+
+    def remove_alarm_stream(self, stream: ImouAlarmStream) -> None:
+        """Stop publishing the alarms of the device to the given stream."""
+        if stream in self._alarm_streams:
+            self._alarm_streams.remove(stream)
+
+    async def async_publish_alarms(self, alarms: List[Dict[str, Any]]) -> None:
+        """Publish alarms returned by getAlarmMessage to the streams, oldest first, unless already pushed. Wait for \
+            the consumers of streams which are full and blocking."""
+        for alarm in alarms:
+            stream_alarm = alarm_from_api(alarm)
+            if self._is_alarm_published(stream_alarm):
+                continue
+            for stream in list(self._alarm_streams):
+                await stream.async_put(stream_alarm)
+
+    def _is_alarm_published(self, alarm: Dict[str, Any]) -> bool:
+        """Return True if the same alarm has already been published from the other source or pushed, otherwise \
+            remember it as published. Polled alarms are already returned once, as per their ids."""
+        key = (alarm["channel_id"], int(alarm["time"]), alarm["msgType"])
+        source = self._published_alarms.get(key)
+        if source is not None and (source != alarm["source"] or source == "push"):
+            return True
+        self._published_alarms[key] = alarm["source"]
+        if len(self._published_alarms) > ALARM_PUBLISHED_SIZE:
+            self._published_alarms.popitem(last=False)
+        return False
+
+    def _set_entities_device_status(self, status: Optional[str]) -> None:
+        """Provide the online status of the device to the entities depending on it."""
+        for sensor_instance in self.get_all_sensors():
+            if sensor_instance.get_name() in ("status", "online"):
+                sensor_instance.set_device_status(status)
 
     async def async_wakeup(self) -> bool:
-        """Wake up a dormant device."""
+        """Wake up a dormant device. Within a wake up session the device is woken up once and the result reused."""
         # if this is a regular device, just return
         if not self._sleepable:
             return True
+        if self._wakeup_sessions == 0:
+            return await self._async_wakeup()
+        # the first caller within the session wakes up the device, the others wait for the same result
+        if self._wakeup_result is None:
+            self._wakeup_result = asyncio.ensure_future(self._async_wakeup())
+        return await asyncio.shield(self._wakeup_result)
+
+    @asynccontextmanager
+    async def async_wakeup_session(self) -> AsyncIterator["ImouDevice"]:
+        """Wake up session, e.g. an update cycle, sharing the result of waking up the device and its online status \
+            among the entities."""
+        self._wakeup_sessions += 1
+        try:
+            yield self
+        finally:
+            self._wakeup_sessions -= 1
+            if self._wakeup_sessions == 0:
+                self._wakeup_result = None
+                # entities updated outside of a session get the status on their own
+                self._set_entities_device_status(None)
+
+    async def _async_wakeup(self) -> bool:
+        """Wake up a dormant device."""
         # if the device is already online, return
         await self.async_refresh_status()
         if ONLINE_STATUS[self._status] == "Online":
@@ -401,18 +561,50 @@ class ImouDevice:
             await self.async_initialize()
         _LOGGER.debug("[%s] update requested", self.get_name())
 
-        # check if the device is online
-        await self.async_refresh_status()
+        status = self._status
+        async with self.async_wakeup_session():
+            # check if the device is online
+            await self.async_refresh_status()
+            if self._sleepable and ONLINE_STATUS[self._status] == "Online" and self._wakeup_result is None:
+                # already awake, no need to check again for each entity
+                self._wakeup_result = asyncio.get_running_loop().create_future()
+                self._wakeup_result.set_result(True)
+            changed = await self._async_update_sensors()
+        if changed or status != self._status:
+            await self._listeners.async_notify(self, changed)
+        return True
 
-        # update the status of all the sensors (if the device is online)
+    async def _async_update_sensors(self) -> List[str]:
+        """Update the status of all the sensors concurrently (if the device is online) and return the names of \
+            those changed."""
+        self._update_errors = {}
+        changed: List[str] = []
         if self.is_online():
-            for (
-                platform,  # pylint: disable=unused-variable
-                sensor_instances_array,
-            ) in self._sensor_instances.items():
-                for sensor_instance in sensor_instances_array:
-                    await sensor_instance.async_update()
-        return True
+            sensor_instances = self.get_all_sensors()
+            semaphore = asyncio.Semaphore(self._update_max_concurrency)
+
+            async def async_update_sensor(sensor_instance: ImouEntity) -> None:
+                async with semaphore:
+                    try:
+                        await sensor_instance.async_update()
+                        if await sensor_instance.async_notify_listeners():
+                            changed.append(sensor_instance.get_name())
+                    except ImouException as exception:
+                        # do not let a failing sensor affect the others
+                        _LOGGER.warning(
+                            "[%s] failed to update %s: %s",
+                            self.get_name(),
+                            sensor_instance.get_name(),
+                            exception.to_string(),
+                        )
+                        self._update_errors[sensor_instance.get_name()] = exception
+
+            await asyncio.gather(*[async_update_sensor(sensor_instance) for sensor_instance in sensor_instances])
+            # if no sensor polling the API could be updated, the device is not working
+            polled = [sensor for sensor in sensor_instances if sensor.is_enabled() and sensor.is_polled()]
+            if polled and all(sensor.get_name() in self._update_errors for sensor in polled):
+                raise next(iter(self._update_errors.values()))
+        return changed
 
     def to_string(self) -> str:
         """Return the object as a string."""
@@ -616,36 +808,158 @@ class ImouDevice:
 class ImouDiscoverService:
     """Class for discovering IMOU devices."""
 
-    def __init__(self, api_client: ImouAPIClient) -> None:
+    def __init__(
+        self,
+        api_client: ImouAPIClient,
+        capabilities_provider: Optional[Callable[[List[str]], Awaitable[Dict[str, List[str]]]]] = None,
+    ) -> None:
         """
         Initialize the instance.
 
         Parameters:
             api_client: an ImouAPIClient instance
+            capabilities_provider: coroutine function taking a batch of device ids and returning other capabilities \
+                of those devices by device id (e.g. prefetched from listDeviceAbility), merged with their details
         """
         self._api_client = api_client
+        self._capabilities_provider = capabilities_provider
+        self._batch_size = DISCOVERY_BATCH_SIZE
+        self._max_concurrency = DISCOVERY_MAX_CONCURRENCY
+        self._device_timeout = DISCOVERY_DEVICE_TIMEOUT
+        self._semaphore = asyncio.Semaphore(self._max_concurrency)
+
+    def get_batch_size(self) -> int:
+        """Get the max number of devices whose details are requested with a single call."""
+        return self._batch_size
+
+    def set_batch_size(self, value: int) -> None:
+        """Set the max number of devices whose details are requested with a single call."""
+        self._batch_size = max(1, value)
+
+    def get_max_concurrency(self) -> int:
+        """Get the max number of requests sent concurrently during discovery."""
+        return self._max_concurrency
+
+    def set_max_concurrency(self, value: int) -> None:
+        """Set the max number of requests sent concurrently during discovery, 1 to discover serially."""
+        self._max_concurrency = max(1, value)
+
+    def get_device_timeout(self) -> float:
+        """Get how long to wait in seconds for the details of a device or a batch of devices."""
+        return self._device_timeout
+
+    def set_device_timeout(self, value: float) -> None:
+        """Set how long to wait in seconds for the details of a device or a batch of devices."""
+        self._device_timeout = value
+
+    async def _async_get_devices_details(self, device_ids: List[str]) -> Dict[str, dict]:
+        """Return a dict device id -> device details, requesting the details of the given devices in batches."""
+        details: Dict[str, dict] = {}
+        for start in range(0, len(device_ids), self._batch_size):
+            batch = device_ids[start : start + self._batch_size]
+            device_array = await self._api_client.async_api_deviceBaseDetailList(batch)
+            if "deviceList" not in device_array:
+                raise InvalidResponse(f"deviceList not found in {str(device_array)}")
+            for device_data in device_array["deviceList"]:
+                if "deviceId" in device_data:
+                    details[device_data["deviceId"]] = device_data
+        return details
+
+    async def _async_get_capabilities(self, device_ids: List[str]) -> Dict[str, List[str]]:
+        """Return the capabilities of the given devices from the capabilities provider, if any. Capabilities are \
+            optional, so the devices are initialized from their details alone if not available."""
+        if self._capabilities_provider is None:
+            return {}
+        async with self._semaphore:
+            try:
+                async with asyncio.timeout(self._device_timeout):
+                    return await self._capabilities_provider(device_ids)
+            except (ImouException, TimeoutError) as exception:
+                _LOGGER.warning("unable to get the capabilities of %d devices: %s", len(device_ids), exception)
+        return {}
+
+    async def _async_initialize_device(
+        self, device_id: str, device_data: Optional[dict], capabilities: Optional[List[str]] = None
+    ) -> Optional["ImouDevice"]:
+        """Create and initialize a device, returning None if failed so not to affect the other devices."""
+        # create a a device instance from the device id and initialize it
+        device = ImouDevice(self._api_client, device_id)
+        try:
+            if device_data is None:
+                # details not available, request them for this device only
+                async with self._semaphore, asyncio.timeout(self._device_timeout):
+                    details = await self._async_get_devices_details([device_id])
+                if device_id not in details:
+                    raise InvalidResponse(f"details of {device_id} not found")
+                device_data = details[device_id]
+            await device.async_initialize(device_data, capabilities)
+            _LOGGER.debug("   - %s", device.to_string())
+            return device
+        except InvalidResponse as exception:
+            _LOGGER.warning("skipping unrecognized or unsupported device: %s", exception.to_string())
+        except ImouException as exception:
+            _LOGGER.warning("skipping device %s failed to initialize: %s", device_id, exception.to_string())
+        except TimeoutError:
+            _LOGGER.warning("skipping device %s not initialized within %.1f seconds", device_id, self._device_timeout)
+        return None
+
+    async def _async_initialize_devices(self, device_ids: List[str]) -> List[Optional["ImouDevice"]]:
+        """Initialize the given devices from their batched details, in the same order."""
+        capabilities = await self._async_get_capabilities(device_ids)
+        details = None
+        async with self._semaphore:
+            try:
+                async with asyncio.timeout(self._device_timeout):
+                    details = await self._async_get_devices_details(device_ids)
+            except (ImouException, TimeoutError) as exception:
+                _LOGGER.warning("unable to get the details of %d devices in a batch: %s", len(device_ids), exception)
+        if details is None:
+            # isolate the failure by initializing each device on its own
+            return await asyncio.gather(
+                *[
+                    self._async_initialize_device(device_id, None, capabilities.get(device_id))
+                    for device_id in device_ids
+                ]
+            )
+        devices: List[Optional[ImouDevice]] = []
+        for device_id in device_ids:
+            if device_id not in details:
+                _LOGGER.warning("skipping unrecognized or unsupported device: details of %s not found", device_id)
+                devices.append(None)
+                continue
+            devices.append(
+                await self._async_initialize_device(device_id, details[device_id], capabilities.get(device_id))
+            )
+        return devices
 
     async def async_discover_devices(self) -> dict:
         """Discover registered devices and return a dict device name -> device object."""
         _LOGGER.debug("Starting discovery")
-        # get the list of devices
-        devices_data = await self._api_client.async_api_deviceBaseList()
-        if "deviceList" not in devices_data or "count" not in devices_data:
-            raise InvalidResponse(f"deviceList or count not found in {devices_data}")
-        _LOGGER.debug("Discovered %d registered devices", devices_data["count"])
-        # extract the device id for each device
-        devices = {}
-        for device_data in devices_data["deviceList"]:
-            # create a a device instance from the device id and initialize it
-            device = ImouDevice(self._api_client, device_data["deviceId"])
-            try:
-                await device.async_initialize()
-                _LOGGER.debug("   - %s", device.to_string())
-                devices[f"{device.get_name()}"] = device
-            except InvalidResponse as exception:
-                _LOGGER.warning(
-                    "skipping unrecognized or unsupported device: ",
-                    exception.to_string(),
-                )
+        self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        tasks: List[asyncio.Future] = []
+        device_ids: List[str] = []
+        discovered = 0
+        try:
+            # walk through the list of devices as the pages arrive, initializing batches of devices concurrently \
+            # while the next page is being fetched
+            async for device_data in self._api_client.async_iter_deviceBaseList():
+                discovered += 1
+                device_ids.append(device_data["deviceId"])
+                if len(device_ids) >= self._batch_size:
+                    tasks.append(asyncio.ensure_future(self._async_initialize_devices(device_ids)))
+                    device_ids = []
+            if device_ids:
+                tasks.append(asyncio.ensure_future(self._async_initialize_devices(device_ids)))
+            results = await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        _LOGGER.debug("Discovered %d registered devices", discovered)
+        # report the devices in the same order they are listed
+        devices: Dict[str, ImouDevice] = {}
+        for batch_devices in results:
+            for device in batch_devices:
+                if device is not None:
+                    devices[f"{device.get_name()}"] = device
         # return a dict with device name -> device instance
         return devices
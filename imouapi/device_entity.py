@@ -3,7 +3,7 @@ import asyncio
 import logging
 from abc import ABC, abstractmethod
 from datetime import datetime
-from typing import Dict, List, Optional, Union
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Set, Tuple, Union
 
 from .api import ImouAPIClient
 from .const import (
@@ -22,6 +22,68 @@ from .exceptions import APIError, InvalidResponse, NotConnected
 _LOGGER: logging.Logger = logging.getLogger(__package__)
 
 
+class ImouListeners:
+    """Callbacks notified of a change, either regular functions or coroutine functions."""
+
+    def __init__(self) -> None:
+        """Initialize the instance."""
+        self._callbacks: List[Callable[..., Any]] = []
+        # coroutines of the callbacks notified by synchronous code, still running
+        self._tasks: Set[asyncio.Future] = set()
+
+    def add(self, callback: Callable[..., Any]) -> Callable[[], None]:
+        """Register a callback and return a function unregistering it."""
+        self._callbacks.append(callback)
+        return lambda: self.remove(callback)
+
+    def remove(self, callback: Callable[..., Any]) -> None:
+        """Unregister a callback."""
+        if callback in self._callbacks:
+            self._callbacks.remove(callback)
+
+    def __len__(self) -> int:
+        """Return the number of callbacks registered."""
+        return len(self._callbacks)
+
+    def _call(self, *args: Any) -> List[Coroutine]:
+        """Call the callbacks and return the coroutines returned by the async ones."""
+        awaitables: List[Coroutine] = []
+        for callback in list(self._callbacks):
+            try:
+                result = callback(*args)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Error calling listener %s", callback)
+                continue
+            if asyncio.iscoroutine(result):
+                awaitables.append(result)
+        return awaitables
+
+    def notify(self, *args: Any) -> None:
+        """Call the callbacks, running the async ones in the background of the running event loop."""
+        for awaitable in self._call(*args):
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                _LOGGER.warning("No running event loop, async listener not called")
+                awaitable.close()
+                continue
+            task = loop.create_task(awaitable)
+            self._tasks.add(task)
+            task.add_done_callback(self._async_task_done)
+
+    async def async_notify(self, *args: Any) -> None:
+        """Call the callbacks, waiting for the async ones."""
+        for result in await asyncio.gather(*self._call(*args), return_exceptions=True):
+            if isinstance(result, Exception):
+                _LOGGER.error("Error calling listener: %s", result)
+
+    def _async_task_done(self, task: asyncio.Future) -> None:
+        """Log the error of an async callback run in the background."""
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            _LOGGER.error("Error calling listener: %s", task.exception())
+
+
 class ImouEntity(ABC):
     """A representation of a sensor within an Imou Device."""
 
@@ -43,6 +105,12 @@ class ImouEntity(ABC):
         self._updated = False
         self._device_instance = None
         self._attributes: Dict[str, str] = {}
+        # online status of the device pushed by the device during an update cycle
+        self._device_status: Optional[str] = None
+        # callbacks notified when state or attributes change and the values they were last notified with, the
+        # state is unknown until the first update
+        self._listeners = ImouListeners()
+        self._notified_state: Tuple[Any, Dict[str, str]] = (None, {})
 
     def get_device_id(self) -> str:
         """Get device id."""
@@ -68,6 +136,10 @@ class ImouEntity(ABC):
         """If has been updated at least once."""
         return self._updated
 
+    def is_polled(self) -> bool:
+        """If the update calls the API to fetch the state."""
+        return True
+
     def set_device(self, device_instance) -> None:
         """Set the device instance this entity is belonging to."""
         self._device_instance = device_instance
@@ -76,6 +148,10 @@ class ImouEntity(ABC):
         """Entity attributes."""
         return self._attributes
 
+    def set_device_status(self, status: Optional[str]) -> None:
+        """Set the online status of the device fetched during the update cycle, None when the cycle is over."""
+        self._device_status = status
+
     async def _async_is_ready(self) -> bool:
         """Check if the sensor is fully ready."""
         # check if the sensor is enabled
@@ -89,10 +165,55 @@ class ImouEntity(ABC):
             return False
         return True
 
+    def add_listener(self, callback: Callable[["ImouEntity"], Any]) -> Callable[[], None]:
+        """Register a callback, either a function or a coroutine function, called with the entity when its state \
+            or attributes change. Return a function unregistering it."""
+        return self._listeners.add(callback)
+
+    def remove_listener(self, callback: Callable[["ImouEntity"], Any]) -> None:
+        """Unregister a callback."""
+        self._listeners.remove(callback)
+
+    def _get_state(self) -> Any:
+        """Return the state of the entity."""
+        return None
+
+    def _has_changed(self) -> bool:
+        """Return True if state or attributes changed since the previous check."""
+        current = (self._get_state(), dict(self._attributes))
+        if current == self._notified_state:
+            return False
+        self._notified_state = current
+        return True
+
+    def notify_listeners(self) -> bool:
+        """Notify the listeners if state or attributes changed, running the async ones in the background. Return \
+            True if changed."""
+        if not self._has_changed():
+            return False
+        self._listeners.notify(self)
+        return True
+
+    async def async_notify_listeners(self) -> bool:
+        """Notify the listeners if state or attributes changed, waiting for the async ones. Return True if changed."""
+        if not self._has_changed():
+            return False
+        await self._listeners.async_notify(self)
+        return True
+
+    async def _async_notify_changed(self) -> None:
+        """Notify the listeners of the entity and of its device after an action, if state or attributes changed."""
+        if await self.async_notify_listeners() and self._device_instance is not None:
+            await self._device_instance.async_notify_listeners([self._name])
+
     @abstractmethod
     async def async_update(self, **kwargs):
         """Update the entity."""
 
+    def process_event(self, event: Dict[str, Any]) -> bool:
+        """Update the entity from a pushed event without calling the API. Return True if the entity was updated."""
+        return False
+
 
 class ImouSensor(ImouEntity):
     """A representation of a sensor within an IMOU Device."""
@@ -115,7 +236,7 @@ class ImouSensor(ImouEntity):
         """
         super().__init__(api_client, device_id, device_name, sensor_type, SENSORS[sensor_type])
         # keep track of the status of the sensor
-        self._state = None
+        self._state: Optional[str] = None
 
     async def async_update(self, **kwargs):
         """Update the entity."""
@@ -138,20 +259,23 @@ class ImouSensor(ImouEntity):
 
         # callbackUrl sensor
         elif self._name == "callbackUrl":
-            # get callback url
-            data = await self.api_client.async_api_getMessageCallback()
+            # get callback url, shared by all the devices of the account
+            data = await self.api_client.async_get_message_callback()
             if "callbackUrl" not in data:
                 raise InvalidResponse(f"callbackUrl not found in {data}")
             self._state = data["callbackUrl"]
 
         # status sensor
         if self._name == "status":
-            # get the device status
-            data = await self.api_client.async_api_deviceOnline(self._device_id)
-            if "onLine" not in data:
-                raise InvalidResponse(f"onLine not found in {data}")
-            if data["onLine"] in ONLINE_STATUS:
-                self._state = ONLINE_STATUS[data["onLine"]]
+            # get the device status, unless already provided by the device during the update cycle
+            status = self._device_status
+            if status is None:
+                data = await self.api_client.async_api_deviceOnline(self._device_id)
+                if "onLine" not in data:
+                    raise InvalidResponse(f"onLine not found in {data}")
+                status = data["onLine"]
+            if status in ONLINE_STATUS:
+                self._state = ONLINE_STATUS[status]
             else:
                 self._state = ONLINE_STATUS["UNKNOWN"]
 
@@ -179,6 +303,24 @@ class ImouSensor(ImouEntity):
         if not self._updated:
             self._updated = True
 
+    def process_event(self, event: Dict[str, Any]) -> bool:
+        """Update the entity from a pushed event without calling the API. Return True if the entity was updated."""
+        # status sensor
+        if self._name == "status" and event["type"] == "status":
+            self._state = ONLINE_STATUS[event["status"]]
+            _LOGGER.debug("[%s] %s pushed, value is %s", self._device_name, self._description, self._state)
+            return True
+        return False
+
+    def is_polled(self) -> bool:
+        """If the update calls the API to fetch the state."""
+        # the status is shared by the device during the update cycle
+        return self._name != "status" or self._device_status is None
+
+    def _get_state(self) -> Any:
+        """Return the state of the entity."""
+        return self._state
+
     def get_state(self) -> Optional[str]:
         """Return the state."""
         return self._state
@@ -205,7 +347,17 @@ class ImouBinarySensor(ImouEntity):
         """
         super().__init__(api_client, device_id, device_name, sensor_type, BINARY_SENSORS[sensor_type])
         # keep track of the status of the sensor
-        self._state = None
+        self._state: Optional[bool] = None
+        # alarms already returned by the API, for the motionAlarm sensor
+        self._alarm_cursor: Optional[Dict[str, Any]] = None
+
+    def get_alarm_cursor(self) -> Optional[Dict[str, Any]]:
+        """Get the cursor of the alarms already fetched, None if never updated."""
+        return self._alarm_cursor
+
+    def reset_alarm_cursor(self) -> None:
+        """Forget the alarms already fetched, the next update gets the most recent alarms again."""
+        self._alarm_cursor = None
 
     async def async_update(self, **kwargs):
         """Update the entity."""
@@ -214,34 +366,36 @@ class ImouBinarySensor(ImouEntity):
 
         # online sensor
         if self._name == "online":
-            # get the device status
+            # get the device status, unless already provided by the device during the update cycle
             if self._device_instance is not None:
-                await self._device_instance.async_refresh_status()
+                if self._device_status is None:
+                    await self._device_instance.async_refresh_status()
                 self._state = self._device_instance.is_online()
 
         # motionAlarm sensor
         if self._name == "motionAlarm":
-            # get the time of the last alarm
-            data = await self.api_client.async_api_getAlarmMessage(self._device_id)
-            if "alarms" not in data:
-                raise InvalidResponse(f"alarms not found in {data}")
-            if len(data["alarms"]) > 0:
-                alarm = data["alarms"][0]
+            # get only the alarms occurred since the last update
+            first_update = self._alarm_cursor is None
+            alarms, cursor = await self.api_client.async_get_new_alarms(self._device_id, self._alarm_cursor)
+            for alarm in alarms:
                 if "time" not in alarm or "type" not in alarm or "msgType" not in alarm or "deviceId" not in alarm:
                     raise InvalidResponse(f"time, type, msgType or deviceId not found in {alarm}")
-                # convert it into ISO 8601
-                alarm_time = datetime.utcfromtimestamp(alarm["time"]).isoformat()
-                # if previously stored alarm time is different, an alarm occurred in the mean time
-                if "alarm_time" in self._attributes and alarm_time != self._attributes["alarm_time"]:
-                    self._state = True
-                else:
-                    self._state = False
-                # save attributes
+            self._alarm_cursor = cursor
+            if len(alarms) > 0:
+                alarm = alarms[-1]
+                # the first time the latest alarms are returned, they did not occur in the mean time
+                self._state = not first_update
+                if not first_update and self._device_instance is not None:
+                    await self._device_instance.async_publish_alarms(alarms)
+                # save attributes, time converted into ISO 8601
                 self._attributes = {
-                    "alarm_time": alarm_time,
+                    "alarm_time": datetime.utcfromtimestamp(alarm["time"]).isoformat(),
                     "alarm_type": alarm["msgType"],
                     "alarm_code": alarm["type"],
+                    "alarm_count": str(len(alarms)),
                 }
+            else:
+                self._state = False
 
         _LOGGER.debug(
             "[%s] updating %s, value is %s %s",
@@ -253,6 +407,39 @@ class ImouBinarySensor(ImouEntity):
         if not self._updated:
             self._updated = True
 
+    def process_event(self, event: Dict[str, Any]) -> bool:
+        """Update the entity from a pushed event without calling the API. Return True if the entity was updated."""
+        # online sensor
+        if self._name == "online" and event["type"] == "status":
+            self._state = ONLINE_STATUS[event["status"]] in ["Online", "Dormant"]
+        # motionAlarm sensor
+        elif self._name == "motionAlarm" and event["type"] == "alarm":
+            self._state = True
+            self._attributes = {
+                "alarm_time": datetime.utcfromtimestamp(event["time"]).isoformat(),
+                "alarm_type": event["msgType"],
+                "alarm_code": event["code"],
+            }
+        else:
+            return False
+        _LOGGER.debug(
+            "[%s] %s pushed, value is %s %s",
+            self._device_name,
+            self._description,
+            self._state,
+            self._attributes,
+        )
+        return True
+
+    def is_polled(self) -> bool:
+        """If the update calls the API to fetch the state."""
+        # the status is shared by the device during the update cycle
+        return self._name != "online" or self._device_status is None
+
+    def _get_state(self) -> Any:
+        """Return the state of the entity."""
+        return self._state
+
     def is_on(self) -> Optional[bool]:
         """Return the status of the switch."""
         return self._state
@@ -287,7 +474,8 @@ class ImouSwitch(ImouEntity):
 
         # pushNotifications sensor
         if self._name == "pushNotifications":
-            data = await self.api_client.async_api_getMessageCallback()
+            # shared by all the devices of the account
+            data = await self.api_client.async_get_message_callback()
 
         # all the other dynamically created sensors
         else:
@@ -303,6 +491,10 @@ class ImouSwitch(ImouEntity):
         if not self._updated:
             self._updated = True
 
+    def _get_state(self) -> Any:
+        """Return the state of the entity."""
+        return self._state
+
     def is_on(self) -> Optional[bool]:
         """Return the status of the switch."""
         return self._state
@@ -327,6 +519,7 @@ class ImouSwitch(ImouEntity):
         else:
             await self.api_client.async_api_setDeviceCameraStatus(self._device_id, self._name, True)
         self._state = True
+        await self._async_notify_changed()
 
     async def async_turn_off(self, **kwargs):
         """Turn the entity off."""
@@ -345,6 +538,7 @@ class ImouSwitch(ImouEntity):
         else:
             await self.api_client.async_api_setDeviceCameraStatus(self._device_id, self._name, False)
         self._state = False
+        await self._async_notify_changed()
 
     async def async_toggle(self, **kwargs):
         """Toggle the entity."""
@@ -403,6 +597,10 @@ class ImouSelect(ImouEntity):
         if not self._updated:
             self._updated = True
 
+    def _get_state(self) -> Any:
+        """Return the state of the entity."""
+        return self._current_option
+
     def get_current_option(self) -> Optional[str]:
         """Return the current option."""
         return self._current_option
@@ -420,6 +618,7 @@ class ImouSelect(ImouEntity):
         if self._name == "nightVisionMode":
             await self.api_client.async_api_setNightVisionMode(self._device_id, option)
             self._current_option = option
+            await self._async_notify_changed()
 
 
 class ImouButton(ImouEntity):
@@ -460,6 +659,10 @@ class ImouButton(ImouEntity):
         if not self._updated:
             self._updated = True
 
+    def is_polled(self) -> bool:
+        """If the update calls the API to fetch the state."""
+        return False
+
     async def async_update(self, **kwargs):
         """Update the entity."""
         return
@@ -485,7 +688,13 @@ class ImouSiren(ImouEntity):
             sensor_type: the sensor type (from the SIRENS constant)
         """
         super().__init__(api_client, device_id, device_name, sensor_type, SIRENS[sensor_type])
+        # the state of the siren cannot be fetched, it is assumed off from the start
         self._state = False
+        self._notified_state = (self._state, {})
+
+    def is_polled(self) -> bool:
+        """If the update calls the API to fetch the state."""
+        return False
 
     async def async_update(self, **kwargs):
         """Update the entity."""
@@ -497,6 +706,10 @@ class ImouSiren(ImouEntity):
             # async_api_getDeviceCameraStatus() does not return the current state of the siren, do nothing here
             pass
 
+    def _get_state(self) -> Any:
+        """Return the state of the entity."""
+        return self._state
+
     def is_on(self) -> Optional[bool]:
         """Return the status of the switch."""
         return self._state
@@ -515,6 +728,7 @@ class ImouSiren(ImouEntity):
         if self._name == "siren":
             await self.api_client.async_api_setDeviceCameraStatus(self._device_id, self._name, True)
         self._state = True
+        await self._async_notify_changed()
 
     async def async_turn_off(self, **kwargs):
         """Turn the entity off."""
@@ -530,6 +744,7 @@ class ImouSiren(ImouEntity):
         if self._name == "siren":
             await self.api_client.async_api_setDeviceCameraStatus(self._device_id, self._name, False)
         self._state = False
+        await self._async_notify_changed()
 
     async def async_toggle(self, **kwargs):
         """Toggle the entity."""
@@ -565,6 +780,10 @@ class ImouCamera(ImouEntity):
         self._state = False
         self._profile = profile
 
+    def is_polled(self) -> bool:
+        """If the update calls the API to fetch the state."""
+        return False
+
     async def async_update(self, **kwargs):
         """Update the entity."""
         if not await self._async_is_ready():
@@ -1,6 +1,7 @@
 """Library exceptions."""
 import sys
 import traceback
+from typing import Optional
 
 
 class ImouException(Exception):
@@ -36,6 +37,11 @@ class NotConnected(ImouException):
 class ConnectionFailed(ImouException):
     """Failed to connect to the API."""
 
+    def __init__(self, message: str = "", request_sent: bool = True) -> None:
+        """Initialize with whether the request may have reached the API before failing."""
+        self.request_sent = request_sent
+        super().__init__(message)
+
     def get_title(self) -> str:
         """Return the title of the exception which will be then translated."""
         return "connection_failed"
@@ -60,6 +66,11 @@ class NotAuthorized(ImouException):
 class APIError(ImouException):
     """Remote API error."""
 
+    def __init__(self, message: str = "", code: Optional[str] = None) -> None:
+        """Initialize with the result code or HTTP status code returned by the API, if any."""
+        self.code = code
+        super().__init__(message)
+
     def get_title(self) -> str:
         """Return the title of the exception which will be then translated."""
         return "api_error"
@@ -79,3 +90,11 @@ class DeviceOffline(ImouException):
     def get_title(self) -> str:
         """Return the title of the exception which will be then translated."""
         return "device_offline"
+
+
+class CircuitOpen(ImouException):
+    """Call not sent because the API endpoint or the device kept failing recently."""
+
+    def get_title(self) -> str:
+        """Return the title of the exception which will be then translated."""
+        return "circuit_open"
@@ -0,0 +1,240 @@
+"""High level API to refresh all the Imou devices of an account together."""
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from .alarms import ImouAlarmStream
+from .api import ImouAPIClient
+from .const import ALARM_OVERFLOW_DROP_OLDEST, ALARM_STREAM_SIZE, FLEET_ABILITY_BATCH_SIZE, FLEET_MAX_CONCURRENCY
+from .device import ImouDevice, ImouDiscoverService
+from .exceptions import ImouException, InvalidResponse
+
+_LOGGER: logging.Logger = logging.getLogger(__package__)
+
+
+class ImouFleet:
+    """A fleet of Imou devices refreshed together within the same cycle."""
+
+    def __init__(self, api_client: ImouAPIClient, max_concurrency: int = FLEET_MAX_CONCURRENCY) -> None:
+        """
+        Initialize the instance.
+
+        Parameters:
+            api_client: an ImouAPIClient instance
+            max_concurrency: max number of devices refreshed at the same time
+        """
+        self._api_client = api_client
+        self._max_concurrency = max(1, max_concurrency)
+        self._devices: Dict[str, ImouDevice] = {}
+        self._last_cycle: Dict[str, Any] = {}
+        self._ability_batch_size = FLEET_ABILITY_BATCH_SIZE
+        # capabilities of each device and of each of its channels, by device id
+        self._capabilities: Dict[str, Dict[str, Any]] = {}
+        # streams the alarms of all the devices are published to
+        self._alarm_streams: List[ImouAlarmStream] = []
+
+    def get_api_client(self) -> ImouAPIClient:
+        """Get api client."""
+        return self._api_client
+
+    def get_max_concurrency(self) -> int:
+        """Get the max number of devices refreshed at the same time."""
+        return self._max_concurrency
+
+    def set_max_concurrency(self, value: int) -> None:
+        """Set the max number of devices refreshed at the same time."""
+        self._max_concurrency = max(1, value)
+
+    def add_device(self, device: ImouDevice) -> None:
+        """Add a device to the fleet."""
+        self._devices[device.get_device_id()] = device
+        for stream in self._alarm_streams:
+            device.add_alarm_stream(stream)
+
+    def remove_device(self, device_id: str) -> None:
+        """Remove a device from the fleet."""
+        device = self._devices.pop(device_id, None)
+        if device is not None:
+            for stream in self._alarm_streams:
+                device.remove_alarm_stream(stream)
+
+    def alarms(self, max_size: int = ALARM_STREAM_SIZE, overflow: str = ALARM_OVERFLOW_DROP_OLDEST) -> ImouAlarmStream:
+        """Return a new stream of the alarms of all the devices of the fleet, including those added later, to be \
+            consumed with `async for`. The stream stops receiving alarms once closed."""
+        stream = ImouAlarmStream(max_size, overflow, on_close=self._remove_alarm_stream)
+        self._alarm_streams.append(stream)
+        for device in self._devices.values():
+            device.add_alarm_stream(stream)
+        return stream
+
+    def _remove_alarm_stream(self, stream: ImouAlarmStream) -> None:
+        """Stop publishing the alarms of the devices to a closed stream."""
+        if stream in self._alarm_streams:
+            self._alarm_streams.remove(stream)
+        for device in self._devices.values():
+            device.remove_alarm_stream(stream)
+
+    def get_device(self, device_id: str) -> Optional[ImouDevice]:
+        """Get a device of the fleet by device id."""
+        return self._devices.get(device_id)
+
+    def get_devices(self) -> List[ImouDevice]:
+        """Get all the devices of the fleet."""
+        return list(self._devices.values())
+
+    async def async_discover(
+        self, discover_service: Optional[ImouDiscoverService] = None, prefetch_capabilities: bool = False
+    ) -> Dict[str, ImouDevice]:
+        """Discover the devices registered with the account, add them to the fleet and return them by name. With \
+            prefetch_capabilities, the capabilities of each batch of devices discovered are prefetched as per \
+            async_prefetch_capabilities() and added to those of the details when initializing the devices."""
+        if discover_service is None:
+            capabilities_provider = self._async_get_prefetched_capabilities if prefetch_capabilities else None
+            discover_service = ImouDiscoverService(self._api_client, capabilities_provider)
+        discovered_devices = await discover_service.async_discover_devices()
+        for device in discovered_devices.values():
+            self.add_device(device)
+        return discovered_devices
+
+    def get_ability_batch_size(self) -> int:
+        """Get the max number of devices whose capabilities are requested with a single call."""
+        return self._ability_batch_size
+
+    def set_ability_batch_size(self, value: int) -> None:
+        """Set the max number of devices whose capabilities are requested with a single call."""
+        self._ability_batch_size = max(1, value)
+
+    def get_capabilities(self, device_id: str, channel_id: Optional[str] = None) -> Optional[List[str]]:
+        """Get the prefetched capabilities of a device or of one of its channels, None if not known."""
+        if device_id not in self._capabilities:
+            return None
+        if channel_id is None:
+            return list(self._capabilities[device_id]["device"])
+        channels = self._capabilities[device_id]["channels"]
+        return list(channels[channel_id]) if channel_id in channels else None
+
+    def get_devices_with_capability(self, capability: str) -> List[str]:
+        """Get the ids of the devices having the given capability, either at device or channel level."""
+        return [
+            device_id
+            for device_id, capabilities in self._capabilities.items()
+            if capability in capabilities["device"]
+            or any(capability in channel for channel in capabilities["channels"].values())
+        ]
+
+    async def async_prefetch_capabilities(self, device_ids: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """Request the capabilities of the given devices (all the devices of the fleet by default) in batches \
+            and return the capability index by device id, with the capabilities of the device and of each channel."""
+        if device_ids is None:
+            device_ids = list(self._devices.keys())
+        for start in range(0, len(device_ids), self._ability_batch_size):
+            batch = device_ids[start : start + self._ability_batch_size]
+            data = await self._api_client.async_api_listDeviceAbility(batch)
+            if "deviceList" not in data:
+                raise InvalidResponse(f"deviceList not found in {data}")
+            for device_data in data["deviceList"]:
+                if "deviceId" not in device_data or "ability" not in device_data:
+                    raise InvalidResponse(f"deviceId or ability not found in {device_data}")
+                channels = {}
+                for channel in device_data.get("channels", []):
+                    if "channelId" in channel and "channelAbility" in channel:
+                        channels[channel["channelId"]] = self._split_capabilities(channel["channelAbility"])
+                self._capabilities[device_data["deviceId"]] = {
+                    "device": self._split_capabilities(device_data["ability"]),
+                    "channels": channels,
+                }
+        _LOGGER.debug("Prefetched the capabilities of %d devices", len(device_ids))
+        return {device_id: self._capabilities[device_id] for device_id in device_ids if device_id in self._capabilities}
+
+    async def _async_get_prefetched_capabilities(self, device_ids: List[str]) -> Dict[str, List[str]]:
+        """Prefetch the capabilities of the given devices and return those of each device and its channels."""
+        await self.async_prefetch_capabilities(device_ids)
+        capabilities: Dict[str, List[str]] = {}
+        for device_id in device_ids:
+            device_capabilities = self._get_all_capabilities(device_id)
+            if device_capabilities is not None:
+                capabilities[device_id] = device_capabilities
+        return capabilities
+
+    def _get_all_capabilities(self, device_id: str) -> Optional[List[str]]:
+        """Get the prefetched capabilities of a device together with those of its channels, None if not known."""
+        if device_id not in self._capabilities:
+            return None
+        capabilities = list(self._capabilities[device_id]["device"])
+        for channel_capabilities in self._capabilities[device_id]["channels"].values():
+            capabilities.extend(capability for capability in channel_capabilities if capability not in capabilities)
+        return capabilities
+
+    def _split_capabilities(self, value: str) -> List[str]:
+        """Split a comma separated list of capabilities."""
+        return [capability for capability in value.split(",") if capability != ""]
+
+    def get_last_cycle(self) -> Dict[str, Any]:
+        """Return timing and outcome of the last refresh cycle."""
+        return dict(self._last_cycle)
+
+    async def async_refresh(self) -> Dict[str, Optional[ImouException]]:
+        """Refresh all the devices and return by device id the exception raised, None if refreshed successfully."""
+        results: Dict[str, Optional[ImouException]] = {}
+        async for device, exception in self.async_iter_refresh():
+            results[device.get_device_id()] = exception
+        return results
+
+    async def async_iter_refresh(self) -> AsyncIterator[Tuple[ImouDevice, Optional[ImouException]]]:
+        """Refresh all the devices, yielding each device with the exception raised (if any) as soon as completed."""
+        devices = self.get_devices()
+        started_at = time.time()
+        start = time.monotonic()
+        device_durations: Dict[str, float] = {}
+        failed: List[str] = []
+        self._last_cycle = {"started_at": started_at, "devices": len(devices), "running": True}
+        _LOGGER.debug("Refreshing %d devices", len(devices))
+        # account level calls are made once for the whole fleet, then shared by the devices
+        await self._async_refresh_account()
+        semaphore = asyncio.Semaphore(self._max_concurrency)
+
+        async def async_refresh_device(device: ImouDevice) -> Tuple[ImouDevice, Optional[ImouException]]:
+            async with semaphore:
+                device_start = time.monotonic()
+                exception = None
+                try:
+                    if not device.is_initialized():
+                        # add the prefetched capabilities of the device and of its channels, if any
+                        await device.async_initialize(capabilities=self._get_all_capabilities(device.get_device_id()))
+                    await device.async_get_data()
+                except ImouException as device_exception:
+                    _LOGGER.warning("[%s] refresh failed: %s", device.get_name(), device_exception.to_string())
+                    exception = device_exception
+                device_durations[device.get_device_id()] = time.monotonic() - device_start
+                return device, exception
+
+        tasks = [asyncio.ensure_future(async_refresh_device(device)) for device in devices]
+        try:
+            for next_completed in asyncio.as_completed(tasks):
+                device, exception = await next_completed
+                if exception is not None:
+                    failed.append(device.get_device_id())
+                yield device, exception
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._last_cycle = {
+                "started_at": started_at,
+                "duration": time.monotonic() - start,
+                "devices": len(devices),
+                "refreshed": len(device_durations) - len(failed),
+                "failed": failed,
+                "device_durations": device_durations,
+                "running": False,
+            }
+            _LOGGER.debug("Refreshed %d devices in %.2f seconds", len(devices), self._last_cycle["duration"])
+
+    async def _async_refresh_account(self) -> None:
+        """Make the account level calls once per cycle."""
+        try:
+            await self._api_client.async_connect()
+            await self._api_client.async_get_message_callback(force_refresh=True)
+        except ImouException as exception:
+            # each device will report the error
+            _LOGGER.warning("unable to refresh the account: %s", exception.to_string())
@@ -0,0 +1,173 @@
+"""Receiver of the alarm and status messages pushed by the Imou cloud to the callback url."""
+import hmac
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+from .const import WEBHOOK_ALARM_TYPES, WEBHOOK_HOST, WEBHOOK_PATH, WEBHOOK_PORT, WEBHOOK_STATUS, WEBHOOK_TOKEN_PARAM
+from .device import ImouDevice
+
+_LOGGER: logging.Logger = logging.getLogger(__package__)
+
+
+class ImouWebhookReceiver:
+    """Receive the messages pushed to the callback url set with setMessageCallbackOn and route them to the devices.
+
+    Status messages update the `status` sensor and the `online` binary sensor, alarm messages update the
+    `motionAlarm` binary sensor and any other message is ignored. No API call is made. When a token is set, the
+    callback url must carry it as the `token` query parameter, e.g. `https://host/imou?token=secret`, and requests
+    without it are rejected.
+    """
+
+    def __init__(
+        self,
+        devices: Optional[List[ImouDevice]] = None,
+        path: str = WEBHOOK_PATH,
+        token: Optional[str] = None,
+        alarm_types: Optional[List[str]] = None,
+    ) -> None:
+        """
+        Initialize the instance.
+
+        Parameters:
+            devices: the devices messages are routed to
+            path: the path of the callback url messages are pushed to
+            token: shared secret the callback url must carry, None to accept any request
+            alarm_types: types of the messages handled as alarms, WEBHOOK_ALARM_TYPES by default
+        """
+        self._path = path
+        self._token = token
+        self._alarm_types = list(alarm_types) if alarm_types is not None else list(WEBHOOK_ALARM_TYPES)
+        self._devices: Dict[str, ImouDevice] = {}
+        for device in devices or []:
+            self.add_device(device)
+        self._runner: Optional[web.AppRunner] = None
+        self._statistics: Dict[str, int] = {
+            "received": 0,
+            "routed": 0,
+            "unknown_device": 0,
+            "invalid": 0,
+            "unauthorized": 0,
+        }
+
+    def get_path(self) -> str:
+        """Get the path of the callback url messages are pushed to."""
+        return self._path
+
+    def get_alarm_types(self) -> List[str]:
+        """Get the types of the messages handled as alarms."""
+        return list(self._alarm_types)
+
+    def add_device(self, device: ImouDevice) -> None:
+        """Route the messages of the given device to it."""
+        self._devices[device.get_device_id()] = device
+
+    def remove_device(self, device_id: str) -> None:
+        """Stop routing the messages of the given device."""
+        self._devices.pop(device_id, None)
+
+    def get_statistics(self) -> Dict[str, int]:
+        """Return the number of messages received, routed to a device, for unknown devices, invalid and of \
+            requests rejected for a missing or wrong token."""
+        return dict(self._statistics)
+
+    def parse_message(self, message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Convert a pushed message into an event, None if not valid."""
+        if not isinstance(message, dict) or "msgType" not in message:
+            return None
+        device_id = message.get("did", message.get("deviceId"))
+        if device_id is None:
+            return None
+        msg_type = str(message["msgType"])
+        event: Dict[str, Any] = {
+            "device_id": str(device_id),
+            "channel_id": str(message.get("cid", message.get("channelId", "0"))),
+            "msgType": msg_type,
+        }
+        # status messages either carry the status in the message type or in a status field
+        status = msg_type if msg_type.lower() in WEBHOOK_STATUS else message.get("status")
+        if msg_type.lower() in WEBHOOK_STATUS or msg_type == "deviceStatus":
+            if status is None or str(status).lower() not in WEBHOOK_STATUS:
+                return None
+            event["type"] = "status"
+            event["status"] = WEBHOOK_STATUS[str(status).lower()]
+            return event
+        # any other message is ignored unless an alarm
+        if msg_type not in self._alarm_types:
+            return None
+        try:
+            alarm_time = float(message.get("time", message.get("localDate")))  # type: ignore
+        except (TypeError, ValueError):
+            return None
+        # time may be in milliseconds
+        if alarm_time > 1e11:
+            alarm_time = alarm_time / 1000
+        event["type"] = "alarm"
+        event["time"] = alarm_time
+        event["code"] = message.get("type", message.get("labelType", msg_type))
+        return event
+
+    def process_message(self, message: Dict[str, Any]) -> List[str]:
+        """Route a pushed message to the matching device and return the names of the entities updated."""
+        self._statistics["received"] = self._statistics["received"] + 1
+        event = self.parse_message(message)
+        if event is None:
+            self._statistics["invalid"] = self._statistics["invalid"] + 1
+            _LOGGER.debug("Ignoring invalid pushed message %s", message)
+            return []
+        device = self._devices.get(event["device_id"])
+        if device is None:
+            self._statistics["unknown_device"] = self._statistics["unknown_device"] + 1
+            _LOGGER.debug("Ignoring pushed message for unknown device %s", event["device_id"])
+            return []
+        self._statistics["routed"] = self._statistics["routed"] + 1
+        updated = device.process_event(event)
+        _LOGGER.debug("[%s] %s event pushed, updated %s", device.get_name(), event["msgType"], updated)
+        return updated
+
+    async def async_handle_request(self, request: web.Request) -> web.Response:
+        """Handle a request with a message pushed by the Imou cloud."""
+        if self._token is not None and not hmac.compare_digest(
+            request.query.get(WEBHOOK_TOKEN_PARAM, "").encode(), self._token.encode()
+        ):
+            self._statistics["unauthorized"] = self._statistics["unauthorized"] + 1
+            return web.json_response({"code": "401", "msg": "unauthorized"}, status=401)
+        try:
+            message = json.loads(await request.text())
+        except ValueError:
+            self._statistics["invalid"] = self._statistics["invalid"] + 1
+            return web.json_response({"code": "400", "msg": "invalid message"}, status=400)
+        self.process_message(message)
+        # always acknowledge valid messages so they are not pushed again
+        return web.json_response({"code": "0", "msg": "ok"})
+
+    def register(self, app: web.Application) -> None:
+        """Add the receiver route to an existing aiohttp application."""
+        app.router.add_post(self._path, self.async_handle_request)
+
+    def get_app(self) -> web.Application:
+        """Return a new aiohttp application serving the receiver."""
+        app = web.Application()
+        self.register(app)
+        return app
+
+    async def async_start(self, host: str = WEBHOOK_HOST, port: int = WEBHOOK_PORT) -> None:
+        """Start listening for pushed messages, on localhost by default (e.g. behind a reverse proxy)."""
+        if self._runner is not None:
+            return
+        if self._token is None and host not in ("127.0.0.1", "localhost", "::1"):
+            _LOGGER.warning("Listening for pushed messages on %s without a token, any request is accepted", host)
+        self._runner = web.AppRunner(self.get_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        _LOGGER.debug("Listening for pushed messages on %s:%d%s", host, port, self._path)
+
+    async def async_stop(self) -> None:
+        """Stop listening for pushed messages."""
+        if self._runner is None:
+            return
+        await self._runner.cleanup()
+        self._runner = None
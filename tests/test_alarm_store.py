@@ -0,0 +1,85 @@
+"""Tests for `imouapi` package."""
+import asyncio
+import logging
+import time
+
+from imouapi.alarm_store import ImouAlarmStore
+from imouapi.alarms import ImouAlarmStream
+
+logger = logging.getLogger("imouapi")
+logger.setLevel(logging.DEBUG)
+
+
+class TestAlarmStore:
+    """Test suite for ImouAlarmStore."""
+
+    def setup(self):
+        """Initialize the test suite."""
+        self.loop = asyncio.new_event_loop()  # pylint: disable=attribute-defined-outside-init
+        self.store = ImouAlarmStore()  # pylint: disable=attribute-defined-outside-init
+        self.now = time.time()  # pylint: disable=attribute-defined-outside-init
+
+    def teardown(self):
+        """Close the store."""
+        self.store.close()
+
+    def alarm(self, device_id: str = "8L0DF93PAZ55FD2", msg_type: str = "human", age: float = 0) -> dict:
+        """Return a stream alarm."""
+        return {
+            "device_id": device_id,
+            "channel_id": "0",
+            "alarm_id": None,
+            "time": self.now - age,
+            "msgType": msg_type,
+            "code": "120",
+            "source": "push",
+            "count": 1,
+        }
+
+    def test_query(self):
+        """Test alarms queried by device, time and type."""
+        alarms = [
+            self.alarm(age=30),
+            self.alarm(age=20, msg_type="videoMotion"),
+            self.alarm(age=10),
+            self.alarm("8L0DF93PAZ55FD3", age=5),
+        ]
+        assert self.store.add_alarms(alarms) == 4
+        # alarms already stored are ignored
+        assert self.store.add_alarms(alarms[:1]) == 0
+        assert self.store.count() == 4
+        data = self.store.query(device_id="8L0DF93PAZ55FD2")
+        assert [alarm["time"] for alarm in data] == [self.now - 10, self.now - 20, self.now - 30]
+        assert data[0] == alarms[2]
+        assert self.store.count(device_id="8L0DF93PAZ55FD2", msg_type="human") == 2
+        assert self.store.count(begin_time=self.now - 25, end_time=self.now - 8) == 2
+        assert len(self.store.query(limit=1)) == 1
+        assert self.store.count_by_type(device_id="8L0DF93PAZ55FD2") == {"human": 2, "videoMotion": 1}
+
+    def test_alarm_ids(self):
+        """Test polled alarms are identified by their id."""
+        alarms = [dict(self.alarm(), alarm_id=alarm_id, source="poll") for alarm_id in ["1", "2"]]
+        # distinct alarms occurred at the same time are both stored
+        assert self.store.add_alarms(alarms) == 2
+        assert self.store.add_alarms([dict(alarms[0], time=self.now - 1)]) == 0
+        # pushed alarms have no id
+        assert self.store.add_alarms([self.alarm(), self.alarm()]) == 1
+        assert self.store.count() == 3
+
+    def test_retention(self):
+        """Test alarms older than the retention period or over the max number are purged."""
+        self.store.set_retention_days(1)
+        self.store.add_alarms([self.alarm(age=age) for age in [2 * 86400, 3600, 60, 0]])
+        assert self.store.purge() == 1
+        self.store.set_max_alarms(2)
+        assert self.store.purge() == 1
+        assert [alarm["time"] for alarm in self.store.query()] == [self.now, self.now - 60]
+
+    def test_consume(self):
+        """Test the alarms of a stream are stored."""
+        stream = ImouAlarmStream(overflow="block")
+        for age in range(3):
+            stream.put_nowait(self.alarm(age=age))
+        stream.close()
+        self.loop.run_until_complete(self.store.async_consume(stream))
+        assert self.store.count() == 3
@@ -0,0 +1,199 @@
+"""Tests for `imouapi` package."""
+import asyncio
+import copy
+import logging
+import re
+
+import aiohttp
+import pytest
+from aioresponses import aioresponses
+
+from imouapi.alarms import ImouAlarmStream
+from imouapi.api import ImouAPIClient
+from imouapi.device import ImouDevice
+from imouapi.fleet import ImouFleet
+
+from .const import MOCK_RESPONSES
+
+logger = logging.getLogger("imouapi")
+logger.setLevel(logging.DEBUG)
+
+
+class TestAlarms:
+    """Test suite for ImouAlarmStream."""
+
+    def setup(self):
+        """Initialize the test suite."""
+        self.loop = asyncio.new_event_loop()  # pylint: disable=attribute-defined-outside-init
+        self.session = aiohttp.ClientSession()  # pylint: disable=attribute-defined-outside-init
+        self.api_client = ImouAPIClient(  # pylint: disable=attribute-defined-outside-init
+            "appId", "appSecret", self.session
+        )
+        self.api_client.set_log_http_requests(True)
+
+    def config_mock(self, mocked, url: str, response: str, **kwargs):
+        """Configure a mock request."""
+        status = kwargs["status"] if "status" in kwargs else 200
+        exception = kwargs["exception"] if "exception" in kwargs else None
+        repeat = kwargs["repeat"] if "repeat" in kwargs else False
+        payload = MOCK_RESPONSES[response] if response in MOCK_RESPONSES else "{invalid"
+        mocked.post(re.compile(r".+/" + url + "$"), status=status, payload=payload, exception=exception, repeat=repeat)
+
+    def configure_responses_ok(self, mocked):
+        """Configure all responses ok."""
+        self.config_mock(mocked, "accessToken", "accessToken_ok", repeat=True)
+        self.config_mock(mocked, "deviceBaseDetailList", "deviceBaseDetailList_ok", repeat=True)
+        self.config_mock(mocked, "deviceOnline", "deviceOnline_ok", repeat=True)
+        self.config_mock(mocked, "getAlarmMessage", "getAlarmMessage_ok", repeat=True)
+        self.config_mock(mocked, "getDeviceCameraStatus", "getDeviceCameraStatus_ok", repeat=True)
+        self.config_mock(mocked, "deviceStorage", "deviceStorage_ok", repeat=True)
+        self.config_mock(mocked, "getNightVisionMode", "getNightVisionMode_ok", repeat=True)
+        self.config_mock(mocked, "getMessageCallback", "getMessageCallback_ok", repeat=True)
+        self.config_mock(mocked, "deviceSdcardStatus", "deviceSdcardStatus_ok", repeat=True)
+
+    def alarm(self, msg_type: str = "human", device_id: str = "8L0DF93PAZ55FD2", time: int = 1664127393) -> dict:
+        """Return a stream alarm."""
+        return {
+            "device_id": device_id,
+            "channel_id": "0",
+            "alarm_id": None,
+            "time": time,
+            "msgType": msg_type,
+            "code": "120",
+            "source": "push",
+            "count": 1,
+        }
+
+    def test_drop_oldest(self):
+        """Test the oldest alarms are dropped when the buffer is full."""
+        stream = ImouAlarmStream(max_size=2)
+        for time in range(3):
+            assert stream.put_nowait(self.alarm(time=time)) is True
+        stream.close()
+
+        async def async_consume():
+            return [alarm["time"] async for alarm in stream]
+
+        assert self.loop.run_until_complete(async_consume()) == [1, 2]
+        assert stream.get_statistics() == {"received": 3, "delivered": 2, "dropped": 1, "coalesced": 0}
+
+    def test_coalesce(self):
+        """Test alarms of the same kind are coalesced when the buffer is full."""
+        stream = ImouAlarmStream(max_size=2, overflow="coalesce")
+        stream.put_nowait(self.alarm("human", time=1))
+        stream.put_nowait(self.alarm("videoMotion", time=2))
+        stream.put_nowait(self.alarm("human", time=3))
+        stream.put_nowait(self.alarm("human", time=4))
+        first = self.loop.run_until_complete(stream.async_get())
+        assert (first["time"], first["count"]) == (4, 3)
+        # alarms of a different kind drop the oldest
+        stream.put_nowait(self.alarm("crossLine", time=5))
+        stream.put_nowait(self.alarm("human", time=6))
+        stream.close()
+
+        async def async_consume():
+            return [(alarm["msgType"], alarm["time"], alarm["count"]) async for alarm in stream]
+
+        assert self.loop.run_until_complete(async_consume()) == [("crossLine", 5, 1), ("human", 6, 1)]
+        assert stream.get_statistics() == {"received": 6, "delivered": 3, "dropped": 1, "coalesced": 2}
+
+    def test_block(self):
+        """Test the producer waits for the consumer when the buffer is full."""
+        stream = ImouAlarmStream(max_size=1, overflow="block")
+
+        async def async_produce():
+            for time in range(3):
+                await stream.async_put(self.alarm(time=time))
+            stream.close()
+
+        async def async_consume():
+            producer = asyncio.ensure_future(async_produce())
+            await asyncio.sleep(0.01)
+            # the producer is waiting and pushed alarms are discarded
+            assert stream.get_size() == 1 and not producer.done()
+            assert stream.put_nowait(self.alarm(time=10)) is False
+            alarms = [alarm["time"] async for alarm in stream]
+            await producer
+            return alarms
+
+        assert self.loop.run_until_complete(async_consume()) == [0, 1, 2]
+        assert stream.get_statistics()["dropped"] == 1
+
+    def test_invalid_overflow(self):
+        """Test an unknown overflow policy is rejected."""
+        with pytest.raises(ValueError):
+            ImouAlarmStream(overflow="unknown")
+
+    def test_device_alarms(self):
+        """Test polled and pushed alarms are published to the streams of the device and of the fleet."""
+        newer = copy.deepcopy(MOCK_RESPONSES["getAlarmMessage_ok"])
+        alarms = newer["result"]["data"]["alarms"]
+        newer["result"]["data"]["alarms"] = [dict(alarms[0], alarmId="3", time=1664127400)] + alarms
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "getAlarmMessage", "getAlarmMessage_ok")
+            mocked.post(re.compile(r".+/getAlarmMessage$"), payload=newer)
+            self.configure_responses_ok(mocked)
+            device = ImouDevice(self.api_client, "8L0DF93PAZ55FD2")
+            fleet = ImouFleet(self.api_client)
+            fleet_stream = fleet.alarms()
+            fleet.add_device(device)
+            stream = device.alarms()
+            # alarms occurred before the first update are not published
+            self.loop.run_until_complete(device.async_get_data())
+            assert stream.get_size() == 0
+            self.loop.run_until_complete(device.async_get_data())
+            assert device.get_sensor_by_name("motionAlarm").is_on() is True
+            event = {"type": "alarm", "device_id": "8L0DF93PAZ55FD2", "channel_id": "0"}
+            device.process_event(dict(event, time=1664127500, msgType="videoMotion", code="1"))
+            stream.close()
+
+            async def async_consume():
+                return [(alarm["time"], alarm["source"]) async for alarm in stream]
+
+            assert self.loop.run_until_complete(async_consume()) == [(1664127400, "poll"), (1664127500, "push")]
+            assert fleet_stream.get_size() == 2
+            fleet_stream.close()
+            device.process_event(dict(event, time=1664127600, msgType="videoMotion", code="1"))
+            assert fleet_stream.get_size() == 2
+
+    def test_alarm_cursor_per_device(self):
+        """Test devices sharing the API client do not take each other's alarms."""
+        newer = copy.deepcopy(MOCK_RESPONSES["getAlarmMessage_ok"])
+        alarms = newer["result"]["data"]["alarms"]
+        newer["result"]["data"]["alarms"] = [dict(alarms[0], alarmId="3", time=1664127400)] + alarms
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "getAlarmMessage", "getAlarmMessage_ok")
+            self.config_mock(mocked, "getAlarmMessage", "getAlarmMessage_ok")
+            mocked.post(re.compile(r".+/getAlarmMessage$"), payload=newer, repeat=True)
+            self.configure_responses_ok(mocked)
+            devices = [ImouDevice(self.api_client, "8L0DF93PAZ55FD2") for _ in range(2)]
+            streams = [device.alarms() for device in devices]
+            for device in devices:
+                self.loop.run_until_complete(device.async_get_data())
+            for device in devices:
+                self.loop.run_until_complete(device.async_get_data())
+                assert device.get_sensor_by_name("motionAlarm").is_on() is True
+            assert [stream.get_size() for stream in streams] == [1, 1]
+
+    def test_pushed_alarm_not_polled_again(self):
+        """Test an alarm both pushed and polled is published once."""
+        newer = copy.deepcopy(MOCK_RESPONSES["getAlarmMessage_ok"])
+        alarms = newer["result"]["data"]["alarms"]
+        newer["result"]["data"]["alarms"] = [dict(alarms[0], alarmId="3", time=1664127400)] + alarms
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "getAlarmMessage", "getAlarmMessage_ok")
+            mocked.post(re.compile(r".+/getAlarmMessage$"), payload=newer)
+            self.configure_responses_ok(mocked)
+            device = ImouDevice(self.api_client, "8L0DF93PAZ55FD2")
+            stream = device.alarms()
+            self.loop.run_until_complete(device.async_get_data())
+            event = {"type": "alarm", "device_id": "8L0DF93PAZ55FD2", "channel_id": "0", "code": "1"}
+            device.process_event(dict(event, time=1664127400, msgType=alarms[0]["msgType"]))
+            device.process_event(dict(event, time=1664127400, msgType=alarms[0]["msgType"]))
+            self.loop.run_until_complete(device.async_get_data())
+            stream.close()
+
+            async def async_consume():
+                return [(alarm["time"], alarm["source"]) async for alarm in stream]
+
+            assert self.loop.run_until_complete(async_consume()) == [(1664127400, "push")]
@@ -1,14 +1,20 @@
 """Tests for `imouapi` package."""
 import asyncio
+import copy
+import json
 import logging
 import re
+from datetime import datetime
+from types import SimpleNamespace
 
 import aiohttp
 import pytest
+from aiohttp import ClientConnectorError
 from aiohttp.http_exceptions import HttpProcessingError
-from aioresponses import aioresponses
+from aioresponses import CallbackResult, aioresponses
 
-from imouapi.api import ImouAPIClient
+from imouapi.api import ImouAPIClient, ImouCircuitBreaker, ImouRateLimiter, ImouRetryPolicy
+from imouapi.exceptions import CircuitOpen, NotAuthorized
 
 from .const import MOCK_RESPONSES
 
@@ -104,6 +110,624 @@ class TestApiClient:
             )
             assert data["status"] == "on"
 
+    def test_accessToken_concurrent_requests(self):  # pylint: disable=invalid-name
+        """Test accessToken: concurrent requests share a single access token request."""
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok", repeat=True)
+            self.config_mock(mocked, "deviceOnline", "deviceOnline_ok", repeat=True)
+
+            async def async_burst():
+                return await asyncio.gather(
+                    *[self.api_client.async_api_deviceOnline("8L0DF93PAZ55FD2") for _ in range(20)]
+                )
+
+            results = self.loop.run_until_complete(async_burst())
+            assert len(results) == 20
+            token_requests = [key for key in mocked.requests if str(key[1]).endswith("/accessToken")]
+            assert len(mocked.requests[token_requests[0]]) == 1
+
+    def test_accessToken_expired_concurrent_requests(self):  # pylint: disable=invalid-name
+        """Test accessToken: concurrent requests with the same expired token renew it only once."""
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok", repeat=True)
+            self.loop.run_until_complete(self.api_client.async_connect())
+            expired_token = self.api_client._access_token  # pylint: disable=protected-access
+
+            async def async_renew():
+                await asyncio.gather(
+                    *[
+                        self.api_client._async_renew_access_token(expired_token)  # pylint: disable=protected-access
+                        for _ in range(5)
+                    ]
+                )
+
+            self.loop.run_until_complete(async_renew())
+            assert self.api_client.is_connected() is True
+            token_requests = [key for key in mocked.requests if str(key[1]).endswith("/accessToken")]
+            assert len(mocked.requests[token_requests[0]]) == 2
+
+    def test_accessToken_refresh_scheduled(self):  # pylint: disable=invalid-name
+        """Test accessToken: renewal scheduled before expiration."""
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok")
+            self.loop.run_until_complete(self.api_client.async_connect())
+            handle = self.api_client._token_refresh_handle  # pylint: disable=protected-access
+            assert handle is not None
+            assert handle.when() - self.loop.time() == pytest.approx(190805 - 300, abs=5)
+            self.loop.run_until_complete(self.api_client.async_disconnect())
+            assert self.api_client._token_refresh_handle is None  # pylint: disable=protected-access
+
+    def test_accessToken_refresh_in_background(self):  # pylint: disable=invalid-name
+        """Test accessToken: renewal in background while calls keep using the current token."""
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok", repeat=True)
+            self.config_mock(mocked, "deviceOnline", "deviceOnline_ok", repeat=True)
+            self.loop.run_until_complete(self.api_client.async_connect())
+
+            async def async_refresh():
+                self.api_client._start_access_token_refresh()  # pylint: disable=protected-access
+                # the client is still connected with the current token while the new one is requested
+                assert self.api_client.is_connected() is True
+                data = await self.api_client.async_api_deviceOnline("8L0DF93PAZ55FD2")
+                await self.api_client.async_connect()
+                return data
+
+            data = self.loop.run_until_complete(async_refresh())
+            assert data["onLine"] == "1"
+            token_requests = [key for key in mocked.requests if str(key[1]).endswith("/accessToken")]
+            assert len(mocked.requests[token_requests[0]]) == 2
+            assert self.api_client._token_refresh_handle is not None  # pylint: disable=protected-access
+
+    def test_coalesce_identical_requests(self):
+        """Test identical read-only requests in flight are sent only once."""
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok")
+            self.config_mock(mocked, "deviceOnline", "deviceOnline_ok", repeat=True)
+            self.loop.run_until_complete(self.api_client.async_connect())
+
+            async def async_burst():
+                return await asyncio.gather(
+                    *[self.api_client.async_api_deviceOnline("8L0DF93PAZ55FD2") for _ in range(10)],
+                    self.api_client.async_api_deviceOnline("another_device"),
+                )
+
+            results = self.loop.run_until_complete(async_burst())
+            assert all(result["onLine"] == "1" for result in results)
+            online_requests = [key for key in mocked.requests if str(key[1]).endswith("/deviceOnline")]
+            assert len(mocked.requests[online_requests[0]]) == 2
+            assert self.api_client.get_statistics()["coalesced_calls"] == 9
+
+    def test_coalesce_not_read_only_requests(self):
+        """Test requests which are not read-only are always sent."""
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok")
+            self.config_mock(mocked, "setDeviceCameraStatus", "setDeviceCameraStatus_ok", repeat=True)
+            self.loop.run_until_complete(self.api_client.async_connect())
+
+            async def async_burst():
+                return await asyncio.gather(
+                    *[
+                        self.api_client.async_api_setDeviceCameraStatus("8L0DF93PAZ55FD2", "headerDetect", True)
+                        for _ in range(3)
+                    ]
+                )
+
+            self.loop.run_until_complete(async_burst())
+            set_requests = [key for key in mocked.requests if str(key[1]).endswith("/setDeviceCameraStatus")]
+            assert len(mocked.requests[set_requests[0]]) == 3
+            assert self.api_client.get_statistics()["coalesced_calls"] == 0
+
+    def test_cache_disabled(self):
+        """Test response cache: disabled by default."""
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok")
+            self.config_mock(mocked, "getNightVisionMode", "getNightVisionMode_ok", repeat=True)
+            for _ in range(2):
+                self.loop.run_until_complete(self.api_client.async_api_getNightVisionMode("8L0DF93PAZ55FD2"))
+            get_requests = [key for key in mocked.requests if str(key[1]).endswith("/getNightVisionMode")]
+            assert len(mocked.requests[get_requests[0]]) == 2
+
+    def test_cache_invalidation(self):
+        """Test response cache: cached response invalidated by the setter."""
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok")
+            self.config_mock(mocked, "getNightVisionMode", "getNightVisionMode_ok", repeat=True)
+            self.config_mock(mocked, "setNightVisionMode", "setNightVisionMode_ok")
+            self.api_client.set_cache_enabled(True)
+            for _ in range(3):
+                data = self.loop.run_until_complete(self.api_client.async_api_getNightVisionMode("8L0DF93PAZ55FD2"))
+                assert data["mode"] == "Intelligent"
+            self.loop.run_until_complete(self.api_client.async_api_setNightVisionMode("8L0DF93PAZ55FD2", "Off"))
+            self.loop.run_until_complete(self.api_client.async_api_getNightVisionMode("8L0DF93PAZ55FD2"))
+            get_requests = [key for key in mocked.requests if str(key[1]).endswith("/getNightVisionMode")]
+            assert len(mocked.requests[get_requests[0]]) == 2
+            assert self.api_client.get_statistics()["cache_hits"] == 2
+            assert self.api_client.get_statistics()["cache_misses"] == 2
+
+    def test_cache_invalidation_in_flight(self):
+        """Test response cache: response of a read in flight when the setter completes not cached."""
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok")
+            self.config_mock(mocked, "setNightVisionMode", "setNightVisionMode_ok")
+            self.api_client.set_cache_enabled(True)
+            self.loop.run_until_complete(self.api_client.async_connect())
+            read_sent = asyncio.Event()
+
+            async def async_slow_read(url, **kwargs):
+                read_sent.set()
+                await asyncio.sleep(0.05)
+                return CallbackResult(payload=MOCK_RESPONSES["getNightVisionMode_ok"])
+
+            mocked.post(re.compile(r".+/getNightVisionMode$"), callback=async_slow_read)
+            self.config_mock(mocked, "getNightVisionMode", "getNightVisionMode_ok", repeat=True)
+
+            async def async_read_while_setting():
+                read = asyncio.ensure_future(self.api_client.async_api_getNightVisionMode("8L0DF93PAZ55FD2"))
+                await read_sent.wait()
+                await self.api_client.async_api_setNightVisionMode("8L0DF93PAZ55FD2", "Off")
+                await read
+                await self.api_client.async_api_getNightVisionMode("8L0DF93PAZ55FD2")
+
+            self.loop.run_until_complete(async_read_while_setting())
+            assert self.api_client.get_statistics()["cache_hits"] == 0
+            get_requests = [key for key in mocked.requests if str(key[1]).endswith("/getNightVisionMode")]
+            assert len(mocked.requests[get_requests[0]]) == 2
+
+    def test_coalesce_cancelled(self):
+        """Test a request shared by several callers is cancelled only once none of them is waiting for it."""
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok")
+            self.loop.run_until_complete(self.api_client.async_connect())
+            completed = []
+
+            async def async_slow_read(url, **kwargs):
+                await asyncio.sleep(0.1)
+                completed.append(url)
+                return CallbackResult(payload=MOCK_RESPONSES["getNightVisionMode_ok"])
+
+            mocked.post(re.compile(r".+/getNightVisionMode$"), callback=async_slow_read, repeat=True)
+
+            async def async_read(timeout: float):
+                return await asyncio.wait_for(self.api_client.async_api_getNightVisionMode("8L0DF93PAZ55FD2"), timeout)
+
+            async def async_cancel():
+                # the request goes on for the caller still waiting
+                results = await asyncio.gather(async_read(0.01), async_read(1), return_exceptions=True)
+                assert isinstance(results[0], asyncio.TimeoutError) and results[1]["mode"] == "Intelligent"
+                assert len(completed) == 1
+                # the request is cancelled with its only caller
+                with pytest.raises(asyncio.TimeoutError):
+                    await async_read(0.01)
+                await asyncio.sleep(0.15)
+                assert len(completed) == 1
+
+            self.loop.run_until_complete(async_cancel())
+
+    def test_coalesce_read_after_write(self):
+        """Test a read sent after a setter completed does not share the response of an older read in flight."""
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok")
+            self.config_mock(mocked, "setNightVisionMode", "setNightVisionMode_ok")
+            self.loop.run_until_complete(self.api_client.async_connect())
+            read_sent = asyncio.Event()
+
+            async def async_slow_read(url, **kwargs):
+                read_sent.set()
+                await asyncio.sleep(0.05)
+                return CallbackResult(payload=MOCK_RESPONSES["getNightVisionMode_ok"])
+
+            updated: dict = copy.deepcopy(MOCK_RESPONSES["getNightVisionMode_ok"])
+            updated["result"]["data"]["mode"] = "Off"
+            mocked.post(re.compile(r".+/getNightVisionMode$"), callback=async_slow_read)
+            mocked.post(re.compile(r".+/getNightVisionMode$"), payload=updated)
+
+            async def async_read_after_write():
+                read = asyncio.ensure_future(self.api_client.async_api_getNightVisionMode("8L0DF93PAZ55FD2"))
+                await read_sent.wait()
+                await self.api_client.async_api_setNightVisionMode("8L0DF93PAZ55FD2", "Off")
+                return await asyncio.gather(read, self.api_client.async_api_getNightVisionMode("8L0DF93PAZ55FD2"))
+
+            results = self.loop.run_until_complete(async_read_after_write())
+            assert [result["mode"] for result in results] == ["Intelligent", "Off"]
+            assert self.api_client.get_statistics()["coalesced_calls"] == 0
+
+    def test_cache_eviction(self):
+        """Test response cache: least recently used responses evicted and expired responses ignored."""
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok")
+            self.config_mock(mocked, "deviceSdcardStatus", "deviceSdcardStatus_ok", repeat=True)
+            self.api_client.set_cache_enabled(True)
+            self.api_client.set_cache_max_size(1)
+            for device_id in ("device_1", "device_2", "device_1"):
+                self.loop.run_until_complete(self.api_client.async_api_deviceSdcardStatus(device_id))
+            assert self.api_client.get_statistics()["cache_misses"] == 3
+            self.api_client.set_cache_ttl("deviceSdcardStatus", 0)
+            assert self.api_client.get_cache_ttl("deviceSdcardStatus") == 0
+            self.loop.run_until_complete(self.api_client.async_api_deviceSdcardStatus("device_1"))
+            get_requests = [key for key in mocked.requests if str(key[1]).endswith("/deviceSdcardStatus")]
+            assert len(mocked.requests[get_requests[0]]) == 4
+
+    def test_rate_limit(self):
+        """Test rate limit: requests over the limit wait instead of failing."""
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok")
+            self.config_mock(mocked, "setDeviceCameraStatus", "setDeviceCameraStatus_ok", repeat=True)
+            self.loop.run_until_complete(self.api_client.async_connect())
+            self.api_client.set_rate_limit(50, 1)
+            self.api_client.set_device_rate_limit(100, 2)
+
+            async def async_burst():
+                await asyncio.gather(
+                    *[
+                        self.api_client.async_api_setDeviceCameraStatus("8L0DF93PAZ55FD2", "headerDetect", True)
+                        for _ in range(5)
+                    ]
+                )
+
+            started_at = self.loop.time()
+            self.loop.run_until_complete(async_burst())
+            assert self.loop.time() - started_at >= 0.07
+            statistics = self.api_client.get_rate_limit_statistics()
+            assert statistics["account"]["requests"] == 5
+            assert statistics["account"]["queued_requests"] == 4
+            assert statistics["account"]["max_queue_depth"] > 1
+            assert statistics["account"]["queue_depth"] == 0
+            assert statistics["devices"]["8L0DF93PAZ55FD2"]["requests"] == 5
+
+    def test_rate_limit_deadline(self):
+        """Test rate limit: time waiting in the rate limit queue does not count towards the deadline."""
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok")
+            self.config_mock(mocked, "setDeviceCameraStatus", "setDeviceCameraStatus_ok", repeat=True)
+            self.loop.run_until_complete(self.api_client.async_connect())
+            self.api_client.set_rate_limit(20, 1)
+            self.api_client.set_retry_policy(ImouRetryPolicy(deadline=0.1))
+
+            async def async_burst():
+                await asyncio.gather(
+                    *[
+                        self.api_client.async_api_setDeviceCameraStatus("8L0DF93PAZ55FD2", "headerDetect", True)
+                        for _ in range(5)
+                    ]
+                )
+
+            started_at = self.loop.time()
+            self.loop.run_until_complete(async_burst())
+            assert self.loop.time() - started_at >= 0.15
+
+    def test_rate_limit_circuit_breaker(self):
+        """Test rate limit: requests waiting in the rate limit queue do not open the circuit."""
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok")
+            self.config_mock(mocked, "setDeviceCameraStatus", "setDeviceCameraStatus_ok", repeat=True)
+            self.loop.run_until_complete(self.api_client.async_connect())
+            self.api_client.set_rate_limit(50, 1)
+            self.api_client.set_retry_policy(ImouRetryPolicy(deadline=0.05))
+            self.api_client.set_circuit_breaker(ImouCircuitBreaker(failure_threshold=2))
+
+            async def async_burst():
+                return await asyncio.gather(
+                    *[
+                        self.api_client.async_api_setDeviceCameraStatus("8L0DF93PAZ55FD2", "headerDetect", True)
+                        for _ in range(8)
+                    ],
+                    return_exceptions=True,
+                )
+
+            results = self.loop.run_until_complete(async_burst())
+            assert not any(isinstance(result, Exception) for result in results)
+            circuit_breaker = self.api_client.get_circuit_breaker()
+            assert circuit_breaker.get_state("setDeviceCameraStatus", "8L0DF93PAZ55FD2") == "closed"
+
+    def test_circuit_breaker_not_sent(self):
+        """Test circuit breaker: requests failed before being sent are not counted as failures."""
+        connection_key = SimpleNamespace(host="openapi.easy4ip.com", port=443, ssl=True)
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok")
+            error = ClientConnectorError(connection_key, OSError("connection refused"))
+            self.config_mock(mocked, "deviceOnline", "deviceOnline_ok", exception=error, repeat=True)
+            self.api_client.set_retry_policy(ImouRetryPolicy(max_attempts=1))
+            self.api_client.set_circuit_breaker(ImouCircuitBreaker(failure_threshold=1))
+            with pytest.raises(Exception) as exception:
+                self.loop.run_until_complete(self.api_client.async_api_deviceOnline("device_1"))
+            assert "ConnectionFailed" in str(exception)
+            assert self.api_client.get_circuit_breaker().get_state("deviceOnline", "device_1") == "closed"
+
+    def test_rate_limiter_fifo(self):
+        """Test rate limiter: requests are served in the order they arrive."""
+        rate_limiter = ImouRateLimiter(100, 1)
+        served = []
+
+        async def async_request(index):
+            await rate_limiter.async_acquire()
+            served.append(index)
+
+        async def async_burst():
+            await asyncio.gather(*[async_request(index) for index in range(5)])
+
+        self.loop.run_until_complete(async_burst())
+        assert served == [0, 1, 2, 3, 4]
+        assert rate_limiter.get_statistics()["average_wait_time"] > 0
+
+    def test_retry_transient_failure(self):
+        """Test retry policy: transient failures are retried."""
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok")
+            self.config_mock(mocked, "deviceOnline", "deviceOnline_ok", exception=HttpProcessingError())
+            self.config_mock(mocked, "deviceOnline", "deviceOnline_ok", status=503)
+            self.config_mock(mocked, "deviceOnline", "deviceOnline_ok")
+            self.api_client.set_retry_policy(ImouRetryPolicy(base_delay=0.01))
+            data = self.loop.run_until_complete(self.api_client.async_api_deviceOnline("8L0DF93PAZ55FD2"))
+            assert data["onLine"] == "1"
+
+    def test_retry_not_retryable(self):
+        """Test retry policy: errors which are not retryable are raised immediately."""
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok")
+            self.config_mock(mocked, "setDeviceCameraStatus", "setDeviceCameraStatus_error", repeat=True)
+            self.api_client.set_retry_policy(ImouRetryPolicy(base_delay=0.01))
+            with pytest.raises(Exception) as exception:
+                self.loop.run_until_complete(
+                    self.api_client.async_api_setDeviceCameraStatus("8L0DF93PAZ55FD2", "headerDetect", True)
+                )
+            assert "APIError" in str(exception)
+            set_requests = [key for key in mocked.requests if str(key[1]).endswith("/setDeviceCameraStatus")]
+            assert len(mocked.requests[set_requests[0]]) == 1
+
+    def test_retry_write(self):
+        """Test retry policy: commands are retried only if the request has not been sent."""
+        connection_key = SimpleNamespace(host="openapi.easy4ip.com", port=443, ssl=True)
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok")
+            self.config_mock(mocked, "restartDevice", "restartDevice_ok", exception=HttpProcessingError())
+            self.api_client.set_retry_policy(ImouRetryPolicy(base_delay=0.01))
+            with pytest.raises(Exception) as exception:
+                self.loop.run_until_complete(self.api_client.async_api_restartDevice("8L0DF93PAZ55FD2"))
+            assert "ConnectionFailed" in str(exception)
+            error = ClientConnectorError(connection_key, OSError("connection refused"))
+            self.config_mock(mocked, "restartDevice", "restartDevice_ok", exception=error)
+            self.config_mock(mocked, "restartDevice", "restartDevice_ok")
+            self.loop.run_until_complete(self.api_client.async_api_restartDevice("8L0DF93PAZ55FD2"))
+            restart_requests = [key for key in mocked.requests if str(key[1]).endswith("/restartDevice")]
+            assert len(mocked.requests[restart_requests[0]]) == 3
+
+    def test_retry_broken_token(self):
+        """Test retry policy: a token which keeps being rejected does not cause endless retries."""
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok", repeat=True)
+            self.config_mock(mocked, "deviceOnline", "accessToken_expired", repeat=True)
+            with pytest.raises(Exception) as exception:
+                self.loop.run_until_complete(self.api_client.async_api_deviceOnline("8L0DF93PAZ55FD2"))
+            assert "APIError" in str(exception) and "TK1002" in str(exception)
+            online_requests = [key for key in mocked.requests if str(key[1]).endswith("/deviceOnline")]
+            assert len(mocked.requests[online_requests[0]]) == 3
+
+    def test_retry_deadline(self):
+        """Test retry policy: a call does not last longer than the deadline."""
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok")
+            self.config_mock(mocked, "deviceOnline", "deviceOnline_ok", exception=HttpProcessingError(), repeat=True)
+            self.api_client.set_retry_policy(ImouRetryPolicy(max_attempts=100, base_delay=1, deadline=0.2))
+            started_at = self.loop.time()
+            with pytest.raises(Exception) as exception:
+                self.loop.run_until_complete(self.api_client.async_api_deviceOnline("8L0DF93PAZ55FD2"))
+            assert "ConnectionFailed" in str(exception)
+            assert self.loop.time() - started_at < 1
+
+    def test_circuit_breaker(self):
+        """Test circuit breaker: calls to a failing device fail fast until recovered."""
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok")
+            self.config_mock(mocked, "deviceOnline", "deviceOnline_ok", exception=HttpProcessingError())
+            self.config_mock(mocked, "deviceOnline", "deviceOnline_ok", exception=HttpProcessingError())
+            self.config_mock(mocked, "deviceOnline", "deviceOnline_ok", repeat=True)
+            self.api_client.set_retry_policy(ImouRetryPolicy(max_attempts=1))
+            self.api_client.set_circuit_breaker(ImouCircuitBreaker(failure_threshold=2, recovery_timeout=0.05))
+            circuit_breaker = self.api_client.get_circuit_breaker()
+            for _ in range(2):
+                with pytest.raises(Exception) as exception:
+                    self.loop.run_until_complete(self.api_client.async_api_deviceOnline("device_1"))
+                assert "ConnectionFailed" in str(exception)
+            assert circuit_breaker.get_state("deviceOnline", "device_1") == "open"
+            assert circuit_breaker.get_circuits()["deviceOnline:device_1"]["failures"] == 2
+            # the circuit is open, the call fails fast
+            with pytest.raises(Exception) as exception:
+                self.loop.run_until_complete(self.api_client.async_api_deviceOnline("device_1"))
+            assert "CircuitOpen" in str(exception)
+            # other devices are not affected
+            data = self.loop.run_until_complete(self.api_client.async_api_deviceOnline("device_2"))
+            assert data["onLine"] == "1"
+            # after the recovery timeout a trial call closes the circuit
+            self.loop.run_until_complete(asyncio.sleep(0.05))
+            assert circuit_breaker.get_state("deviceOnline", "device_1") == "half_open"
+            data = self.loop.run_until_complete(self.api_client.async_api_deviceOnline("device_1"))
+            assert data["onLine"] == "1"
+            assert circuit_breaker.get_state("deviceOnline", "device_1") == "closed"
+            online_requests = [key for key in mocked.requests if str(key[1]).endswith("/deviceOnline")]
+            assert len(mocked.requests[online_requests[0]]) == 4
+
+    def test_json_codec(self):
+        """Test custom JSON codec: each request encoded once and each response decoded once."""
+        calls = {"loads": 0, "dumps": 0}
+
+        def loads(data):
+            calls["loads"] = calls["loads"] + 1
+            return json.loads(data)
+
+        def dumps(data):
+            calls["dumps"] = calls["dumps"] + 1
+            return json.dumps(data)
+
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok")
+            self.config_mock(mocked, "deviceOnline", "deviceOnline_ok")
+            self.api_client.set_json_codec(loads, dumps)
+            data = self.loop.run_until_complete(self.api_client.async_api_deviceOnline("8L0DF93PAZ55FD2"))
+            assert data["onLine"] == "1"
+            assert calls == {"loads": 2, "dumps": 2}
+            online_requests = [key for key in mocked.requests if str(key[1]).endswith("/deviceOnline")]
+            request_body = json.loads(mocked.requests[online_requests[0]][0].kwargs["data"])
+            assert request_body["params"]["deviceId"] == "8L0DF93PAZ55FD2"
+
+    def test_invalid_json_response(self):
+        """Test response which is not valid JSON."""
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok")
+            mocked.post(re.compile(r".+/deviceOnline$"), status=200, body="{invalid")
+            with pytest.raises(Exception) as exception:
+                self.loop.run_until_complete(self.api_client.async_api_deviceOnline("8L0DF93PAZ55FD2"))
+            assert "InvalidResponse" in str(exception) and "unable to parse" in str(exception)
+
+    def test_redact_log_message(self):
+        """Test redaction of sensitive data in log messages."""
+        message = str({"appId": "appId", "params": {"token": "At_0000", "deviceId": "8L0DF93PAZ55FD2"}})
+        message = message + ' {"playToken": "8YdkSe1O9=", "thumbUrl":"https://url.com"}'
+        redacted = self.api_client._redact_log_message(message)  # pylint: disable=protected-access
+        assert "At_0000" not in redacted and "8YdkSe1O9=" not in redacted and "https://url.com" not in redacted
+        assert "'appId': 'XXXXXXXXX'" in redacted and '"playToken": "XXXXXXXXX"' in redacted
+        assert "8L0DF93PAZ55FD2" in redacted
+        self.api_client.set_redact_log_messages(False)
+        assert self.api_client._redact_log_message(message) == message  # pylint: disable=protected-access
+
+    def test_log_http_requests(self, caplog):
+        """Test logged HTTP requests and responses are redacted."""
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok")
+            with caplog.at_level(logging.DEBUG, logger="imouapi"):
+                self.loop.run_until_complete(self.api_client.async_connect())
+            assert "[HTTP_RESPONSE] 200" in caplog.text
+            assert "'appSecret'" not in caplog.text and "At_0000ea19a5687d45443399c8b8814e4a" not in caplog.text
+
+    def test_owned_session(self):
+        """Test the client creates and closes its own pooled session."""
+
+        async def run_client(api_client):
+            async with api_client:
+                await api_client.async_connect()
+                session = api_client.get_session()
+            return session
+
+        api_client = ImouAPIClient("appId", "appSecret")
+        api_client.set_connection_pool(limit_per_host=4, keepalive_timeout=30.0)
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok")
+            session = self.loop.run_until_complete(run_client(api_client))
+            assert session.closed
+            assert session.connector is None or session.connector.closed
+            # a new session is created once the owned one has been closed
+            new_session = self.loop.run_until_complete(run_client(api_client))
+            assert new_session is not session and new_session.closed
+
+    def test_owned_session_pool(self):
+        """Test the connection pool of the session owned by the client."""
+
+        async def get_connector(api_client):
+            session = api_client.get_session()
+            connector = session.connector
+            assert api_client.get_session() is session
+            await api_client.async_close()
+            return connector
+
+        api_client = ImouAPIClient("appId", "appSecret")
+        api_client.set_connection_pool(limit_per_host=4, keepalive_timeout=30.0, dns_cache_ttl=60)
+        connector = self.loop.run_until_complete(get_connector(api_client))
+        assert connector.limit_per_host == 4
+        # a provided session is never closed by the client
+        self.loop.run_until_complete(self.api_client.async_close())
+        assert not self.session.closed
+
+    def test_owned_session_replaced(self):
+        """Test a session owned by the client and replaced without an event loop running is closed later."""
+
+        async def get_session(api_client):
+            return api_client.get_session()
+
+        api_client = ImouAPIClient("appId", "appSecret")
+        owned_session = self.loop.run_until_complete(get_session(api_client))
+        api_client.set_session(self.session)
+        assert api_client.get_session() is self.session and not owned_session.closed
+        self.loop.run_until_complete(api_client.async_close())
+        assert owned_session.closed and not self.session.closed
+
+    def test_batched_requests(self):
+        """Test requests for single devices sent at the same time are batched."""
+        details = MOCK_RESPONSES["deviceBaseDetailList_ok"]["result"]["data"]["deviceList"][0]
+        device_ids = [f"8L0DF93PAZ55FD{index}" for index in range(3)]
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok")
+            for batch in [device_ids[:2], device_ids[2:]]:
+                response = copy.deepcopy(MOCK_RESPONSES["deviceBaseDetailList_ok"])
+                response["result"]["data"]["deviceList"] = [dict(details, deviceId=device_id) for device_id in batch]
+                mocked.post(re.compile(r".+/deviceBaseDetailList$"), payload=response)
+            self.api_client.set_batch_max_size(2)
+
+            async def async_load():
+                return await asyncio.gather(
+                    *[self.api_client.async_load_deviceBaseDetailList(device_id) for device_id in device_ids]
+                )
+
+            results = self.loop.run_until_complete(async_load())
+            assert [result["deviceList"][0]["deviceId"] for result in results] == device_ids
+            assert all(len(result["deviceList"]) == 1 for result in results)
+            detail_requests = [key for key in mocked.requests if str(key[1]).endswith("/deviceBaseDetailList")]
+            assert len(mocked.requests[detail_requests[0]]) == 2
+            assert self.api_client.get_batch_statistics()["deviceBaseDetailList"] == {"requests": 3, "batches": 2}
+
+    def test_batched_requests_error(self):
+        """Test a failed batch falls back to one request per device, each caller getting its own error."""
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok")
+
+            def device_response(url, **kwargs):
+                devices = [device["deviceId"] for device in json.loads(kwargs["data"])["params"]["deviceList"]]
+                if devices == ["8L0DF93PAZ55FD2"]:
+                    return CallbackResult(payload=MOCK_RESPONSES["listDeviceAbility_ok"])
+                return CallbackResult(payload=MOCK_RESPONSES["deviceBaseList_wrong_device_id"])
+
+            mocked.post(re.compile(r".+/listDeviceAbility$"), callback=device_response, repeat=True)
+            circuit_breaker = ImouCircuitBreaker(failure_threshold=2, failure_exceptions=(NotAuthorized,))
+            self.api_client.set_circuit_breaker(circuit_breaker)
+
+            async def async_load():
+                return await asyncio.gather(
+                    self.api_client.async_load_listDeviceAbility("8L0DF93PAZ55FD2"),
+                    self.api_client.async_load_listDeviceAbility("8L0DF93PAZ55FD1"),
+                    return_exceptions=True,
+                )
+
+            for _ in range(2):
+                results = self.loop.run_until_complete(async_load())
+                assert results[0]["deviceList"][0]["deviceId"] == "8L0DF93PAZ55FD2"
+                assert "OP1009" in str(results[1])
+            # only the circuit of the wrong device is open
+            results = self.loop.run_until_complete(async_load())
+            assert results[0]["deviceList"][0]["deviceId"] == "8L0DF93PAZ55FD2"
+            assert isinstance(results[1], CircuitOpen)
+
+    def test_message_callback_shared(self):
+        """Test the message callback configuration is requested once and updated in place."""
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok")
+            self.config_mock(mocked, "getMessageCallback", "getMessageCallback_ok", repeat=True)
+            self.config_mock(mocked, "setMessageCallback", "setMessageCallbackOn_ok", repeat=True)
+
+            async def async_get():
+                return await asyncio.gather(*[self.api_client.async_get_message_callback() for _ in range(10)])
+
+            results = self.loop.run_until_complete(async_get())
+            assert all(result["status"] == "off" for result in results)
+            self.loop.run_until_complete(self.api_client.async_api_setMessageCallbackOn("https://url.com"))
+            data = self.loop.run_until_complete(self.api_client.async_get_message_callback())
+            assert data["status"] == "on" and data["callbackUrl"] == "https://url.com"
+            self.loop.run_until_complete(self.api_client.async_api_setMessageCallbackOff())
+            data = self.loop.run_until_complete(self.api_client.async_get_message_callback())
+            assert data["status"] == "off"
+            callback_requests = [key for key in mocked.requests if str(key[1]).endswith("/getMessageCallback")]
+            assert len(mocked.requests[callback_requests[0]]) == 1
+            # requested again when forced
+            self.loop.run_until_complete(self.api_client.async_get_message_callback(force_refresh=True))
+            assert len(mocked.requests[callback_requests[0]]) == 2
+
     def test_deviceBaseList_ok(self):  # pylint: disable=invalid-name
         """Test deviceBaseList: ok."""
         with aioresponses() as mocked:
@@ -112,6 +736,49 @@ class TestApiClient:
             data = self.loop.run_until_complete(self.api_client.async_api_deviceBaseList())
             assert data["deviceList"][0]["deviceId"] == "8L0DF93PAZ55FD2"
 
+    def test_deviceBaseList_pages(self):  # pylint: disable=invalid-name
+        """Test deviceBaseList: iterate through all the pages."""
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok")
+            for page in [[1, 2], [3, 4], [5]]:
+                response = copy.deepcopy(MOCK_RESPONSES["deviceBaseList_ok"])
+                response["result"]["data"]["count"] = len(page)
+                response["result"]["data"]["deviceList"] = [
+                    {"deviceId": f"8L0DF93PAZ55FD{bind_id}", "bindId": bind_id} for bind_id in page
+                ]
+                mocked.post(re.compile(r".+/deviceBaseList$"), payload=response)
+
+            async def async_list_devices():
+                return [device async for device in self.api_client.async_iter_deviceBaseList(page_size=2)]
+
+            devices = self.loop.run_until_complete(async_list_devices())
+            assert [device["bindId"] for device in devices] == [1, 2, 3, 4, 5]
+            list_requests = [key for key in mocked.requests if str(key[1]).endswith("/deviceBaseList")]
+            calls = mocked.requests[list_requests[0]]
+            assert [json.loads(call.kwargs["data"])["params"]["bindId"] for call in calls] == [-1, 2, 4]
+
+    def test_deviceBaseList_pages_stuck(self):  # pylint: disable=invalid-name
+        """Test deviceBaseList: stop iterating when the cursor does not advance or the same page is returned."""
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok")
+            for page in [[1, 2], [3, 1], [3, 4], [3, 4]]:
+                response = copy.deepcopy(MOCK_RESPONSES["deviceBaseList_ok"])
+                response["result"]["data"]["count"] = len(page)
+                response["result"]["data"]["deviceList"] = [
+                    {"deviceId": f"8L0DF93PAZ55FD{bind_id}", "bindId": bind_id} for bind_id in page
+                ]
+                mocked.post(re.compile(r".+/deviceBaseList$"), payload=response)
+
+            async def async_list_devices():
+                return [device async for device in self.api_client.async_iter_deviceBaseList(page_size=2)]
+
+            # the second page goes back to bindId 1
+            devices = self.loop.run_until_complete(async_list_devices())
+            assert [device["bindId"] for device in devices] == [1, 2, 3, 1]
+            # the fourth page is the same as the third one
+            devices = self.loop.run_until_complete(async_list_devices())
+            assert [device["bindId"] for device in devices] == [3, 4]
+
     def test_deviceBaseList_wrong_device_id(self):  # pylint: disable=invalid-name
         """Test deviceBaseList: wrong device id."""
         with aioresponses() as mocked:
@@ -181,6 +848,77 @@ class TestApiClient:
             data = self.loop.run_until_complete(self.api_client.async_api_getAlarmMessage("8L0DF93PAZ55FD2"))
             assert data["alarms"][0]["msgType"] == "human"
 
+    def test_new_alarms(self):
+        """Test only the alarms occurred since the previous call are returned."""
+        device_id = "8L0DF93PAZ55FD2"
+        alarms = MOCK_RESPONSES["getAlarmMessage_ok"]["result"]["data"]["alarms"]
+        newer = copy.deepcopy(MOCK_RESPONSES["getAlarmMessage_ok"])
+        newer["result"]["data"]["alarms"] = [dict(alarms[0], alarmId="3", time=1664127400)] + alarms
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok")
+            self.config_mock(mocked, "getAlarmMessage", "getAlarmMessage_ok")
+            mocked.post(re.compile(r".+/getAlarmMessage$"), payload=newer)
+            self.config_mock(mocked, "getAlarmMessage", "getAlarmMessage_ok")
+            # the first call returns the latest alarms, oldest first
+            data, cursor = self.loop.run_until_complete(self.api_client.async_get_new_alarms(device_id))
+            assert [alarm["time"] for alarm in data] == [1664021890, 1664127393]
+            assert cursor["after"][0] == 1664127393
+            data, cursor = self.loop.run_until_complete(self.api_client.async_get_new_alarms(device_id, cursor))
+            assert [alarm["alarmId"] for alarm in data] == ["3"]
+            data, cursor = self.loop.run_until_complete(self.api_client.async_get_new_alarms(device_id, cursor))
+            assert data == []
+            # only the alarms newer than the cursor are requested
+            request = list(mocked.requests.values())[1][1]
+            begin_time = json.loads(request.kwargs["data"])["params"]["beginTime"]
+            assert begin_time == datetime.fromtimestamp(1664127393).strftime("%Y-%m-%d %H:%M:%S")
+
+    def test_new_alarms_pages(self):
+        """Test the following pages are requested while full of new alarms."""
+        device_id = "8L0DF93PAZ55FD2"
+        self.api_client.set_alarm_page_size(2)
+        cursor = {"after": (1664000000, set()), "before": None, "newest": None}
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok")
+            self.config_mock(mocked, "getAlarmMessage", "getAlarmMessage_ok")
+            last_page = copy.deepcopy(MOCK_RESPONSES["getAlarmMessage_ok"])
+            last_page["result"]["data"]["alarms"] = [
+                dict(last_page["result"]["data"]["alarms"][1], alarmId="1", time=1663000000)
+            ]
+            mocked.post(re.compile(r".+/getAlarmMessage$"), payload=last_page)
+            data, cursor = self.loop.run_until_complete(self.api_client.async_get_new_alarms(device_id, cursor))
+            assert [alarm["time"] for alarm in data] == [1664021890, 1664127393]
+            request = list(mocked.requests.values())[1][1]
+            assert json.loads(request.kwargs["data"])["params"]["nextAlarmId"] == "1489575655024752"
+
+    def test_new_alarms_max_pages(self):
+        """Test the alarms not fetched within the max number of pages are returned by the next call."""
+        device_id = "8L0DF93PAZ55FD2"
+        self.api_client.set_alarm_page_size(2)
+        self.api_client.set_alarm_max_pages(1)
+        cursor = {"after": (1664000000, set()), "before": None, "newest": None}
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok")
+            self.config_mock(mocked, "getAlarmMessage", "getAlarmMessage_ok")
+            older = copy.deepcopy(MOCK_RESPONSES["getAlarmMessage_ok"])
+            older["result"]["data"]["alarms"] = [
+                dict(older["result"]["data"]["alarms"][1], alarmId="1", time=1664010000)
+            ]
+            mocked.post(re.compile(r".+/getAlarmMessage$"), payload=older)
+            self.config_mock(mocked, "getAlarmMessage", "getAlarmMessage_ok")
+            data, cursor = self.loop.run_until_complete(self.api_client.async_get_new_alarms(device_id, cursor))
+            assert [alarm["time"] for alarm in data] == [1664021890, 1664127393]
+            # the cursor does not move past the alarms not fetched yet
+            assert cursor["after"][0] == 1664000000
+            data, cursor = self.loop.run_until_complete(self.api_client.async_get_new_alarms(device_id, cursor))
+            assert [alarm["time"] for alarm in data] == [1664010000]
+            request = list(mocked.requests.values())[1][1]
+            end_time = json.loads(request.kwargs["data"])["params"]["endTime"]
+            assert end_time == datetime.fromtimestamp(1664021890).strftime("%Y-%m-%d %H:%M:%S")
+            # once caught up, only the alarms newer than those already returned are requested
+            assert cursor["after"][0] == 1664127393
+            data, cursor = self.loop.run_until_complete(self.api_client.async_get_new_alarms(device_id, cursor))
+            assert data == []
+
     def test_listDeviceAbility_ok(self):  # pylint: disable=invalid-name
         """Test listDeviceAbility: ok."""
         with aioresponses() as mocked:
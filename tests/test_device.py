@@ -1,15 +1,18 @@
 """Tests for `imouapi` package."""
 import asyncio
+import copy
+import json
 import logging
 import re
 
 import aiohttp
 import pytest
 from aiohttp.http_exceptions import HttpProcessingError
-from aioresponses import aioresponses
+from aioresponses import CallbackResult, aioresponses
 
 from imouapi.api import ImouAPIClient
 from imouapi.device import ImouDevice, ImouDiscoverService
+from imouapi.exceptions import NotAuthorized
 
 from .const import MOCK_RESPONSES
 
@@ -62,6 +65,81 @@ class TestDevice:
             device: ImouDevice = discovered_devices["webcam"]
             assert device.get_device_id() == "8L0DF93PAZ55FD2"
 
+    def mock_devices(self, mocked, count: int, batch_size: int = 0, missing: int = -1):
+        """Configure deviceBaseList and batched deviceBaseDetailList responses for multiple devices."""
+        devices_list: dict = copy.deepcopy(MOCK_RESPONSES["deviceBaseList_ok"])
+        details_response: dict = MOCK_RESPONSES["deviceBaseDetailList_ok"]
+        details = details_response["result"]["data"]["deviceList"][0]
+        device_ids = [f"8L0DF93PAZ55FD{index}" for index in range(count)]
+        devices_list["result"]["data"]["count"] = count
+        devices_list["result"]["data"]["deviceList"] = [{"deviceId": device_id} for device_id in device_ids]
+        mocked.post(re.compile(r".+/deviceBaseList$"), payload=devices_list)
+        for start in range(0, count if batch_size > 0 else 0, batch_size or 1):
+            details_list: dict = copy.deepcopy(MOCK_RESPONSES["deviceBaseDetailList_ok"])
+            details_list["result"]["data"]["deviceList"] = [
+                dict(details, deviceId=device_id, name=f"webcam{device_id[-1]}")
+                for device_id in device_ids[start : start + batch_size]
+                if device_id[-1] != str(missing)
+            ]
+            mocked.post(re.compile(r".+/deviceBaseDetailList$"), payload=details_list)
+
+    def test_discover_batched_details(self):
+        """Test ImouDiscoverService: device details requested in batches."""
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok")
+            self.mock_devices(mocked, 5, 2)
+            discover_service = ImouDiscoverService(self.api_client)
+            discover_service.set_batch_size(2)
+            discovered_devices = self.loop.run_until_complete(discover_service.async_discover_devices())
+            assert list(discovered_devices.keys()) == [f"webcam{index}" for index in range(5)]
+            assert discovered_devices["webcam3"].get_device_id() == "8L0DF93PAZ55FD3"
+            detail_requests = [key for key in mocked.requests if str(key[1]).endswith("/deviceBaseDetailList")]
+            calls = mocked.requests[detail_requests[0]]
+            assert len(calls) == 3
+            assert len(json.loads(calls[0].kwargs["data"])["params"]["deviceList"]) == 2
+
+    def test_discover_missing_details(self):
+        """Test ImouDiscoverService: devices without details are skipped."""
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok")
+            self.mock_devices(mocked, 3, 10, missing=1)
+            discover_service = ImouDiscoverService(self.api_client)
+            discovered_devices = self.loop.run_until_complete(discover_service.async_discover_devices())
+            assert list(discovered_devices.keys()) == ["webcam0", "webcam2"]
+
+    def test_discover_concurrent(self):
+        """Test ImouDiscoverService: devices initialized concurrently, isolating slow devices."""
+        details = MOCK_RESPONSES["deviceBaseDetailList_ok"]["result"]["data"]["deviceList"][0]
+        in_flight = {"current": 0, "max": 0}
+
+        async def details_callback(url, **kwargs):
+            device_ids = [device["deviceId"] for device in json.loads(kwargs["data"])["params"]["deviceList"]]
+            if "8L0DF93PAZ55FD7" in device_ids:
+                # a slow device, its request is cancelled on timeout
+                await asyncio.sleep(1)
+            else:
+                in_flight["current"] += 1
+                in_flight["max"] = max(in_flight["max"], in_flight["current"])
+                await asyncio.sleep(0.05)
+                in_flight["current"] -= 1
+            response = copy.deepcopy(MOCK_RESPONSES["deviceBaseDetailList_ok"])
+            response["result"]["data"]["deviceList"] = [
+                dict(details, deviceId=device_id, name=f"webcam{device_id[-1]}") for device_id in device_ids
+            ]
+            return CallbackResult(payload=response)
+
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok")
+            self.mock_devices(mocked, 8)
+            mocked.post(re.compile(r".+/deviceBaseDetailList$"), callback=details_callback, repeat=True)
+            discover_service = ImouDiscoverService(self.api_client)
+            discover_service.set_batch_size(2)
+            discover_service.set_max_concurrency(2)
+            discover_service.set_device_timeout(0.3)
+            discovered_devices = self.loop.run_until_complete(discover_service.async_discover_devices())
+            assert list(discovered_devices.keys()) == [f"webcam{index}" for index in range(7)]
+            assert in_flight["max"] == 2
+
     def test_discover_malformed_response(self):
         """Test ImouDiscoverService: malformed response."""
         with aioresponses() as mocked:
@@ -86,6 +164,100 @@ class TestDevice:
             assert device.get_sensor_by_name("breathingLight").is_on() is True
             assert device.get_sensor_by_name("localRecord").is_on() is True
 
+    def test_get_device_entity_error(self):
+        """Test get device: a failing entity does not affect the others."""
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "getNightVisionMode", "deviceBaseList_wrong_device_id", repeat=True)
+            self.configure_responses_ok(mocked)
+            device = ImouDevice(self.api_client, "8L0DF93PAZ55FD2")
+            device.set_update_max_concurrency(2)
+            self.loop.run_until_complete(device.async_get_data())
+            assert list(device.get_update_errors().keys()) == ["nightVisionMode"]
+            assert "OP1009" in device.get_update_errors()["nightVisionMode"].to_string()
+            assert device.get_sensor_by_name("breathingLight").is_on() is True
+            assert device.get_sensor_by_name("storageUsed").get_state() is not None
+
+    def test_get_device_all_entities_error(self):
+        """Test get device: the update fails if no entity polling the API could be updated."""
+        with aioresponses() as mocked:
+            for api in [
+                "getAlarmMessage",
+                "getDeviceCameraStatus",
+                "deviceSdcardStatus",
+                "getNightVisionMode",
+                "getMessageCallback",
+            ]:
+                self.config_mock(mocked, api, "deviceBaseList_wrong_device_id", repeat=True)
+            self.configure_responses_ok(mocked)
+            device = ImouDevice(self.api_client, "8L0DF93PAZ55FD2")
+            with pytest.raises(NotAuthorized):
+                self.loop.run_until_complete(device.async_get_data())
+            # buttons, cameras, sirens and entities sharing the status of the device do not count
+            assert "restartDevice" not in device.get_update_errors()
+            assert "online" not in device.get_update_errors()
+
+    def mock_dormant_device(self, mocked, online_statuses: list):
+        """Configure the responses for a dormant device with the given sequence of online statuses."""
+        details: dict = copy.deepcopy(MOCK_RESPONSES["deviceBaseDetailList_ok"])
+        details["result"]["data"]["deviceList"][0]["ability"] += ",Dormant"
+        mocked.post(re.compile(r".+/deviceBaseDetailList$"), payload=details)
+        for status in online_statuses:
+            online: dict = copy.deepcopy(MOCK_RESPONSES["deviceOnline_ok"])
+            online["result"]["data"]["onLine"] = status
+            mocked.post(re.compile(r".+/deviceOnline$"), payload=online)
+        self.config_mock(mocked, "setDeviceCameraStatus", "setDeviceCameraStatus_ok", repeat=True)
+        self.config_mock(mocked, "getDevicePowerInfo", "getDevicePowerInfo_ok", repeat=True)
+        self.configure_responses_ok(mocked)
+
+    def count_requests(self, mocked, api: str) -> int:
+        """Return the number of requests sent to the given api."""
+        keys = [key for key in mocked.requests if str(key[1]).endswith(f"/{api}")]
+        return len(mocked.requests[keys[0]]) if keys else 0
+
+    def test_get_device_dormant(self):
+        """Test get device: a dormant device is woken up once per update."""
+        with aioresponses() as mocked:
+            self.mock_dormant_device(mocked, ["4", "4"])
+            device = ImouDevice(self.api_client, "8L0DF93PAZ55FD2")
+            device.set_wait_after_wakeup(0)
+            self.loop.run_until_complete(device.async_get_data())
+            assert self.count_requests(mocked, "setDeviceCameraStatus") == 1
+            # status before the update, before waking up and after waking up
+            assert self.count_requests(mocked, "deviceOnline") == 3
+            assert device.get_sensor_by_name("online").is_on() is True
+
+    def test_get_device_dormant_awake(self):
+        """Test get device: a dormant device already awake is checked once per update."""
+        with aioresponses() as mocked:
+            self.mock_dormant_device(mocked, [])
+            device = ImouDevice(self.api_client, "8L0DF93PAZ55FD2")
+            self.loop.run_until_complete(device.async_get_data())
+            assert self.count_requests(mocked, "setDeviceCameraStatus") == 0
+            assert self.count_requests(mocked, "deviceOnline") == 1
+
+    def test_get_device_status_once(self):
+        """Test get device: the online status is requested once per update and shared with the entities."""
+        with aioresponses() as mocked:
+            self.configure_responses_ok(mocked)
+            device = ImouDevice(self.api_client, "8L0DF93PAZ55FD2")
+            self.loop.run_until_complete(device.async_get_data())
+            assert self.count_requests(mocked, "deviceOnline") == 1
+            assert device.get_sensor_by_name("status").get_state() == "Online"
+            assert device.get_sensor_by_name("online").is_on() is True
+            # entities updated on their own request the status
+            self.loop.run_until_complete(device.get_sensor_by_name("status").async_update())
+            assert self.count_requests(mocked, "deviceOnline") == 2
+
+    def test_get_device_message_callback_shared(self):
+        """Test get device: the message callback configuration is requested once for all the devices."""
+        with aioresponses() as mocked:
+            self.configure_responses_ok(mocked)
+            devices = [ImouDevice(self.api_client, "8L0DF93PAZ55FD2") for _ in range(3)]
+            for device in devices:
+                self.loop.run_until_complete(device.async_get_data())
+            assert self.count_requests(mocked, "getMessageCallback") == 1
+            assert devices[2].get_sensor_by_name("pushNotifications").is_on() is False
+
     def test_get_device_processing_error(self):
         """Test get device: processing error."""
         with aioresponses() as mocked:
@@ -155,6 +327,46 @@ class TestDevice:
             self.loop.run_until_complete(set_switch.async_toggle())
             assert set_switch.is_on() is True
 
+    def test_listeners(self):
+        """Test listeners notified only when the state of the device or its entities changes."""
+        with aioresponses() as mocked:
+            self.configure_responses_ok(mocked)
+            self.config_mock(mocked, "setDeviceCameraStatus", "setDeviceCameraStatus_ok", repeat=True)
+            device = ImouDevice(self.api_client, "8L0DF93PAZ55FD2")
+            self.loop.run_until_complete(device.async_initialize())
+            entity_changes = []
+            device_changes = []
+
+            async def async_device_changed(changed_device, changed):
+                device_changes.append(sorted(changed))
+
+            set_switch = device.get_sensor_by_name("headerDetect")
+            remove_listener = set_switch.add_listener(lambda entity: entity_changes.append(entity.is_on()))
+            device.add_listener(async_device_changed)
+            self.loop.run_until_complete(device.async_get_data())
+            assert entity_changes == [True]
+            assert len(device_changes) == 1 and "headerDetect" in device_changes[0]
+            # entities whose state is not fetched did not change
+            for name in ["restartDevice", "refreshAlarm", "siren", "camera"]:
+                assert device.get_sensor_by_name(name) is not None and name not in device_changes[0]
+            # nothing changed
+            self.loop.run_until_complete(device.async_get_data())
+            assert entity_changes == [True] and len(device_changes) == 1
+            # actions notify the listeners of the device too
+            self.loop.run_until_complete(set_switch.async_turn_off())
+            assert entity_changes == [True, False] and device_changes[-1] == ["headerDetect"]
+            remove_listener()
+            self.loop.run_until_complete(set_switch.async_turn_on())
+            assert entity_changes == [True, False]
+
+            # async listeners notified by a pushed event run in the background
+            async def async_push():
+                device.process_event({"type": "status", "device_id": "8L0DF93PAZ55FD2", "status": "0"})
+                await asyncio.sleep(0)
+
+            self.loop.run_until_complete(async_push())
+            assert device_changes[-1] == ["online", "status"]
+
     def test_set_status_error(self):
         """Test set status: error."""
         with aioresponses() as mocked:
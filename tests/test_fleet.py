@@ -0,0 +1,153 @@
+"""Tests for `imouapi` package."""
+import asyncio
+import copy
+import logging
+import re
+
+import aiohttp
+from aioresponses import aioresponses
+
+from imouapi.api import ImouAPIClient
+from imouapi.device import ImouDevice
+from imouapi.fleet import ImouFleet
+
+from .const import MOCK_RESPONSES
+
+logger = logging.getLogger("imouapi")
+logger.setLevel(logging.DEBUG)
+
+
+class TestFleet:
+    """Test suite for ImouFleet."""
+
+    def setup(self):
+        """Initialize the test suite."""
+        self.loop = asyncio.new_event_loop()  # pylint: disable=attribute-defined-outside-init
+        self.session = aiohttp.ClientSession()  # pylint: disable=attribute-defined-outside-init
+        self.api_client = ImouAPIClient(  # pylint: disable=attribute-defined-outside-init
+            "appId", "appSecret", self.session
+        )
+        self.api_client.set_log_http_requests(True)
+
+    def config_mock(self, mocked, url: str, response: str, **kwargs):
+        """Configure a mock request."""
+        status = kwargs["status"] if "status" in kwargs else 200
+        exception = kwargs["exception"] if "exception" in kwargs else None
+        repeat = kwargs["repeat"] if "repeat" in kwargs else False
+        payload = MOCK_RESPONSES[response] if response in MOCK_RESPONSES else "{invalid"
+        mocked.post(re.compile(r".+/" + url + "$"), status=status, payload=payload, exception=exception, repeat=repeat)
+
+    def configure_responses_ok(self, mocked):
+        """Configure all responses ok."""
+        self.config_mock(mocked, "accessToken", "accessToken_ok", repeat=True)
+        self.config_mock(mocked, "deviceBaseList", "deviceBaseList_ok", repeat=True)
+        self.config_mock(mocked, "deviceBaseDetailList", "deviceBaseDetailList_ok", repeat=True)
+        self.config_mock(mocked, "deviceOnline", "deviceOnline_ok", repeat=True)
+        self.config_mock(mocked, "getAlarmMessage", "getAlarmMessage_ok", repeat=True)
+        self.config_mock(mocked, "getDeviceCameraStatus", "getDeviceCameraStatus_ok", repeat=True)
+        self.config_mock(mocked, "deviceStorage", "deviceStorage_ok", repeat=True)
+        self.config_mock(mocked, "getNightVisionMode", "getNightVisionMode_ok", repeat=True)
+        self.config_mock(mocked, "getMessageCallback", "getMessageCallback_ok", repeat=True)
+        self.config_mock(mocked, "deviceSdcardStatus", "deviceSdcardStatus_ok", repeat=True)
+
+    def count_requests(self, mocked, api: str) -> int:
+        """Return the number of requests sent to the given api."""
+        keys = [key for key in mocked.requests if str(key[1]).endswith(f"/{api}")]
+        return len(mocked.requests[keys[0]]) if keys else 0
+
+    def test_discover(self):
+        """Test discover the devices of the fleet."""
+        with aioresponses() as mocked:
+            self.configure_responses_ok(mocked)
+            fleet = ImouFleet(self.api_client)
+            discovered_devices = self.loop.run_until_complete(fleet.async_discover())
+            assert list(discovered_devices.keys()) == ["webcam"]
+            assert fleet.get_device("8L0DF93PAZ55FD2") is discovered_devices["webcam"]
+
+    def test_discover_prefetch_capabilities(self):
+        """Test capabilities prefetched while discovering the devices and used to create the entities."""
+        abilities: dict = copy.deepcopy(MOCK_RESPONSES["listDeviceAbility_ok"])
+        abilities["result"]["data"]["deviceList"][0]["channels"][0]["channelAbility"] += ",SmartTrack"
+        with aioresponses() as mocked:
+            mocked.post(re.compile(r".+/listDeviceAbility$"), payload=abilities)
+            self.configure_responses_ok(mocked)
+            fleet = ImouFleet(self.api_client)
+            self.loop.run_until_complete(fleet.async_discover(prefetch_capabilities=True))
+            self.loop.run_until_complete(fleet.async_refresh())
+            assert self.count_requests(mocked, "listDeviceAbility") == 1
+            assert self.count_requests(mocked, "deviceBaseDetailList") == 1
+            assert fleet.get_devices_with_capability("SmartTrack") == ["8L0DF93PAZ55FD2"]
+            switches = [
+                switch.get_name() for switch in fleet.get_device("8L0DF93PAZ55FD2").get_sensors_by_platform("switch")
+            ]
+            assert "smartTrack" in switches and "infraredLight" in switches
+
+    def test_refresh(self):
+        """Test refresh all the devices sharing the account level calls."""
+        with aioresponses() as mocked:
+            self.configure_responses_ok(mocked)
+            # the mocked response always returns the same device, do not batch the requests for different devices
+            self.api_client.set_batch_max_size(1)
+            fleet = ImouFleet(self.api_client, max_concurrency=2)
+            for index in range(5):
+                fleet.add_device(ImouDevice(self.api_client, f"8L0DF93PAZ55FD{index}"))
+            results = self.loop.run_until_complete(fleet.async_refresh())
+            assert list(results.values()) == [None] * 5
+            assert self.count_requests(mocked, "getMessageCallback") == 1
+            assert self.count_requests(mocked, "accessToken") == 1
+            cycle = fleet.get_last_cycle()
+            assert cycle["devices"] == 5 and cycle["refreshed"] == 5 and cycle["failed"] == []
+            assert cycle["duration"] >= max(cycle["device_durations"].values())
+
+    def test_refresh_failed_device(self):
+        """Test a device failing to refresh is reported without affecting the others."""
+        with aioresponses() as mocked:
+            details = copy.deepcopy(MOCK_RESPONSES["deviceBaseDetailList_ok"])
+            details["result"]["data"]["deviceList"] = []
+            mocked.post(re.compile(r".+/deviceBaseDetailList$"), payload=details)
+            self.configure_responses_ok(mocked)
+            fleet = ImouFleet(self.api_client)
+            fleet.add_device(ImouDevice(self.api_client, "8L0DF93PAZ55FD0"))
+            fleet.add_device(ImouDevice(self.api_client, "8L0DF93PAZ55FD1"))
+            self.api_client.set_batch_max_size(1)
+            fleet.set_max_concurrency(1)
+
+            async def async_refresh():
+                return [(device.get_device_id(), exception) async for device, exception in fleet.async_iter_refresh()]
+
+            results = dict(self.loop.run_until_complete(async_refresh()))
+            assert results["8L0DF93PAZ55FD1"] is None
+            assert "InvalidResponse" in results["8L0DF93PAZ55FD0"].to_string()
+            assert fleet.get_last_cycle()["failed"] == ["8L0DF93PAZ55FD0"]
+
+    def test_prefetch_capabilities(self):
+        """Test capabilities of the devices prefetched in batches and used to create the entities."""
+        abilities = copy.deepcopy(MOCK_RESPONSES["listDeviceAbility_ok"]["result"]["data"]["deviceList"][0])
+        abilities["channels"][0]["channelAbility"] += ",SmartTrack"
+        device_ids = [f"8L0DF93PAZ55FD{index}" for index in range(3)]
+        with aioresponses() as mocked:
+            for batch in [device_ids[:2], device_ids[2:]]:
+                response = copy.deepcopy(MOCK_RESPONSES["listDeviceAbility_ok"])
+                response["result"]["data"]["deviceList"] = [dict(abilities, deviceId=device_id) for device_id in batch]
+                mocked.post(re.compile(r".+/listDeviceAbility$"), payload=response)
+            self.configure_responses_ok(mocked)
+            self.api_client.set_batch_max_size(1)
+            fleet = ImouFleet(self.api_client)
+            fleet.set_ability_batch_size(2)
+            for device_id in device_ids:
+                fleet.add_device(ImouDevice(self.api_client, device_id))
+            index = self.loop.run_until_complete(fleet.async_prefetch_capabilities())
+            assert list(index.keys()) == device_ids
+            assert self.count_requests(mocked, "listDeviceAbility") == 2
+            assert "AudioTalk" in fleet.get_capabilities("8L0DF93PAZ55FD1")
+            assert "AudioTalk" in fleet.get_capabilities("8L0DF93PAZ55FD1", "0")
+            assert fleet.get_capabilities("8L0DF93PAZ55FD1", "1") is None
+            assert fleet.get_devices_with_capability("NVM") == device_ids
+            self.loop.run_until_complete(fleet.async_refresh())
+            capabilities = fleet.get_device("8L0DF93PAZ55FD0").get_diagnostics()["capabilities"]
+            assert "AudioTalk" in [capability["name"] for capability in capabilities]
+            # capabilities of the channels are added to those of the details
+            switches = [
+                switch.get_name() for switch in fleet.get_device("8L0DF93PAZ55FD0").get_sensors_by_platform("switch")
+            ]
+            assert "smartTrack" in switches and "infraredLight" in switches
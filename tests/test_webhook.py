@@ -0,0 +1,105 @@
+"""Tests for `imouapi` package."""
+import asyncio
+import logging
+import re
+
+import aiohttp
+from aiohttp.test_utils import TestClient, TestServer
+from aioresponses import aioresponses
+
+from imouapi.api import ImouAPIClient
+from imouapi.device import ImouDevice
+from imouapi.webhook import ImouWebhookReceiver
+
+from .const import MOCK_RESPONSES
+
+logger = logging.getLogger("imouapi")
+logger.setLevel(logging.DEBUG)
+
+
+class TestWebhook:
+    """Test suite for ImouWebhookReceiver."""
+
+    def setup(self):
+        """Initialize the test suite."""
+        self.loop = asyncio.new_event_loop()  # pylint: disable=attribute-defined-outside-init
+        self.session = aiohttp.ClientSession()  # pylint: disable=attribute-defined-outside-init
+        self.api_client = ImouAPIClient(  # pylint: disable=attribute-defined-outside-init
+            "appId", "appSecret", self.session
+        )
+        self.api_client.set_log_http_requests(True)
+        with aioresponses() as mocked:
+            self.config_mock(mocked, "accessToken", "accessToken_ok")
+            self.config_mock(mocked, "deviceBaseDetailList", "deviceBaseDetailList_ok")
+            device = ImouDevice(self.api_client, "8L0DF93PAZ55FD2")
+            self.loop.run_until_complete(device.async_initialize())
+        self.device = device  # pylint: disable=attribute-defined-outside-init
+        self.receiver = ImouWebhookReceiver([self.device])  # pylint: disable=attribute-defined-outside-init
+
+    def config_mock(self, mocked, url: str, response: str, **kwargs):
+        """Configure a mock request."""
+        status = kwargs["status"] if "status" in kwargs else 200
+        exception = kwargs["exception"] if "exception" in kwargs else None
+        repeat = kwargs["repeat"] if "repeat" in kwargs else False
+        payload = MOCK_RESPONSES[response] if response in MOCK_RESPONSES else "{invalid"
+        mocked.post(re.compile(r".+/" + url + "$"), status=status, payload=payload, exception=exception, repeat=repeat)
+
+    def test_alarm(self):
+        """Test alarm message updating the motion alarm."""
+        message = {"msgType": "human", "did": "8L0DF93PAZ55FD2", "cid": "0", "time": 1659000000, "type": "1"}
+        assert self.receiver.process_message(message) == ["motionAlarm"]
+        sensor = self.device.get_sensor_by_name("motionAlarm")
+        assert sensor.is_on() is True
+        attributes = {"alarm_time": "2022-07-28T09:20:00", "alarm_type": "human", "alarm_code": "1"}
+        assert sensor.get_attributes() == attributes
+
+    def test_status(self):
+        """Test status message updating the device status."""
+        message = {"msgType": "offline", "did": "8L0DF93PAZ55FD2"}
+        assert sorted(self.receiver.process_message(message)) == ["online", "status"]
+        assert self.device.get_status() == "0"
+        assert self.device.get_sensor_by_name("online").is_on() is False
+        assert self.device.get_sensor_by_name("status").get_state() == "Offline"
+        message = {"msgType": "deviceStatus", "did": "8L0DF93PAZ55FD2", "status": "online"}
+        assert sorted(self.receiver.process_message(message)) == ["online", "status"]
+        assert self.device.get_sensor_by_name("online").is_on() is True
+
+    def test_invalid_messages(self):
+        """Test invalid messages and messages of unknown devices are ignored."""
+        assert self.receiver.process_message({"msgType": "human", "did": "unknown", "time": 1659000000}) == []
+        assert self.receiver.process_message({"msgType": "human", "did": "8L0DF93PAZ55FD2"}) == []
+        assert self.receiver.process_message({"did": "8L0DF93PAZ55FD2"}) == []
+        # messages of types other than alarms are ignored
+        assert self.receiver.process_message({"msgType": "upgrade", "did": "8L0DF93PAZ55FD2", "time": 1659000000}) == []
+        assert self.device.get_sensor_by_name("motionAlarm").is_on() is None
+        statistics = {"received": 4, "routed": 0, "unknown_device": 1, "invalid": 3, "unauthorized": 0}
+        assert self.receiver.get_statistics() == statistics
+
+    def test_http(self):
+        """Test messages pushed over HTTP."""
+        receiver = ImouWebhookReceiver([self.device], token="secret")
+
+        async def async_push():
+            client = TestClient(TestServer(receiver.get_app()))
+            await client.start_server()
+            try:
+                message = {"msgType": "videoMotion", "did": "8L0DF93PAZ55FD2", "time": 1659000000000}
+                # requests without the token are rejected
+                response = await client.post("/imou", json=message)
+                assert response.status == 401
+                response = await client.post("/imou?token=wrong", json=message)
+                assert response.status == 401
+                assert self.device.get_sensor_by_name("motionAlarm").is_on() is None
+                response = await client.post("/imou?token=secret", json=message)
+                assert response.status == 200
+                response = await client.post("/imou?token=secret", data="{invalid")
+                assert response.status == 400
+            finally:
+                await client.close()
+
+        with aioresponses(passthrough=["http://127.0.0.1"]) as mocked:
+            self.config_mock(mocked, "deviceOnline", "deviceOnline_ok")
+            self.loop.run_until_complete(async_push())
+            assert len(mocked.requests) == 0
+        assert self.device.get_sensor_by_name("motionAlarm").is_on() is True
+        assert receiver.get_statistics()["routed"] == 1 and receiver.get_statistics()["unauthorized"] == 2